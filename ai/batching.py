@@ -0,0 +1,103 @@
+# app/ai/batching.py
+import asyncio
+import contextvars
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BatchItem = Tuple[str, Dict[str, Any]]
+
+
+class MicroBatcher:
+    """
+    Collects up to `max_size` items or `max_wait` seconds worth, sends them as one
+    request and resolves every caller with its own result (matched by key).
+    Items the batched answer misses are retried one by one with `run_single`.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[BatchItem]], Awaitable[Dict[str, Any]]],
+        run_single: Callable[[Dict[str, Any]], Awaitable[Any]],
+        max_size: int,
+        max_wait: float,
+    ):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = set()  # keep batch tasks referenced until they finish
+
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    async def submit(self, key: str, item: Dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((key, item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # own context: callbacks of whichever caller filled the batch (e.g. its
+            # per-run token counter) must not see the other callers' work
+            task = asyncio.create_task(self._run(batch), context=contextvars.Context())
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([(key, item) for key, item, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        missing = []
+        for key, item, future in batch:
+            if future.done():
+                continue
+            if key in results:
+                future.set_result(results[key])
+            else:
+                missing.append((key, item, future))
+
+        if missing:
+            self.fallbacks += len(missing)
+            logger.warning(f"⚠️  Batched answer is missing {len(missing)} of {len(batch)} errors, analyzing them on their own")
+            await asyncio.gather(*(self._run_single(item, future) for _, item, future in missing))
+
+    async def _run_single(self, item, future):
+        try:
+            result = await self.run_single(item)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_size": self.max_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,63 @@
+# app/ai/checkpoint.py
+import os
+import sqlite3
+
+from sqlalchemy.engine import make_url
+
+# "sqlite" | "postgres" | "memory" (no resume after restart)
+GRAPH_CHECKPOINTER = os.getenv("GRAPH_CHECKPOINTER", "sqlite")
+GRAPH_CHECKPOINT_PATH = os.getenv("GRAPH_CHECKPOINT_PATH", "checkpoints.sqlite")
+
+
+def _postgres_url():
+    # psycopg wants a plain libpq url, without the SQLAlchemy "+driver" part
+    url = os.getenv("GRAPH_CHECKPOINT_URL") or os.getenv("DATABASE_URL")
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def create_checkpointer():
+    """Checkpointer for the sync graph (ingest_error)."""
+    if GRAPH_CHECKPOINTER == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    if GRAPH_CHECKPOINTER == "postgres":
+        from langgraph.checkpoint.postgres import PostgresSaver
+        from psycopg import Connection
+        from psycopg.rows import dict_row
+
+        conn = Connection.connect(_postgres_url(), autocommit=True, prepare_threshold=0, row_factory=dict_row)
+        saver = PostgresSaver(conn)
+        saver.setup()
+        return saver
+
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    return SqliteSaver(sqlite3.connect(GRAPH_CHECKPOINT_PATH, check_same_thread=False))
+
+
+async def acreate_checkpointer():
+    """Checkpointer for the async graph, must be created inside the running event loop."""
+    if GRAPH_CHECKPOINTER == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+    if GRAPH_CHECKPOINTER == "postgres":
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        from psycopg import AsyncConnection
+        from psycopg.rows import dict_row
+
+        conn = await AsyncConnection.connect(_postgres_url(), autocommit=True, prepare_threshold=0, row_factory=dict_row)
+        saver = AsyncPostgresSaver(conn)
+        await saver.setup()
+        return saver
+
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    saver = AsyncSqliteSaver(await aiosqlite.connect(GRAPH_CHECKPOINT_PATH))
+    await saver.setup()
+    return saver
+
+
+async def aclose_checkpointer(saver):
+    # sqlite/postgres savers own a connection, aiosqlite keeps the process alive until it is closed
+    conn = getattr(saver, "conn", None)
+    if conn is not None:
+        await conn.close()
@@ -0,0 +1,163 @@
+# app/ai/compaction.py
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from services import fast_json
+
+# tiktoken encoding used to count prompt tokens locally (gpt-4.1 family)
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "o200k_base")
+
+# sender hints, the analysis writes its own immediate_actions/deeper_investigation
+DROPPED_FIELDS = ("suggested_checks",)
+
+# (max stack frames, max string length) tried in order until the payload fits the budget
+_SHRINK_STEPS = [(8, None), (6, 400), (4, 200), (2, 100), (1, 60)]
+_MAX_LIST_ITEMS = 10
+
+_FRAME_LINE = re.compile(r'^\s*File "([^"]+)", line (\d+), in (\S+)')
+_SITE_PACKAGES = re.compile(r"^.*/(site|dist)-packages/")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(PROMPT_TOKENIZER)
+    except Exception:
+        # no tiktoken or no cached encoding (offline), fall back to ~4 chars per token
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def _dumps(value: Any) -> str:
+    return fast_json.dumps(value)
+
+
+def compact_stack_trace(stack_trace: str, max_frames: int = 8) -> str:
+    """
+    One line per frame (`path:line in func: code`), library paths shortened,
+    repeated frames (recursion, retry loops) collapsed and the middle of long
+    traces dropped. Exception lines are kept as they are.
+    """
+    frames: List[str] = []
+    tail: List[str] = []
+    previous = None
+    last_frame = ""
+    repeats = 0
+    lines = [line for line in stack_trace.splitlines() if line.strip()]
+    i = 0
+    while i < len(lines):
+        match = _FRAME_LINE.match(lines[i])
+        if not match:
+            stripped = lines[i].strip()
+            if stripped.startswith("Traceback (most recent call last)") or set(stripped) <= {"^", "~"}:
+                i += 1
+                continue
+            tail.append(stripped)
+            i += 1
+            continue
+
+        path, line_no, func = match.groups()
+        code = ""
+        if i + 1 < len(lines) and not _FRAME_LINE.match(lines[i + 1]) and lines[i + 1].startswith((" ", "\t")):
+            code = lines[i + 1].strip()
+            i += 1
+        i += 1
+
+        key = (path, func)
+        if key == previous:
+            repeats += 1
+            frames[-1] = f"{last_frame} (x{repeats + 1})"
+            continue
+        previous, repeats = key, 0
+        frame = f"{_SITE_PACKAGES.sub('', path)}:{line_no} in {func}"
+        last_frame = f"{frame}: {code}" if code else frame
+        frames.append(last_frame)
+
+    if len(frames) > max_frames:
+        # outermost frame says where it started, innermost ones where it broke
+        head = max(1, max_frames // 3)
+        keep_tail = max_frames - head
+        omitted = len(frames) - head - keep_tail
+        frames = frames[:head] + [f"... {omitted} frames omitted"] + (frames[-keep_tail:] if keep_tail else [])
+    return "\n".join(frames + tail)
+
+
+def _shorten(value: Any, max_len: int) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= max_len else value[:max_len] + "…"
+    if isinstance(value, dict):
+        return {k: _shorten(v, max_len) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [_shorten(v, max_len) for v in value[:_MAX_LIST_ITEMS]]
+        if len(value) > _MAX_LIST_ITEMS:
+            items.append(f"... {len(value) - _MAX_LIST_ITEMS} more")
+        return items
+    return value
+
+
+def _prune(value: Any) -> Any:
+    """Drop empty values, they cost tokens and tell the model nothing."""
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_prune(v) for v in value if v not in (None, "", [], {})]
+    return value
+
+
+def _fit(text: str, budget: int) -> str:
+    """Last resort: cut the serialized payload itself."""
+    if count_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+
+def compact_json(value: Any, budget: int) -> str:
+    """Minified JSON of `value`, strings shortened step by step until it fits `budget` tokens."""
+    value = _prune(value)
+    text = _dumps(value)
+    for _, max_len in _SHRINK_STEPS:
+        if count_tokens(text) <= budget:
+            return text
+        if max_len is not None:
+            text = _dumps(_shorten(value, max_len))
+    return _fit(text, budget)
+
+
+def compact_error(error: Dict[str, Any], budget: int) -> str:
+    """
+    Error payload as the analysis needs it: no sender hints, no whitespace,
+    compacted stack trace, and at most `budget` tokens (stack frames go first,
+    then long strings).
+    """
+    payload = _prune({k: v for k, v in error.items() if k not in DROPPED_FIELDS})
+    context = payload.get("context")
+    stack_trace = context.get("stack_trace") if isinstance(context, dict) else None
+
+    text = ""
+    for max_frames, max_len in _SHRINK_STEPS:
+        step = payload
+        if isinstance(stack_trace, str):
+            step = {**payload, "context": {**context, "stack_trace": compact_stack_trace(stack_trace, max_frames)}}
+        if max_len is not None:
+            step = _shorten(step, max_len)
+        text = _dumps(step)
+        if count_tokens(text) <= budget:
+            return text
+    return _fit(text, budget)
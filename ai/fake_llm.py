@@ -0,0 +1,175 @@
+# app/ai/fake_llm.py
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure (FAKE_LLM_FAILURE_RATE)."""
+
+    # what a provider outage looks like to ai/resilience.py: retryable
+    status_code = 503
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model for load tests and benchmarks.
+    Answers every bound tool/structured-output schema with a schema-valid
+    sample after a configurable delay, no network involved. Answers depend
+    only on the prompt; jitter and injected failures come from FAKE_LLM_SEED.
+    """
+
+    latency: float = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))  # seconds
+    # generation time grows with the answer, like a real model
+    token_latency: float = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0"))  # seconds per output token
+    jitter: float = float(os.getenv("FAKE_LLM_JITTER", "0"))  # up to this many seconds added per call
+    failure_rate: float = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))  # share of calls that raise FakeLLMError
+    seed: int = int(os.getenv("FAKE_LLM_SEED", "0"))
+    _noise_rng: Optional[random.Random] = PrivateAttr(default=None)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-structured"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = self._result(messages, kwargs.get("tools"))
+        time.sleep(self._delay(result))
+        self._maybe_fail()
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = self._result(messages, kwargs.get("tools"))
+        await asyncio.sleep(self._delay(result))
+        self._maybe_fail()
+        return result
+
+    def _noise(self) -> random.Random:
+        if self._noise_rng is None:
+            self._noise_rng = random.Random(self.seed)
+        return self._noise_rng
+
+    def _extra_latency(self) -> float:
+        return self._noise().uniform(0, self.jitter) if self.jitter else 0.0
+
+    def _maybe_fail(self):
+        # after the delay, like a provider timing out or answering 5xx
+        if self.failure_rate and self._noise().random() < self.failure_rate:
+            raise FakeLLMError("Simulated LLM provider failure")
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        """Same answer as _agenerate, tool call arguments arriving a few tokens at a time."""
+        message = self._result(messages, kwargs.get("tools")).generations[0].message
+        await asyncio.sleep(self.latency + self._extra_latency())
+        self._maybe_fail()
+
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            text = json.dumps(call["args"])
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=[{"name": call["name"], "args": "", "id": call["id"], "index": 0}]
+            ))
+        else:
+            text = message.content
+        for i in range(0, len(text), _STREAM_CHUNK_CHARS):
+            piece = text[i:i + _STREAM_CHUNK_CHARS]
+            await asyncio.sleep(self.token_latency * len(piece) / 4)
+            if message.tool_calls:
+                chunk = AIMessageChunk(content="", tool_call_chunks=[{"name": None, "args": piece, "id": None, "index": 0}])
+            else:
+                chunk = AIMessageChunk(content=piece)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(piece, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", response_metadata=message.response_metadata, usage_metadata=message.usage_metadata
+        ))
+
+    def _delay(self, result: ChatResult) -> float:
+        output_tokens = result.generations[0].message.usage_metadata["output_tokens"]
+        return self.latency + self._extra_latency() + self.token_latency * output_tokens
+
+    def _result(self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]]) -> ChatResult:
+        prompt = "".join(str(m.content) for m in messages)
+        # seed per prompt so the same error always gets the same answer
+        rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+        # batched prompts label each item, answer one list entry per label
+        keys = _BATCH_KEY.findall(prompt)
+
+        if tools:
+            function = tools[0]["function"]
+            parameters = function["parameters"]
+            args = _sample(parameters, parameters.get("$defs", {}), rng, function["name"], keys)
+            content = ""
+            tool_calls = [{"name": function["name"], "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}]
+            output_text = json.dumps(args)
+        else:
+            content = "ok"
+            tool_calls = []
+            output_text = content
+
+        input_tokens = len(prompt) // 4
+        output_tokens = len(output_text) // 4
+        message = AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            response_metadata={"model_name": self._llm_type},
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+_BATCH_KEY = re.compile(r"^ERROR KEY: (\S+)$", re.MULTILINE)
+_STREAM_CHUNK_CHARS = 16  # ~4 tokens per streamed chunk
+
+
+def _sample(schema: Dict[str, Any], defs: Dict[str, Any], rng: random.Random, name: str, keys: List[str] = ()) -> Any:
+    """Build a value that validates against a (Pydantic generated) JSON schema."""
+    if "$ref" in schema:
+        return _sample(defs[schema["$ref"].split("/")[-1]], defs, rng, name, keys)
+    if "anyOf" in schema:
+        return _sample(schema["anyOf"][0], defs, rng, name, keys)
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+
+    kind = schema.get("type", "string")
+    if kind == "object":
+        return {
+            key: _sample(prop, defs, rng, key, keys)
+            for key, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        items = schema.get("items", {})
+        item_schema = defs.get(items["$ref"].split("/")[-1], {}) if "$ref" in items else items
+        if keys and "error_key" in item_schema.get("properties", {}):
+            return [
+                {**_sample(items, defs, rng, name), "error_key": key}
+                for key in keys
+            ]
+        return [_sample(items, defs, rng, name) for _ in range(rng.randint(1, 3))]
+    if kind in ("number", "integer"):
+        low = schema.get("minimum", 0)
+        high = schema.get("maximum", 1 if kind == "number" else 100)
+        return round(rng.uniform(low, high), 2) if kind == "number" else rng.randint(low, high)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return f"stub {name} #{rng.randint(1, 999)}"
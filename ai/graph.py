@@ -1,43 +1,104 @@
 # app/ai/graph.py
+import itertools
 import json
-from typing import TypedDict, Dict, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from ai.models import ErrorAnalysis
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Annotated, TypedDict, Dict, Any, List, Optional
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.messages import SystemMessage
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.tracers.context import register_configure_hook
+from pydantic import ValidationError
+from ai.batching import MicroBatcher
+from ai.compaction import compact_error, compact_json, count_tokens
+from ai.models import ErrorAnalysis, ErrorAnalysisBatch
 from ai.models import ErrorSolution
+from ai.models import LEVEL_ORDER, to_level
+from ai.resilience import CircuitBreaker, RateLimiter, Resilience
+from services import fast_json
+from services.analysis_stream import analysis_streams
+from services.metrics import counter, histogram, timed
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# "openai" | "fake" (offline stub model, see ai/fake_llm.py)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0, api_key=OPENAI_API_KEY)
-
-def analyze_error_node(error):
-    system_message = SystemMessage("You are an SRE/Backend incident analyst. Given a production error payload, produce a JSON analysis.")
-    user_message = HumanMessage(content=
-            "ERROR PAYLOAD:\n"
-            f"{json.dumps(error, ensure_ascii=False, indent=2)}\n\n"
-            "Return structured JSON with: probable_root_cause, impact_assessment, urgency, "
-            "signals_used, immediate_actions, deeper_investigation, confidence.")
-    conversation = [system_message, user_message]
-    analyzer = llm.with_structured_output(ErrorAnalysis)
-    
-    print("AI START")
-    result: ErrorAnalysis = analyzer.invoke(conversation, {
-        "error": error
-    })
-    print("AI DONE")
-    
-    final_result = result.model_dump()
-    return final_result
+# resilience layer around every LLM call (ai/resilience.py)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds per attempt, 0 = none
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "180"))  # seconds per call, retries and waits included, 0 = none
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))  # seconds, doubled per retry, full jitter
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))  # unless Retry-After asks for more
+# per process: split the provider's limits between receiver/worker processes, 0 = no limit
+LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+LLM_RATE_LIMIT_TPM = float(os.getenv("LLM_RATE_LIMIT_TPM", "0"))
+LLM_RATE_LIMIT_OUTPUT_TOKENS = int(os.getenv("LLM_RATE_LIMIT_OUTPUT_TOKENS", "800"))  # reserved per answer
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # failed calls in a row that open it, 0 = off
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds open before a probe call
 
 
-def generate_solution_node(error_analysis):
-    system_message = SystemMessage(content=
+@lru_cache(maxsize=1)
+def get_llm():
+    """
+    The chat model, built on first use (the receiver warms it in its lifespan):
+    importing langchain_openai alone takes about a second.
     """
+    if LLM_PROVIDER == "fake":
+        from ai.fake_llm import FakeChatModel
+        return FakeChatModel()
+    from langchain_openai import ChatOpenAI
+    # retries and their backoff are llm_resilience's, the client only bounds each request
+    return ChatOpenAI(
+        model="gpt-4.1-mini", temperature=0, api_key=OPENAI_API_KEY,
+        max_retries=0, timeout=LLM_TIMEOUT or None,
+    )
+
+
+@lru_cache(maxsize=None)
+def _structured(schema):
+    """llm.with_structured_output(schema), built once per schema and shared by all calls."""
+    return get_llm().with_structured_output(schema)
+
+
+@lru_cache(maxsize=None)
+def _tool_stream(schema):
+    """Forced tool call of `schema` -> its parsed arguments so far, per chunk."""
+    return get_llm().bind_tools([schema], tool_choice=schema.__name__) | JsonOutputKeyToolsParser(
+        key_name=schema.__name__, first_tool_only=True
+    )
+
+# analyses below this urgency (high|medium|low) skip generate_solution_node
+SOLUTION_MIN_URGENCY = os.getenv("SOLUTION_MIN_URGENCY", "medium")
+# micro-batching of analyses under bursts: up to N errors or T ms per LLM request, 1 = off
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "1"))
+LLM_BATCH_WAIT_MS = float(os.getenv("LLM_BATCH_WAIT_MS", "50"))
+# "on" -> minified payloads, compacted stack traces, at most PROMPT_TOKEN_BUDGET tokens
+# "off" -> the full payload as indent=2 JSON
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "on") == "on"
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "600"))
+# prior analyses of similar errors given to the analysis (services/similarity.py)
+SIMILAR_CONTEXT_BUDGET = int(os.getenv("SIMILAR_CONTEXT_BUDGET", "300"))
+# "on" -> while a reader is subscribed to the error (GET /errors/{id}/analysis/stream) the
+# async nodes stream tool call arguments and publish the fields parsed so far, calls
+# nobody watches keep the plain with_structured_output ainvoke; "off" -> never streamed
+LLM_STREAMING = os.getenv("LLM_STREAMING", "on") == "on"
+
+ANALYSIS_SYSTEM_PROMPT = "You are an SRE/Backend incident analyst. Given a production error payload, produce a JSON analysis."
+
+SOLUTION_SYSTEM_PROMPT = """
 You are a senior SRE and backend engineer.
 
 You are given a structured error_analysis produced by a previous AI step.
@@ -101,13 +162,347 @@ Return a single structured JSON object with the following keys exactly:
 }
 
 Do not include any additional text outside the JSON.
-""")
-    user_message = HumanMessage(content="ERROR ANALYSIS:\n"
-                                f"{json.dumps(error_analysis, ensure_ascii=False, indent=2)}\n\n"
-                                "Return structured JSON with: code_fixes, configuration_changes, deployment_steps and rollback_plan.")
-    solution_maker = llm.with_structured_output(ErrorSolution)
-    conversation = [system_message, user_message]
-    result : ErrorSolution = solution_maker.invoke(conversation, {"error_analysis": error_analysis})
+"""
+
+# Static text first, per-error text last: the system message (and the bound tool
+# schema) is the same prefix on every call, which providers cache (OpenAI from
+# 1024 tokens). System prompts go in as messages, not templates, so the JSON
+# braces in SOLUTION_SYSTEM_PROMPT stay literal.
+ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(ANALYSIS_SYSTEM_PROMPT),
+    ("human",
+     "ERROR PAYLOAD:\n"
+     "{payload}\n\n"
+     "{similar}"
+     "Return structured JSON with: probable_root_cause, impact_assessment, urgency, "
+     "signals_used, immediate_actions, deeper_investigation, confidence."),
+])
+
+BATCH_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(ANALYSIS_SYSTEM_PROMPT + " You may get several payloads, analyze each one on its own."),
+    ("human",
+     "ERROR PAYLOADS:\n\n"
+     "{payloads}\n\n"
+     "Return structured JSON with one entry in analyses per ERROR KEY, error_key set to that key, and: "
+     "probable_root_cause, impact_assessment, urgency, "
+     "signals_used, immediate_actions, deeper_investigation, confidence."),
+])
+
+SOLUTION_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(SOLUTION_SYSTEM_PROMPT),
+    ("human",
+     "ERROR ANALYSIS:\n"
+     "{analysis}\n\n"
+     "Return structured JSON with: code_fixes, configuration_changes, deployment_steps and rollback_plan."),
+])
+
+# stage -> (prompt, output schema)
+_STAGES = {
+    "analysis": (ANALYSIS_PROMPT, ErrorAnalysis),
+    "analysis_batch": (BATCH_PROMPT, ErrorAnalysisBatch),
+    "solution": (SOLUTION_PROMPT, ErrorSolution),
+}
+
+
+@lru_cache(maxsize=None)
+def _pipeline(stage, stream=False):
+    """
+    prompt | structured-output model of `stage`, built once per process.
+    stream=True -> the forced tool call variant, astream yields the arguments parsed so far.
+    """
+    prompt, schema = _STAGES[stage]
+    return prompt | (_tool_stream(schema) if stream else _structured(schema))
+
+
+llm_resilience = Resilience(
+    LLM_TIMEOUT,
+    LLM_DEADLINE,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    RateLimiter(LLM_RATE_LIMIT_RPM, LLM_RATE_LIMIT_TPM),
+    CircuitBreaker("llm", LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN),
+)
+
+
+def _reserved_tokens(stage, inputs, answers=1):
+    """What the rate limiter books for a call: the prompt plus LLM_RATE_LIMIT_OUTPUT_TOKENS per answer."""
+    if not llm_resilience.limiter.counts_tokens:
+        return 0
+    messages = _STAGES[stage][0].format_messages(**inputs)
+    return sum(count_tokens(m.content) for m in messages) + LLM_RATE_LIMIT_OUTPUT_TOKENS * answers
+
+
+def _invoke(stage, inputs):
+    return llm_resilience.call(stage, lambda: _pipeline(stage).invoke(inputs), _reserved_tokens(stage, inputs))
+
+
+async def _ainvoke(stage, inputs, error_id=None, answers=1):
+    """
+    The `stage` pipeline through llm_resilience, streamed as `stage` events of
+    the error if LLM_STREAMING is on and a reader watches it. Raises CircuitOpenError
+    without calling the LLM while the breaker is open.
+    """
+    on_retry = None
+    if LLM_STREAMING and error_id is not None and analysis_streams.watched(error_id):
+        call = lambda: _astream_structured(stage, inputs, error_id)
+        # readers drop the fields of the failed attempt instead of mixing them with the next one
+        on_retry = lambda attempt: analysis_streams.publish(
+            error_id, "retry", {"error_id": error_id, "stage": stage, "attempt": attempt}
+        )
+    else:
+        call = lambda: _pipeline(stage).ainvoke(inputs)
+    return await llm_resilience.acall(stage, call, _reserved_tokens(stage, inputs, answers), on_retry)
+
+
+def _payload_json(payload, compact):
+    if not PROMPT_COMPACTION:
+        return fast_json.dumps_indent(payload)
+    return compact(payload, PROMPT_TOKEN_BUDGET)
+
+
+def similar_context(similar):
+    """Prompt block with prior analyses of similar errors, "" if there are none."""
+    if not similar:
+        return ""
+    return (
+        "ANALYSES OF SIMILAR PAST ERRORS (similarity 0-1, reuse only what fits this payload):\n"
+        f"{compact_json(similar, SIMILAR_CONTEXT_BUDGET)}\n\n"
+    )
+
+
+def _analysis_inputs(error, similar=None):
+    return {"payload": _payload_json(error, compact_error), "similar": similar_context(similar)}
+
+
+def _solution_inputs(error_analysis):
+    return {"analysis": _payload_json(error_analysis, compact_json)}
+
+
+def _batch_inputs(items):
+    return {"payloads": "\n\n".join(
+        f"ERROR KEY: {key}\n{_payload_json(error, compact_error)}"
+        for key, error in items
+    )}
+
+
+def _analysis_conversation(error, similar=None):
+    return ANALYSIS_PROMPT.format_messages(**_analysis_inputs(error, similar))
+
+
+def _solution_conversation(error_analysis):
+    return SOLUTION_PROMPT.format_messages(**_solution_inputs(error_analysis))
+
+
+def estimate_tokens(error, analysis, solution=None):
+    """Prompt + answer tokens of the analysis (and solution) calls for this error."""
+    messages = _analysis_conversation(error)
+    if solution:
+        messages += _solution_conversation(analysis)
+    answers = [analysis] + ([solution] if solution else [])
+    return sum(count_tokens(m.content) for m in messages) + sum(count_tokens(json.dumps(a)) for a in answers)
+
+
+def analyze_error_node(error, similar=None):
+    logger.debug("analysis LLM call started")
+    result: ErrorAnalysis = _invoke("analysis", _analysis_inputs(error, similar))
+    logger.debug("analysis LLM call done")
+    
     final_result = result.model_dump()
     return final_result
+
+
+async def aanalyze_error_node(error, error_id=None, similar=None):
+    # batched prompts carry payloads only, errors with similar-error context go alone
+    if LLM_BATCH_SIZE > 1 and not similar:
+        return await analysis_batcher.submit(_batch_key(error_id), error)
+    return await _aanalyze_one(error, similar, error_id)
+
+
+async def _aanalyze_one(error, similar=None, error_id=None):
+    result: ErrorAnalysis = await _ainvoke("analysis", _analysis_inputs(error, similar), error_id)
     
+    final_result = result.model_dump()
+    return final_result
+
+
+async def _astream_structured(stage, inputs, error_id):
+    """
+    Structured output through a forced tool call, streamed: every chunk the
+    fields parsed so far go out as a `stage` event of the error. Time to the
+    first non-empty field is observed into the "<stage>_first_field" histogram.
+    """
+    chain = _pipeline(stage, stream=True)
+    start = time.perf_counter()
+    first = True
+    partial = None
+    async for partial in chain.astream(inputs):
+        if not partial:
+            continue
+        if first:
+            histogram(f"{stage}_first_field").observe(time.perf_counter() - start)
+            first = False
+        analysis_streams.publish(error_id, stage, partial)
+    if not partial:
+        raise OutputParserException(f"{stage} stream ended without any structured output")
+    return _STAGES[stage][1].model_validate(partial)
+
+
+async def aanalyze_error_batch(items):
+    """One structured-output request for several errors -> {error key: analysis}."""
+    metrics = {}
+    with _llm_metrics("analysis_batch", metrics):
+        result: ErrorAnalysisBatch = await _ainvoke("analysis_batch", _batch_inputs(items), answers=len(items))
+    # a batch is one request, its tokens are logged here and not per error
+    logger.info("analysis batch done", extra={"batch_size": len(items), **metrics})
+    return {a.error_key: a.model_dump(exclude={"error_key"}) for a in result.analyses}
+
+
+async def _aanalyze_fallback(error):
+    """An error the batched answer missed, analyzed on its own."""
+    with _llm_metrics("analysis_fallback", {}):
+        return await _aanalyze_one(error)
+
+
+_batch_keys = itertools.count(1)
+
+
+def _batch_key(error_id):
+    return str(error_id) if error_id is not None else f"n{next(_batch_keys)}"
+
+
+analysis_batcher = MicroBatcher(aanalyze_error_batch, _aanalyze_fallback, LLM_BATCH_SIZE, LLM_BATCH_WAIT_MS / 1000)
+
+
+def generate_solution_node(error_analysis):
+    result : ErrorSolution = _invoke("solution", _solution_inputs(error_analysis))
+    final_result = result.model_dump()
+    return final_result
+
+
+async def agenerate_solution_node(error_analysis, error_id=None):
+    result : ErrorSolution = await _ainvoke("solution", _solution_inputs(error_analysis), error_id)
+    final_result = result.model_dump()
+    return final_result
+
+
+def _merge_metrics(left, right):
+    return {**(left or {}), **(right or {})}
+
+
+class ErrorState(TypedDict, total=False):
+    error_id: int
+    error: Dict[str, Any]
+    analysis: Dict[str, Any]
+    solution: Optional[Dict[str, Any]]
+    similar: List[Dict[str, Any]]
+    # per-step timings (ms) and LLM tokens of this run, logged when it is persisted
+    # merged, persist_analysis and solve write it in the same step
+    metrics: Annotated[Dict[str, Any], _merge_metrics]
+
+
+def _record_usage(usage_metadata):
+    """{model: usage} -> llm_tokens_total counters, returns the total tokens."""
+    total = 0
+    for model, usage in usage_metadata.items():
+        counter("llm_tokens_total", model=model, type="prompt").inc(usage.get("input_tokens", 0))
+        counter("llm_tokens_total", model=model, type="completion").inc(usage.get("output_tokens", 0))
+        total += usage.get("total_tokens", 0)
+    return total
+
+
+# registered once: get_usage_metadata_callback() adds a configure hook per call, for good
+_stage_usage: ContextVar[Optional[UsageMetadataCallbackHandler]] = ContextVar("llm_stage_usage", default=None)
+register_configure_hook(_stage_usage, inheritable=True)
+
+
+@contextmanager
+def _llm_metrics(stage, metrics):
+    """
+    Wall time and tokens of the LLM call(s) in the block -> "<stage>_llm" histogram,
+    llm_tokens_total and metrics["<stage>_ms"/"<stage>_tokens"]. Answers that do
+    not parse into the schema count in llm_parse_failures_total.
+    """
+    usage = UsageMetadataCallbackHandler()
+    reset = _stage_usage.set(usage)
+    try:
+        with timed(f"{stage}_llm") as timing:
+            yield
+    except (OutputParserException, ValidationError):
+        counter("llm_parse_failures_total", stage=stage).inc()
+        raise
+    finally:
+        _stage_usage.reset(reset)
+        # spent even when the answer was unusable
+        tokens = _record_usage(usage.usage_metadata)
+    metrics[f"{stage}_ms"] = timing.ms
+    metrics[f"{stage}_tokens"] = tokens
+
+
+def _analyze(state: ErrorState):
+    metrics = {}
+    with _llm_metrics("analysis", metrics):
+        result = analyze_error_node(state["error"], state.get("similar"))
+    result["urgency"] = to_level(result["urgency"])
+    return {"analysis": result, "metrics": metrics}
+
+
+async def _aanalyze(state: ErrorState):
+    metrics = {}
+    with _llm_metrics("analysis", metrics):
+        result = await aanalyze_error_node(state["error"], state.get("error_id"), state.get("similar"))
+    result["urgency"] = to_level(result["urgency"])
+    analysis_streams.publish(state.get("error_id"), "analysis_done", result)
+    return {"analysis": result, "metrics": metrics}
+
+
+def _solve(state: ErrorState):
+    metrics = {}
+    with _llm_metrics("solution", metrics):
+        solution = generate_solution_node(state["analysis"])
+    return {"solution": solution, "metrics": metrics}
+
+
+async def _asolve(state: ErrorState):
+    metrics = {}
+    with _llm_metrics("solution", metrics):
+        solution = await agenerate_solution_node(state["analysis"], state.get("error_id"))
+    analysis_streams.publish(state.get("error_id"), "solution_done", solution)
+    return {"solution": solution, "metrics": metrics}
+
+
+def needs_solution(analysis):
+    return LEVEL_ORDER[analysis["urgency"]] >= LEVEL_ORDER[SOLUTION_MIN_URGENCY]
+
+
+def _after_analysis(state: ErrorState):
+    if not needs_solution(state["analysis"]):
+        return ["persist_analysis"]
+    # both run in the same step, the analysis commit overlaps the solution LLM call
+    return ["persist_analysis", "solve"]
+
+
+def build_error_graph(persist_analysis: Runnable, persist: Runnable, checkpointer):
+    """
+    analyze -> persist_analysis + solve -> persist
+
+    solve is skipped for analyses below SOLUTION_MIN_URGENCY. The persist steps
+    are supplied by the caller (services/error_service.py). With a checkpointer
+    a run keyed by thread_id resumes after the last finished node, so a restart
+    does not pay for the same LLM call twice.
+    """
+    # imported on first build, not when ai.graph is imported
+    from langgraph.graph import END, START, StateGraph
+
+    graph = StateGraph(ErrorState)
+    graph.add_node("analyze", RunnableLambda(_analyze, afunc=_aanalyze))
+    graph.add_node("persist_analysis", persist_analysis)
+    graph.add_node("solve", RunnableLambda(_solve, afunc=_asolve))
+    graph.add_node("persist", persist)
+
+    graph.add_edge(START, "analyze")
+    graph.add_conditional_edges("analyze", _after_analysis, ["persist_analysis", "solve"])
+    graph.add_edge("persist_analysis", "persist")
+    graph.add_edge("solve", "persist")
+    graph.add_edge("persist", END)
+    return graph.compile(checkpointer=checkpointer)
@@ -3,6 +3,18 @@ from typing import List, Literal
 
 Severity = Literal["error", "warning", "info"]
 
+# error|warning|info (generator payloads, LLM output) -> high|medium|low (stored)
+LEVEL_ORDER = {"low": 0, "medium": 1, "high": 2}
+
+
+def to_level(value):
+    if value == "error":
+        return "high"
+    elif value == "warning":
+        return "medium"
+    else:
+        return "low"
+
 #tablica Error
 #tablica ErrorAnalysis
 #tablica ErrorSolution
@@ -18,6 +30,12 @@ class ErrorAnalysis(BaseModel):
     deeper_investigation: List[str]
     assumptions: List[str] = []
 
+class BatchedErrorAnalysis(ErrorAnalysis):
+    error_key: str
+
+class ErrorAnalysisBatch(BaseModel):
+    analyses: List[BatchedErrorAnalysis]
+
 class CodeFix(BaseModel):
     file: str
     description: str
@@ -0,0 +1,342 @@
+# app/ai/resilience.py
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+# 408/409 are what the OpenAI client retries as well, 429 and 5xx are the provider being busy
+_RETRYABLE_STATUS = {408, 409, 429}
+# openai.APIConnectionError (APITimeoutError is one), httpx.TransportError: never got an answer
+_RETRYABLE_ERRORS = {"APIConnectionError", "TransportError"}
+
+
+class CircuitOpenError(RuntimeError):
+    """The call was not made: the LLM circuit breaker is open for another `retry_after` seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit breaker is open, calls resume in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Provider trouble worth another attempt: timeouts, lost connections, 408/409/429/5xx."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in _RETRYABLE_STATUS or status >= 500
+    return any(cls.__name__ in _RETRYABLE_ERRORS for cls in type(exc).__mro__)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked to wait (retry-after-ms / Retry-After headers), None if it did not say."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers["retry-after-ms"]) / 1000)
+    except (KeyError, TypeError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        # HTTP-date form
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _reason(exc: BaseException) -> str:
+    if isinstance(exc, TimeoutError):
+        return "timeout"
+    status = getattr(exc, "status_code", None)
+    return str(status) if isinstance(status, int) else "connection"
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute over every LLM call of this process, as two
+    token buckets refilled continuously (a minute's worth of burst). A call
+    reserves its share up front and waits until the buckets cover it, so callers
+    are served in order instead of racing. 0 = no limit.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+
+        self.waits = 0
+        self.waited = 0.0
+
+    @property
+    def counts_tokens(self) -> bool:
+        return self.tpm > 0
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Book one request of `tokens` tokens, returns the seconds to wait before sending it."""
+        if self.rpm <= 0 and self.tpm <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._updated = now - self._updated, now
+            wait = 0.0
+            if self.rpm > 0:
+                self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60) - 1
+                wait = max(wait, -self._requests * 60 / self.rpm)
+            if self.tpm > 0:
+                self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60) - tokens
+                wait = max(wait, -self._tokens * 60 / self.tpm)
+        if wait > 0:
+            self.waits += 1
+            self.waited += wait
+            histogram("llm_rate_limit_wait").observe(wait)
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "waits": self.waits,
+            "waited_s": round(self.waited, 2),
+        }
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` failed calls in a row. Open rejects calls with
+    CircuitOpenError for `cooldown` seconds, then half-open lets one probe call
+    through: success closes it, another failure opens it again. 0 failures = off.
+    Only provider trouble (is_retryable) counts as a failure, a bad answer does not.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name: str, failures: int, cooldown: float):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+        gauge("llm_circuit_state", breaker=name).set(0)
+
+    def _set(self, state: str):
+        self.state = state
+        gauge("llm_circuit_state", breaker=self.name).set(self.STATES[state])
+        counter("llm_circuit_transitions_total", breaker=self.name, state=state).inc()
+
+    def retry_after(self) -> float:
+        """Seconds until calls go through again, 0 if they do now."""
+        with self._lock:
+            if self.state == "open":
+                return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+            if self.state == "half_open" and self._probing:
+                # the probe decides, check back shortly
+                return min(1.0, self.cooldown)
+            return 0.0
+
+    def before_call(self):
+        """Raises CircuitOpenError instead of letting the call through."""
+        if self.failures <= 0:
+            return
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(remaining)
+                self._set("half_open")
+                logger.info("🔌 LLM circuit breaker half-open, sending a probe call")
+            if self.state == "half_open":
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(min(1.0, self.cooldown))
+                self._probing = True
+
+    def abandon(self):
+        """A call that was let through ended without an outcome (cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def success(self):
+        with self._lock:
+            self._failed = 0
+            self._probing = False
+            if self.state != "closed":
+                self._set("closed")
+                logger.info("🔌 LLM circuit breaker closed, provider answers again")
+
+    def failure(self):
+        if self.failures <= 0:
+            return
+        with self._lock:
+            self._failed += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self._failed >= self.failures):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                self._set("open")
+                logger.warning(
+                    f"⚠️  LLM circuit breaker open after {self._failed} failed calls, "
+                    f"analyses wait {self.cooldown}s"
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures_in_a_row": self._failed,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after_s": round(self.retry_after(), 2),
+        }
+
+
+class Resilience:
+    """
+    Every LLM call goes through `call`/`acall`: breaker check, rate limiter, a
+    per-attempt `timeout` and retries with full-jitter exponential backoff
+    (at least what Retry-After asks for), all within `deadline` seconds per call.
+    """
+
+    def __init__(self, timeout: float, deadline: float, max_retries: int, base_delay: float,
+                 max_delay: float, limiter: RateLimiter, breaker: CircuitBreaker):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter
+        self.breaker = breaker
+
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.gave_up = 0
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """Delay before retry number `attempt` + 1 (0-based)."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        asked = retry_after(exc)
+        if asked is not None:
+            # jitter on top, so everyone told "10s" does not come back at once
+            delay = asked + random.uniform(0, self.base_delay)
+        return delay
+
+    def _attempt_timeout(self, started: float) -> Optional[float]:
+        remaining = self.deadline - (time.monotonic() - started) if self.deadline > 0 else None
+        if self.timeout <= 0:
+            return remaining
+        return self.timeout if remaining is None else min(self.timeout, remaining)
+
+    def _retry_delay(self, stage: str, attempt: int, exc: BaseException, started: float) -> Optional[float]:
+        """Seconds to wait before the next attempt, None to give up and raise."""
+        if isinstance(exc, TimeoutError):
+            self.timeouts += 1
+            counter("llm_timeouts_total", stage=stage).inc()
+        if not is_retryable(exc):
+            # the provider answered, just not usefully: not its health
+            self.breaker.success()
+            return None
+        self.breaker.failure()
+        delay = self.backoff(attempt, exc)
+        if attempt >= self.max_retries or (
+            self.deadline > 0 and time.monotonic() - started + delay >= self.deadline
+        ):
+            self.gave_up += 1
+            counter("llm_retries_exhausted_total", stage=stage).inc()
+            return None
+        self.retries += 1
+        counter("llm_retries_total", stage=stage, reason=_reason(exc)).inc()
+        detail = str(exc)[:200]
+        logger.warning(
+            f"🔁 {stage} LLM call failed ({_reason(exc)}{': ' + detail if detail else ''}), "
+            f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+        )
+        return delay
+
+    def call(self, stage: str, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """Sync variant: the per-attempt timeout is the HTTP client's (get_llm), not enforced here."""
+        self.calls += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            wait = self.limiter.reserve(tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(stage, attempt, e, started)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            self.breaker.success()
+            return result
+
+    async def acall(self, stage: str, fn: Callable[[], Awaitable[Any]], tokens: int = 0,
+                    on_retry: Optional[Callable[[int], None]] = None) -> Any:
+        """on_retry(attempt) runs right before every attempt after the first (1-based retry number)."""
+        self.calls += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            wait = self.limiter.reserve(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            timeout = self._attempt_timeout(started)
+            try:
+                async with asyncio.timeout(max(timeout, 0.0)) if timeout is not None else nullcontext():
+                    result = await fn()
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                delay = self._retry_delay(stage, attempt, e, started)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                if on_retry is not None:
+                    on_retry(attempt)
+                continue
+            self.breaker.success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "timeout_s": self.timeout,
+            "deadline_s": self.deadline,
+            "max_retries": self.max_retries,
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "gave_up": self.gave_up,
+            "rate_limiter": self.limiter.stats(),
+            "circuit_breaker": self.breaker.stats(),
+        }
@@ -0,0 +1,43 @@
+"""add error fingerprints
+
+Revision ID: 3f9a1c2d7e41
+Revises: b7210757cecf
+Create Date: 2026-10-18 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7e41'
+down_revision: Union[str, Sequence[str], None] = 'b7210757cecf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('errors', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_errors_fingerprint'), 'errors', ['fingerprint'], unique=False)
+    op.create_table('error_fingerprints',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('error_name', sa.String(length=200), nullable=False),
+    sa.Column('canonical_error_id', sa.Integer(), nullable=True),
+    sa.Column('occurrences', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('first_seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('last_seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['canonical_error_id'], ['errors.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('fingerprint')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('error_fingerprints')
+    op.drop_index(op.f('ix_errors_fingerprint'), table_name='errors')
+    op.drop_column('errors', 'fingerprint')
@@ -0,0 +1,35 @@
+"""add errors read indexes
+
+Revision ID: 8c4e2b7d1f09
+Revises: 3f9a1c2d7e41
+Create Date: 2026-10-18 14:03:27.551962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2b7d1f09'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # id is the keyset tiebreaker for rows created in the same instant
+    # CONCURRENTLY: errors keeps taking webhooks while the indexes build (needs autocommit)
+    with op.get_context().autocommit_block():
+        op.create_index('ix_errors_created_at', 'errors', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_errors_name_created_at', 'errors', ['name', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_errors_severity', 'errors', ['severity', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_errors_severity', table_name='errors', postgresql_concurrently=True)
+        op.drop_index('ix_errors_name_created_at', table_name='errors', postgresql_concurrently=True)
+        op.drop_index('ix_errors_created_at', table_name='errors', postgresql_concurrently=True)
@@ -0,0 +1,40 @@
+"""add error stats buckets
+
+Revision ID: d52f7a9e3b18
+Revises: 8c4e2b7d1f09
+Create Date: 2026-10-18 16:41:09.274310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52f7a9e3b18'
+down_revision: Union[str, Sequence[str], None] = '8c4e2b7d1f09'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('error_stats_buckets',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=200), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularity', 'dimension', 'value', 'bucket_start', name='uq_error_stats_buckets_key')
+    )
+    op.create_index('ix_error_stats_buckets_window', 'error_stats_buckets', ['granularity', 'bucket_start'], unique=False)
+    # fill from existing history: python -m services.stats_rollup rebuild
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_error_stats_buckets_window', table_name='error_stats_buckets')
+    op.drop_table('error_stats_buckets')
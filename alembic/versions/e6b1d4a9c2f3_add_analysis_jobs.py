@@ -0,0 +1,46 @@
+"""add analysis jobs
+
+Revision ID: e6b1d4a9c2f3
+Revises: d52f7a9e3b18
+Create Date: 2026-10-18 18:22:41.906115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b1d4a9c2f3'
+down_revision: Union[str, Sequence[str], None] = 'd52f7a9e3b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('analysis_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('error_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), server_default='pending', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('run_after', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('leased_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('worker', sa.String(length=100), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['error_id'], ['errors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('error_id')
+    )
+    op.create_index('ix_analysis_jobs_due', 'analysis_jobs', ['status', 'run_after'], unique=False)
+    op.create_index('ix_analysis_jobs_lease', 'analysis_jobs', ['status', 'leased_until'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_analysis_jobs_lease', table_name='analysis_jobs')
+    op.drop_index('ix_analysis_jobs_due', table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
@@ -0,0 +1,76 @@
+"""
+Per-error analysis calls vs micro-batched ones (LLM_BATCH_SIZE) on the stub model.
+
+Both modes go through the same provider concurrency limit, which is what makes
+bursts queue up in production. Reports input/output tokens (from llm_tokens_total: batches
+run in their own context, out of reach of a caller's usage callback) and wall-clock per error.
+
+    python -m benchmarks.analysis_batching --errors 200 --batch-size 8 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--errors", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batch-wait-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="max parallel LLM requests (provider limit)")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub LLM latency per request (s)")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="stub LLM latency per output token (s)")
+    args = parser.parse_args()
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    os.environ["FAKE_LLM_TOKEN_LATENCY"] = str(args.token_latency)
+
+    from ai import graph
+    from ai.batching import MicroBatcher
+    from error_sending.config import ERRORS
+    from services.metrics import counter_total
+
+    payloads = [ERRORS[i % len(ERRORS)] for i in range(args.errors)]
+
+    async def run(mode):
+        limit = asyncio.Semaphore(args.concurrency)
+
+        async def single(error):
+            async with limit:
+                with graph._llm_metrics("analysis", {}):
+                    return await graph._aanalyze_one(error)
+
+        async def batch(items):
+            async with limit:
+                return await graph.aanalyze_error_batch(items)
+
+        batcher = MicroBatcher(batch, single, args.batch_size, args.batch_wait_ms / 1000)
+        before = {t: counter_total("llm_tokens_total", type=t) for t in ("prompt", "completion")}
+        start = time.perf_counter()
+        if mode == "per-error":
+            await asyncio.gather(*(single(p) for p in payloads))
+        else:
+            await asyncio.gather(*(batcher.submit(str(i), p) for i, p in enumerate(payloads)))
+        elapsed = time.perf_counter() - start
+        tokens = {t: counter_total("llm_tokens_total", type=t) - n for t, n in before.items()}
+        return elapsed, tokens, batcher.stats()
+
+    for mode in ("per-error", "batched"):
+        elapsed, tokens, stats = asyncio.run(run(mode))
+        line = (
+            f"{mode:9}: {elapsed / args.errors * 1000:7.1f} ms/error wall-clock, "
+            f"{tokens['prompt'] / args.errors:7.1f} input + {tokens['completion'] / args.errors:6.1f} output tokens/error"
+        )
+        if mode == "batched":
+            line += f", avg batch {stats['avg_batch_size']}, fallbacks {stats['fallbacks']}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Analysis throughput of the durable job queue per number of worker processes.
+
+Writes --errors distinct errors with their pending jobs (as receivers with
+ANALYSIS_IN_PROCESS=off do), starts N processes of services/analysis_worker.py
+with the stub LLM (--llm-latency per call) and times until every job is done,
+for each N in --workers. Dedup and similarity reuse are kept out of it: every
+error has its own fingerprint and needs both LLM calls.
+
+Scratch SQLite database by default (claims are serialized there, no SKIP
+LOCKED), --database-url for a local Postgres with the schema (alembic upgrade
+head); its errors and jobs are deleted between runs.
+
+    python -m benchmarks.analysis_jobs --errors 400 --workers 1 2 4
+"""
+import argparse
+import os
+import random
+import signal
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def letters(rng, n=8):
+    # digits are normalized out of fingerprints, letters keep them distinct
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+
+
+def payload(rng):
+    name = f"Bench{letters(rng).capitalize()}Error"
+    return {
+        "error_name": name,
+        "status_code": 500,
+        "severity": "error",
+        "detail": f"{name} in {letters(rng)}",
+        "context": {"service": f"{letters(rng)}-service", "stack_trace": ""},
+    }
+
+
+def start_worker(i, env, log):
+    return subprocess.Popen(
+        [sys.executable, "-m", "services.analysis_worker", "--name", f"bench-{i}"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+
+
+def wait_started(logs, timeout):
+    """Until every worker logged its start line: process startup is not part of the timing."""
+    deadline = time.monotonic() + timeout
+    while not all("Analysis worker" in Path(log.name).read_text(errors="replace") for log in logs):
+        if time.monotonic() > deadline:
+            raise SystemExit("workers did not start, see their logs in " + str(Path(logs[0].name).parent))
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--errors", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker process counts to time")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent analyses per worker (ANALYSIS_WORKERS)")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per stub LLM call")
+    parser.add_argument("--database-url", help="default: a scratch SQLite file")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    create = args.database_url is None
+    if create:
+        args.database_url = f"sqlite:///{scratch.name}/analysis_jobs.sqlite"
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import delete
+    from db.models import AnalysisJob, Base, Error, ErrorAnalysis, ErrorFingerprint, ErrorSolution
+    from db.repositories.error_repo import save_errors_bulk
+    from db.repositories.job_repo import job_counts
+    from db.session import SessionLocal, get_engine
+
+    if create:
+        Base.metadata.create_all(get_engine())
+
+    env = {
+        **os.environ,
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "ANALYSIS_WORKERS": str(args.concurrency),
+        "SOLUTION_WORKERS": str(args.concurrency),
+        "ANALYSIS_POLL_INTERVAL": "0.2",
+        "SIMILARITY_THRESHOLD": "2",  # cosine never gets there, no reuse
+        "GRAPH_CHECKPOINTER": "memory",
+        "LOG_FORMAT": "text",
+    }
+    rng = random.Random(0)
+    baseline = None
+    print(f"{args.errors} errors, {args.concurrency} analyses per worker, stub LLM {args.llm_latency * 1000:.0f} ms/call")
+    print(f"{'workers':>8} {'seconds':>9} {'errors/s':>9} {'speedup':>8} {'failed':>7}")
+
+    for n in args.workers:
+        with SessionLocal() as db:
+            for model in (AnalysisJob, ErrorSolution, ErrorAnalysis, ErrorFingerprint, Error):
+                db.execute(delete(model))
+            db.commit()
+
+        logs = [open(Path(scratch.name) / f"worker-{n}-{i}.log", "w") for i in range(n)]
+        workers = [start_worker(i, env, log) for i, log in enumerate(logs)]
+        try:
+            wait_started(logs, 120)
+            with SessionLocal() as db:
+                save_errors_bulk(db, [(payload(rng), letters(rng, 32)) for _ in range(args.errors)], with_jobs=True)
+                db.commit()
+            start = time.perf_counter()
+            while True:
+                with SessionLocal() as db:
+                    counts = job_counts(db)
+                if counts.get("done", 0) + counts.get("failed", 0) >= args.errors:
+                    break
+                if time.perf_counter() - start > args.timeout:
+                    raise SystemExit(f"timed out with jobs {counts}")
+                time.sleep(0.1)
+            elapsed = time.perf_counter() - start
+        finally:
+            for worker in workers:
+                worker.send_signal(signal.SIGTERM)
+            for worker in workers:
+                try:
+                    worker.wait(30)
+                except subprocess.TimeoutExpired:
+                    os.killpg(worker.pid, signal.SIGKILL)
+            for log in logs:
+                log.close()
+
+        rate = args.errors / elapsed
+        baseline = baseline or rate
+        print(f"{n:>8} {elapsed:>9.2f} {rate:>9.1f} {rate / baseline:>7.2f}x {counts.get('failed', 0):>7}")
+
+    get_engine().dispose()
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
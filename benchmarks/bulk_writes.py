@@ -0,0 +1,130 @@
+"""
+Rows/sec of the per-row write path vs bulk inserts/upserts vs the write-behind buffer.
+
+Every error is written the way an analyzed error is: the error row, its
+analysis, its solution and the fingerprint upsert.
+
+  per-row      : one session + commit per write, like persist_error/_persist today
+  bulk         : save_errors_bulk + upserts, one commit per --batch errors (backlog replay)
+  write-behind : --writers concurrent coroutines through WriteBehindBuffer (bursts)
+
+Point DATABASE_URL at a scratch database with the schema (alembic upgrade head),
+rows written by the run are deleted at the end:
+
+    DATABASE_URL=postgresql://localhost/errors_bench python -m benchmarks.bulk_writes --errors 2000
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--errors", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=200, help="errors per commit in bulk mode / rows per flush in write-behind mode")
+    parser.add_argument("--batch-ms", type=float, default=20, help="write-behind flush interval")
+    parser.add_argument("--writers", type=int, default=64, help="concurrent writers in write-behind mode")
+    parser.add_argument("--fingerprints", type=int, default=50, help="distinct fingerprints among the errors")
+    args = parser.parse_args()
+
+    from sqlalchemy import delete
+    from ai.fake_llm import FakeChatModel
+    from db.models import Error, ErrorAnalysis, ErrorFingerprint, ErrorSolution
+    from db.repositories.error_repo import (
+        record_fingerprint,
+        record_fingerprints_bulk,
+        save_error,
+        save_error_analysis,
+        save_error_solution,
+        save_errors_bulk,
+        upsert_error_analyses,
+        upsert_error_solutions,
+    )
+    from db.session import SessionLocal, async_engine
+    from error_sending.config import ERRORS
+    from langchain_core.messages import HumanMessage
+    from ai.models import ErrorAnalysis as AnalysisModel, ErrorSolution as SolutionModel
+    from services.write_buffer import WriteBehindBuffer
+
+    # schema-valid analysis/solution samples from the stub model, no LLM involved
+    stub = FakeChatModel(latency=0)
+    analysis = stub.with_structured_output(AnalysisModel).invoke([HumanMessage("bench")]).model_dump()
+    analysis["urgency"] = "high"
+    solution = stub.with_structured_output(SolutionModel).invoke([HumanMessage("bench")]).model_dump()
+
+    run = uuid.uuid4().hex[:8]
+    payloads = [dict(ERRORS[i % len(ERRORS)], error_name=ERRORS[i % len(ERRORS)]["name"]) for i in range(args.errors)]
+    fingerprints = [f"bench-{run}-{i % args.fingerprints}" for i in range(args.errors)]
+    written_ids = []
+
+    def per_row():
+        for payload, fingerprint in zip(payloads, fingerprints):
+            with SessionLocal() as db:
+                err = save_error(db, payload, fingerprint)
+                db.commit()
+                error_id = err.id
+            with SessionLocal() as db:
+                save_error_analysis(db, error_id, analysis)
+                db.commit()
+            with SessionLocal() as db:
+                save_error_solution(db, error_id, solution)
+                record_fingerprint(db, fingerprint, payload["error_name"], error_id)
+                db.commit()
+            written_ids.append(error_id)
+
+    def bulk():
+        for i in range(0, args.errors, args.batch):
+            chunk = list(zip(payloads[i:i + args.batch], fingerprints[i:i + args.batch]))
+            with SessionLocal() as db:
+                ids = save_errors_bulk(db, chunk)
+                upsert_error_analyses(db, [(error_id, analysis) for error_id in ids])
+                upsert_error_solutions(db, [(error_id, solution) for error_id in ids])
+                record_fingerprints_bulk(db, [(fp, p["error_name"], error_id) for (p, fp), error_id in zip(chunk, ids)])
+                db.commit()
+            written_ids.extend(ids)
+
+    async def write_behind():
+        buffer = WriteBehindBuffer(args.batch, args.batch_ms / 1000)
+        todo = iter(zip(payloads, fingerprints))
+
+        async def writer():
+            for payload, fingerprint in todo:
+                error_id, = await buffer.write(("error", (payload, fingerprint)))
+                await buffer.write(("analysis", (error_id, analysis)))
+                await buffer.write(("solution", (error_id, solution)), ("fingerprint", (fingerprint, payload["error_name"], error_id)))
+                written_ids.append(error_id)
+
+        await asyncio.gather(*(writer() for _ in range(args.writers)))
+        await buffer.drain()
+        await async_engine.dispose()
+        return buffer.stats()
+
+    def cleanup():
+        with SessionLocal() as db:
+            for i in range(0, len(written_ids), 1000):
+                ids = written_ids[i:i + 1000]
+                db.execute(delete(ErrorAnalysis).where(ErrorAnalysis.error_id.in_(ids)))
+                db.execute(delete(ErrorSolution).where(ErrorSolution.error_id.in_(ids)))
+                db.execute(delete(Error).where(Error.id.in_(ids)))
+            db.execute(delete(ErrorFingerprint).where(ErrorFingerprint.fingerprint.like(f"bench-{run}-%")))
+            db.commit()
+        written_ids.clear()
+
+    for name, mode in (("per-row", per_row), ("bulk", bulk), ("write-behind", write_behind)):
+        start = time.perf_counter()
+        result = asyncio.run(mode()) if asyncio.iscoroutinefunction(mode) else mode()
+        elapsed = time.perf_counter() - start
+        line = f"{name:12}: {args.errors} errors in {elapsed:6.2f}s -> {args.errors / elapsed:8.1f} errors/s ({args.errors * 4 / elapsed:8.1f} rows/s)"
+        if result:
+            line += f", avg {result['avg_rows_per_flush']} rows/flush"
+        print(line)
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
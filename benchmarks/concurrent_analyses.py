@@ -0,0 +1,65 @@
+"""
+How many analyses can one process keep in flight?
+
+Runs analyze + solution generation for N errors against the offline stub model
+(ai/fake_llm.py), first one by one through the sync nodes, then concurrently
+through the async nodes, and prints throughput and peak in-flight count.
+
+    python -m benchmarks.concurrent_analyses --errors 500 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--errors", type=int, default=500)
+    parser.add_argument("--sync-errors", type=int, default=5, help="errors for the sequential baseline")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM latency per call (s)")
+    args = parser.parse_args()
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+
+    from ai.graph import aanalyze_error_node, agenerate_solution_node, analyze_error_node, generate_solution_node
+    from error_sending.config import ERRORS
+
+    payloads = [ERRORS[i % len(ERRORS)] for i in range(args.errors)]
+
+    start = time.perf_counter()
+    for payload in payloads[:args.sync_errors]:
+        generate_solution_node(analyze_error_node(payload))
+    sync_elapsed = time.perf_counter() - start
+
+    in_flight = 0
+    peak = 0
+
+    async def run_one(payload):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            analysis = await aanalyze_error_node(payload)
+            await agenerate_solution_node(analysis)
+        finally:
+            in_flight -= 1
+
+    async def run_all():
+        await asyncio.gather(*(run_one(p) for p in payloads))
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    async_elapsed = time.perf_counter() - start
+
+    print(f"sync : {args.sync_errors} errors in {sync_elapsed:.2f}s -> {args.sync_errors / sync_elapsed:.1f} errors/s, peak in-flight 1")
+    print(f"async: {args.errors} errors in {async_elapsed:.2f}s -> {args.errors / async_elapsed:.1f} errors/s, peak in-flight {peak}")
+
+
+if __name__ == "__main__":
+    main()
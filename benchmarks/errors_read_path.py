@@ -0,0 +1,104 @@
+"""
+Latency of the /errors read queries on a large errors table.
+
+Seeds --rows synthetic errors spread over --days (skip with --no-seed on a
+second run), then times the first page, keyset (cursor) pages at growing
+depths next to OFFSET pagination at the same depths, and the name/severity/
+time-range filters. With the indexes from 8c4e2b7d1f09 the keyset and
+filtered p99 stay flat with depth, OFFSET grows linearly.
+
+Use a scratch database (alembic upgrade head):
+
+    DATABASE_URL=postgresql://localhost/errors_bench python -m benchmarks.errors_read_path --rows 3000000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SEVERITIES = ["high", "medium", "low"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--days", type=int, default=30, help="seeded created_at spread")
+    parser.add_argument("--no-seed", action="store_true", help="reuse rows from a previous run")
+    parser.add_argument("--repeat", type=int, default=200, help="queries per measurement")
+    parser.add_argument("--limit", type=int, default=50, help="page size")
+    args = parser.parse_args()
+
+    from sqlalchemy import insert, select
+    from db.models import Error
+    from db.repositories.error_repo import encode_cursor, list_errors
+    from db.session import SessionLocal
+    from error_sending.config import ERRORS
+
+    names = [e["name"] for e in ERRORS]
+    now = datetime.now(timezone.utc)
+
+    if not args.no_seed:
+        rng = random.Random(42)
+        span = args.days * 86400
+        start = time.perf_counter()
+        with SessionLocal() as db:
+            for i in range(0, args.rows, 10_000):
+                rows = []
+                for _ in range(min(10_000, args.rows - i)):
+                    name = rng.choice(names)
+                    rows.append({
+                        "name": name,
+                        "status_code": 500,
+                        "severity": rng.choice(SEVERITIES),
+                        "detail": "seeded by benchmarks.errors_read_path",
+                        "payload": {"error_name": name},
+                        "created_at": now - timedelta(seconds=rng.uniform(0, span)),
+                    })
+                db.execute(insert(Error), rows)
+                db.commit()
+        print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    def measure(label, query):
+        timings = []
+        with SessionLocal() as db:
+            query(db)  # warm up
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                query(db)
+                timings.append((time.perf_counter() - t) * 1000)
+        q = statistics.quantiles(timings, n=100)
+        print(f"{label:34} p50 {q[49]:8.2f} ms   p99 {q[98]:8.2f} ms")
+
+    ordered = select(Error).order_by(Error.created_at.desc(), Error.id.desc())
+
+    measure("first page", lambda db: list_errors(db, args.limit))
+    for depth in (1_000, 100_000, min(1_000_000, args.rows - args.limit)):
+        with SessionLocal() as db:
+            anchor = db.scalars(ordered.offset(depth - 1).limit(1)).first()
+        if anchor is None:
+            continue
+        cursor = encode_cursor(anchor)
+        measure(f"cursor page at row {depth:,}", lambda db: list_errors(db, args.limit, cursor))
+        measure(
+            f"OFFSET page at row {depth:,}",
+            lambda db: list(db.scalars(ordered.offset(depth).limit(args.limit))),
+        )
+    measure("name filter", lambda db: list_errors(db, args.limit, name=names[0]))
+    measure("severity filter", lambda db: list_errors(db, args.limit, severity="high"))
+    measure(
+        "last hour",
+        lambda db: list_errors(db, args.limit, since=now - timedelta(hours=1)),
+    )
+    measure(
+        "name + day window, 2 weeks back",
+        lambda db: list_errors(db, args.limit, name=names[1], since=now - timedelta(days=15), until=now - timedelta(days=14)),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Pre-generate webhook payloads from the variation engine (error_sending/variation.py)
+into an NDJSON file (gzip for *.gz), replayed by POST /load {"replay": ...} or
+benchmarks/load_test.py --replay without generation cost per request. A bare
+--out file name is written to GENERATOR_REPLAY_DIR (payloads/ by default), the
+only place POST /load replays from.
+
+Prints the generation rate and the cardinality the receiver will see: distinct
+fingerprints (services/dedup.py) and the error type mix.
+
+    python -m benchmarks.generate_payloads --count 1000000 --out payloads.ndjson.gz
+    python -m benchmarks.generate_payloads --count 100000 --services 20 --frame-variants 50 --zipf-s 0.8 --out wide.ndjson
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from error_sending.config import (  # noqa: E402
+    GENERATOR_FRAME_RATE,
+    GENERATOR_FRAME_VARIANTS,
+    GENERATOR_IPS,
+    GENERATOR_PODS,
+    GENERATOR_REPLAY_DIR,
+    GENERATOR_SERVICES,
+    GENERATOR_USERS,
+    GENERATOR_ZIPF_S,
+)
+from error_sending.variation import PayloadVariation, read_payloads, write_payloads  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--out", required=True, help="*.ndjson or *.ndjson.gz, a bare name goes to GENERATOR_REPLAY_DIR")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--zipf-s", type=float, default=GENERATOR_ZIPF_S)
+    parser.add_argument("--services", type=int, default=GENERATOR_SERVICES)
+    parser.add_argument("--frame-variants", type=int, default=GENERATOR_FRAME_VARIANTS)
+    parser.add_argument("--frame-rate", type=float, default=GENERATOR_FRAME_RATE)
+    parser.add_argument("--users", type=int, default=GENERATOR_USERS)
+    parser.add_argument("--pods", type=int, default=GENERATOR_PODS)
+    parser.add_argument("--ips", type=int, default=GENERATOR_IPS)
+    parser.add_argument("--stats-sample", type=int, default=50_000, help="payloads read back for the cardinality report")
+    args = parser.parse_args()
+
+    variation = PayloadVariation(
+        seed=args.seed,
+        zipf_s=args.zipf_s,
+        services=args.services,
+        frame_variants=args.frame_variants,
+        frame_rate=args.frame_rate,
+        users=args.users,
+        pods=args.pods,
+        ips=args.ips,
+    )
+    if not os.path.dirname(args.out):
+        os.makedirs(GENERATOR_REPLAY_DIR, exist_ok=True)
+        args.out = os.path.join(GENERATOR_REPLAY_DIR, args.out)
+    start = time.perf_counter()
+    written = write_payloads(args.out, args.count, variation)
+    elapsed = time.perf_counter() - start
+    print(f"{args.count} payloads, {written / 1e6:.1f} MB of JSON -> {args.out}")
+    print(f"generated at {args.count / elapsed:,.0f}/s ({elapsed:.1f}s)")
+
+    from services.dedup import fingerprint_error
+
+    sample = [json.loads(line) for line in itertools.islice(read_payloads(args.out), args.stats_sample)]
+    start = time.perf_counter()
+    replayed = sum(1 for _ in itertools.islice(read_payloads(args.out), args.stats_sample))
+    print(f"replay reads at {replayed / (time.perf_counter() - start):,.0f}/s")
+
+    fingerprints = Counter(fingerprint_error(payload) for payload in sample)
+    types = Counter(payload["error_name"] for payload in sample)
+    bound = len(types) * args.services * (args.frame_variants + 1)
+    print(f"\nfirst {len(sample)}: {len(fingerprints)} distinct fingerprints (at most {bound} with these settings)")
+    top = sum(count for _, count in fingerprints.most_common(10))
+    print(f"top 10 fingerprints cover {top / len(sample):.1%} of payloads")
+    for name, count in types.most_common():
+        print(f"  {name:<25} {count / len(sample):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Cold import time of the receiver and the modules CLIs/tests touch, from
+`python -X importtime` in a fresh interpreter per run (median of --runs).
+--ref also measures a git revision (checked out into a temporary worktree)
+for a before/after table.
+
+    python -m benchmarks.import_time --runs 7
+    python -m benchmarks.import_time --runs 7 --ref HEAD~1
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = [
+    "error_receiving.webhook_receiver",
+    "services.error_service",
+    "ai.graph",
+    "db.session",
+    "db.repositories.error_repo",
+]
+
+
+def import_ms(cwd, module, env):
+    """Cumulative import time of `module` in ms, None if the import failed."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)$", line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1000
+    return None
+
+
+def measure(cwd, runs, env):
+    results = {}
+    for module in MODULES:
+        times = [import_ms(cwd, module, env) for _ in range(runs)]
+        times = [t for t in times if t is not None]
+        results[module] = statistics.median(times) if times else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ref", help="git revision to compare against, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    env = {
+        **os.environ,
+        # what a worker boots with; a dummy key so older revisions can build ChatOpenAI on import
+        "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/import_time.sqlite"),
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-import-time"),
+        "LLM_PROVIDER": os.environ.get("LLM_PROVIDER", "openai"),
+    }
+    current = measure(ROOT, args.runs, env)
+    before = None
+    if args.ref:
+        with tempfile.TemporaryDirectory(prefix="import_time_") as workdir:
+            subprocess.run(["git", "worktree", "add", "--detach", workdir, args.ref], cwd=ROOT, check=True, capture_output=True)
+            try:
+                before = measure(workdir, args.runs, env)
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", workdir], cwd=ROOT, capture_output=True)
+
+    def fmt(ms):
+        return f"{ms:10.0f}" if ms is not None else f"{'failed':>10}"
+
+    print(f"median of {args.runs} cold imports, ms")
+    header = f"{'module':<34}" + (f"{args.ref:>10}" if before else "") + f"{'now':>10}"
+    print(header + ("   change" if before else ""))
+    for module in MODULES:
+        row = f"{module:<34}"
+        if before:
+            row += fmt(before[module])
+        row += fmt(current[module])
+        if before and before[module] and current[module]:
+            row += f"  {(current[module] - before[module]) / before[module] * 100:+6.1f}%"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
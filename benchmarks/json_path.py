@@ -0,0 +1,107 @@
+"""
+Stdlib json vs the FAST_JSON path (services/fast_json.py, orjson) on the
+built-in error payloads (error_sending/config.py), per stage of one error:
+
+  parse     webhook body -> dict        (request.json() vs decode_error_payload)
+  prompt    payload in the analysis prompt (indent=2 with PROMPT_COMPACTION=off,
+            compact_error with it on)
+  store     payload -> JSON column value (SQLAlchemy's json.dumps vs json_serializer)
+  response  GET /errors page of --page errors (jsonable_encoder + JSONResponse
+            vs FastJSONResponse)
+
+    python -m benchmarks.json_path --repeat 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def per_call_us(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=50, help="errors per GET /errors page")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from ai.compaction import compact_error
+    from ai.graph import PROMPT_TOKEN_BUDGET
+    from error_receiving.webhook_receiver import FastJSONResponse
+    from error_sending.config import ERRORS
+    from services import fast_json
+    from services.error_payload import decode_error_payload
+
+    if fast_json.orjson is None:
+        sys.exit("orjson is not installed (pip install orjson), nothing to compare")
+
+    payloads = []
+    for error in ERRORS:
+        payload = {k: v for k, v in error.items() if k != "name"}
+        payload["error_name"] = error["name"]
+        payload["timestamp"] = "2024-01-15T10:45:00"
+        payloads.append(payload)
+    bodies = [json.dumps(p).encode("utf-8") for p in payloads]
+    page = [{**payloads[i % len(payloads)], "id": i, "received_at": "2024-01-15T10:45:00+00:00"} for i in range(args.page)]
+    page = {"count": len(page), "errors": page, "next_cursor": "MjAyNC0wMS0xNVQxMDo0NTowMHwxMjM="}
+
+    def each(fn):
+        return lambda: [fn(x) for x in payloads]
+
+    stages = {
+        "parse": (
+            lambda: [json.loads(b) for b in bodies],
+            lambda: [decode_error_payload(b) for b in bodies],
+        ),
+        "prompt indent=2": (
+            each(lambda p: json.dumps(p, ensure_ascii=False, indent=2)),
+            each(fast_json.dumps_indent),
+        ),
+        "prompt compact": (
+            each(lambda p: compact_error(p, PROMPT_TOKEN_BUDGET)),
+            each(lambda p: compact_error(p, PROMPT_TOKEN_BUDGET)),
+        ),
+        "store": (
+            each(json.dumps),
+            each(fast_json.dumps),
+        ),
+        "response page": (
+            lambda: JSONResponse(jsonable_encoder(page)),
+            lambda: FastJSONResponse(page),
+        ),
+    }
+
+    print(f"{len(payloads)} built-in payloads ({sum(map(len, bodies)) / len(bodies):.0f} B avg), page of {args.page}")
+    print(f"{'stage':<16}{'stdlib us':>12}{'fast us':>12}{'speedup':>10}")
+    totals = [0.0, 0.0]
+    for name, (slow, fast) in stages.items():
+        # the compaction path calls fast_json too, flip the switch for the stdlib run
+        fast_json.ORJSON = False
+        slow_us = per_call_us(slow, args.repeat)
+        fast_json.ORJSON = True
+        fast_us = per_call_us(fast, args.repeat)
+        if name != "prompt indent=2":
+            totals[0] += slow_us
+            totals[1] += fast_us
+        print(f"{name:<16}{slow_us:>12.1f}{fast_us:>12.1f}{slow_us / fast_us:>9.1f}x")
+    print(f"{'total (compact)':<16}{totals[0]:>12.1f}{totals[1]:>12.1f}{totals[0] / totals[1]:>9.1f}x")
+    print("(parse/prompt/store: all 8 payloads per call; response: one page)")
+
+
+if __name__ == "__main__":
+    main()
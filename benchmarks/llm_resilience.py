@@ -0,0 +1,89 @@
+"""
+Analysis calls against an unreliable stub provider, with and without the
+resilience layer of ai/graph.py (llm_resilience).
+
+The stub fails --failure-rate of its calls with a 503 and takes --latency plus
+up to --jitter seconds (the slow tail). "bare" is a plain call as before:
+no timeout, no retries, no breaker. "resilient" has a --timeout per attempt,
+--retries with backoff and a --deadline per call. Reported per mode: share
+of calls that returned an analysis, latency percentiles and retries.
+
+    python -m benchmarks.llm_resilience --calls 200 --failure-rate 0.2 --jitter 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds per call")
+    parser.add_argument("--jitter", type=float, default=3.0, help="up to this many seconds added per call")
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=2.5, help="seconds per attempt")
+    parser.add_argument("--deadline", type=float, default=10.0, help="seconds per call, retries included")
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["LLM_STREAMING"] = "off"
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    from ai import graph
+    from ai.resilience import CircuitBreaker, RateLimiter, Resilience
+    from services.logging_config import setup_logging
+
+    setup_logging()
+    llm = graph.get_llm()
+    llm.latency, llm.jitter, llm.failure_rate = args.latency, args.jitter, args.failure_rate
+    error = {
+        "error_name": "RateLimitError", "status_code": 429, "severity": "error",
+        "detail": "Rate limit exceeded for API calls", "context": {"service": "api-gateway"},
+    }
+    modes = {
+        "bare": Resilience(0, 0, 0, 0, 0, RateLimiter(0, 0), CircuitBreaker("bench-bare", 0, 0)),
+        # no breaker either: with every call failing now and then it would only add rejections here
+        "resilient": Resilience(
+            args.timeout, args.deadline, args.retries, 0.2, 5.0, RateLimiter(0, 0), CircuitBreaker("bench", 0, 0)
+        ),
+    }
+
+    async def run(resilience):
+        graph.llm_resilience = resilience
+        semaphore = asyncio.Semaphore(args.concurrency)
+        times, ok = [], 0
+
+        async def one():
+            nonlocal ok
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await graph._aanalyze_one(error)
+                    ok += 1
+                except Exception:
+                    pass
+                times.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(one() for _ in range(args.calls)))
+        return ok, sorted(times)
+
+    print(f"{args.calls} calls, failure rate {args.failure_rate}, latency {args.latency}s + up to {args.jitter}s")
+    print(f"{'mode':>10} {'ok %':>7} {'p50 s':>7} {'p95 s':>7} {'max s':>7} {'retries':>8} {'timeouts':>9}")
+    for name, resilience in modes.items():
+        ok, times = asyncio.run(run(resilience))
+        p95 = times[int(len(times) * 0.95) - 1]
+        print(
+            f"{name:>10} {ok / args.calls * 100:>7.1f} {statistics.median(times):>7.2f} {p95:>7.2f} "
+            f"{times[-1]:>7.2f} {resilience.retries:>8} {resilience.timeouts:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+End-to-end load test of the webhook receiver, offline.
+
+Starts the receiver (uvicorn, stub LLM with --llm-latency/--llm-jitter/
+--llm-failure-rate) on a scratch SQLite database or --database-url (a local
+Postgres, what the numbers are meant for: SQLite has a single writer, even in
+WAL mode with a busy timeout its lock waits dominate the latencies), drives it with error_sending/load.py at a mean --rate requests/s
+(--profile constant|poisson|burst, 0 = as fast as --concurrency allows) with
+payloads from the variation engine (--zipf-s/--services/--frame-variants) or a
+--replay file from benchmarks/generate_payloads.py,
+waits for the analysis queue to drain and writes a JSON report: ingest
+throughput, p50/p95/p99 latency, error rate, analysis throughput/failures
+and the receiver's stage histograms.
+
+    python -m benchmarks.load_test --requests 2000 --rate 200 --out baseline.json
+    python -m benchmarks.load_test --requests 2000 --rate 200 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_schema(database_url):
+    env = {**os.environ, "DATABASE_URL": database_url}
+    code = "from db.session import engine; from db.models import Base; Base.metadata.create_all(engine)"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+def is_sqlite(database_url):
+    return database_url.split(":", 1)[0].split("+")[0] == "sqlite"
+
+
+def start_receiver(args, database_url, port, log):
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_TOKEN_LATENCY": str(args.llm_token_latency),
+        "FAKE_LLM_JITTER": str(args.llm_jitter),
+        "FAKE_LLM_FAILURE_RATE": str(args.llm_failure_rate),
+        "FAKE_LLM_SEED": str(args.seed),
+        "GRAPH_CHECKPOINTER": os.environ.get("GRAPH_CHECKPOINTER", "memory"),
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    }
+    if is_sqlite(database_url):
+        # readers next to the writer, writes queue for the lock instead of failing after 5 s
+        env.setdefault("SQLITE_JOURNAL_MODE", "wal")
+        env.setdefault("SQLITE_BUSY_TIMEOUT", "30000")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "error_receiving.webhook_receiver:app",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_healthy(client, base, receiver, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if receiver.poll() is not None:
+            raise RuntimeError(f"Receiver exited with code {receiver.returncode}")
+        try:
+            if (await client.get(f"{base}/")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Receiver did not become healthy")
+
+
+async def wait_drained(client, base, queued, timeout):
+    """Until every queued error was analyzed (or failed), returns (seconds, status of GET /)."""
+    start = time.monotonic()
+    while True:
+        status = (await client.get(f"{base}/")).json()
+        queue = status["analysis_queue"]
+        done = queue["processed"] + queue["failed"]
+        idle = not queue["depth"] and not queue["solution_depth"] and not queue["in_flight"]
+        if (done >= queued and idle) or time.monotonic() - start > timeout:
+            return time.monotonic() - start, status
+        await asyncio.sleep(0.25)
+
+
+async def run(args, base, receiver):
+    from error_sending.load import create_client, run_load
+    from error_sending.variation import PayloadVariation, read_payloads
+
+    if args.replay:
+        payloads = read_payloads(args.replay)
+    else:
+        payloads = PayloadVariation(
+            seed=args.seed, zipf_s=args.zipf_s, services=args.services, frame_variants=args.frame_variants
+        )
+
+    async with create_client(args.concurrency, http2=args.http2) as client:
+        await wait_healthy(client, base, receiver)
+        load = await run_load(
+            client,
+            [f"{base}/webhook/error"],
+            requests=args.requests,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            profile=args.profile,
+            burst_size=args.burst_size,
+            seed=args.seed,
+            payloads=payloads,
+        )
+        drain_s, status = await wait_drained(client, base, load.queued, args.drain_timeout)
+    ingest = load.report()
+    queue = status["analysis_queue"]
+    analysis_s = ingest["duration_s"] + drain_s
+    return {
+        "ingest": ingest,
+        "analysis": {
+            "processed": queue["processed"],
+            "failed": queue["failed"],
+            "failure_rate": round(queue["failed"] / max(queue["processed"] + queue["failed"], 1), 4),
+            "drain_after_load_s": round(drain_s, 3),
+            "throughput_per_s": round(queue["processed"] / analysis_s, 2) if analysis_s else 0.0,
+            "dedup_hits": status["dedup"]["hits"],
+            "similarity_short_circuits": status["similarity"]["short_circuits"],
+        },
+        "stages": status["stages"],
+    }
+
+
+def compare(report, baseline):
+    """Relative change of the headline numbers against a previous report."""
+    rows = [
+        ("ingest achieved_rate_rps", report["ingest"]["achieved_rate_rps"], baseline["ingest"]["achieved_rate_rps"]),
+        ("ingest p50_ms", report["ingest"]["latency_ms"]["p50"], baseline["ingest"]["latency_ms"]["p50"]),
+        ("ingest p95_ms", report["ingest"]["latency_ms"]["p95"], baseline["ingest"]["latency_ms"]["p95"]),
+        ("ingest p99_ms", report["ingest"]["latency_ms"]["p99"], baseline["ingest"]["latency_ms"]["p99"]),
+        ("ingest error_rate", report["ingest"]["error_rate"], baseline["ingest"]["error_rate"]),
+        ("analysis throughput_per_s", report["analysis"]["throughput_per_s"], baseline["analysis"]["throughput_per_s"]),
+    ]
+    print(f"\nvs {baseline.get('version')} ({baseline.get('started_at')})")
+    for name, now, before in rows:
+        change = f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{name:<27}: {before:>10} -> {now:>10}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=100.0, help="requests/s, 0 = closed loop")
+    parser.add_argument("--concurrency", type=int, default=50, help="in-flight requests at most")
+    parser.add_argument("--profile", choices=["constant", "poisson", "burst"], default="constant")
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--http2", action="store_true", help="needs httpx[http2] on the client and an HTTP/2 server")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="skew of the error type mix, 0 = uniform")
+    parser.add_argument("--services", type=int, default=4, help="distinct services per error type")
+    parser.add_argument("--frame-variants", type=int, default=8, help="distinct extra stack frames")
+    parser.add_argument("--replay", help="payload file from benchmarks/generate_payloads.py instead of live variation")
+    parser.add_argument("--database-url", help="e.g. postgresql://localhost/errors_bench (alembic upgrade head), scratch SQLite if unset")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-token-latency", type=float, default=0.0)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--drain-timeout", type=float, default=300.0)
+    parser.add_argument("--out", help="write the JSON report here (stdout otherwise)")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    database_url = args.database_url or f"sqlite:///{workdir}/load.sqlite"
+    if is_sqlite(database_url):
+        print(
+            "⚠️  SQLite database: writes are serialized, latencies and error rates measure its lock, "
+            "not the receiver. Use --database-url with Postgres for representative numbers.",
+            file=sys.stderr,
+        )
+    create_schema(database_url)
+    port = free_port()
+    log_path = Path(workdir) / "receiver.log"
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    with open(log_path, "w") as log:
+        receiver = start_receiver(args, database_url, port, log)
+        try:
+            results = asyncio.run(run(args, f"http://127.0.0.1:{port}", receiver))
+        finally:
+            receiver.terminate()
+            receiver.wait(timeout=30)
+
+    report = {
+        "version": git_version(),
+        "started_at": started_at,
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "requests": args.requests,
+            "rate": args.rate,
+            "concurrency": args.concurrency,
+            "profile": args.profile,
+            "burst_size": args.burst_size if args.profile == "burst" else None,
+            "seed": args.seed,
+            "payloads": {"replay": args.replay} if args.replay else {
+                "zipf_s": args.zipf_s,
+                "services": args.services,
+                "frame_variants": args.frame_variants,
+            },
+            "database": database_url.split(":", 1)[0],
+            "representative": not is_sqlite(database_url),
+            "llm": {
+                "latency": args.llm_latency,
+                "token_latency": args.llm_token_latency,
+                "jitter": args.llm_jitter,
+                "failure_rate": args.llm_failure_rate,
+            },
+        },
+        **results,
+        "receiver_log": str(log_path),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+        print(f"Report written to {args.out}")
+    else:
+        print(text)
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
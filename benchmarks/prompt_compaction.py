@@ -0,0 +1,90 @@
+"""
+A/B of full indent=2 payloads vs compacted ones (PROMPT_COMPACTION) on the built-in ERRORS.
+
+Runs analysis + solution for every error both ways and reports prompt tokens
+(local tokenizer and provider usage) and how close the compacted answers are to
+the full ones: same urgency, same error name, word overlap of root cause and actions.
+Use the real model for a quality verdict, the stub only exercises the plumbing:
+
+    LLM_PROVIDER=openai python -m benchmarks.prompt_compaction --budget 400
+"""
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _words(analysis, fields):
+    text = " ".join(
+        " ".join(value) if isinstance(value, list) else str(value)
+        for value in (analysis.get(field, "") for field in fields)
+    )
+    return set(re.findall(r"[a-z0-9_]{3,}", text.lower()))
+
+
+def _overlap(a, b, fields):
+    wa, wb = _words(a, fields), _words(b, fields)
+    return len(wa & wb) / len(wa | wb) if wa | wb else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=int, default=600, help="PROMPT_TOKEN_BUDGET for the compacted run")
+    parser.add_argument("--provider", default=os.getenv("LLM_PROVIDER", "fake"))
+    args = parser.parse_args()
+
+    os.environ["LLM_PROVIDER"] = args.provider
+    os.environ.setdefault("FAKE_LLM_LATENCY", "0")
+
+    from langchain_core.callbacks import get_usage_metadata_callback
+    from ai import graph
+    from ai.compaction import count_tokens
+    from error_sending.config import ERRORS
+
+    graph.PROMPT_TOKEN_BUDGET = args.budget
+
+    def run(compact):
+        graph.PROMPT_COMPACTION = compact
+        results, prompt_tokens = [], []
+        with get_usage_metadata_callback() as usage:
+            for error in ERRORS:
+                conversation = graph._analysis_conversation(error)
+                prompt_tokens.append(sum(count_tokens(m.content) for m in conversation))
+                analysis = graph.analyze_error_node(error)
+                solution = graph.generate_solution_node(analysis)
+                results.append((analysis, solution))
+        input_tokens = sum(u["input_tokens"] for u in usage.usage_metadata.values())
+        return results, prompt_tokens, input_tokens
+
+    full, full_prompt, full_input = run(False)
+    compact, compact_prompt, compact_input = run(True)
+
+    print(f"{'error':24} {'full':>6} {'compact':>8} {'urgency':>8} {'name':>5} {'cause':>6} {'actions':>8}")
+    same_urgency = 0
+    causes, actions = [], []
+    for error, (fa, _), (ca, _), ft, ct in zip(ERRORS, full, compact, full_prompt, compact_prompt):
+        urgency = fa["urgency"] == ca["urgency"]
+        same_urgency += urgency
+        cause = _overlap(fa, ca, ["probable_root_cause", "impact_assesment"])
+        action = _overlap(fa, ca, ["immediate_actions", "deeper_investigation"])
+        causes.append(cause)
+        actions.append(action)
+        print(
+            f"{error['name']:24} {ft:6} {ct:8} {'same' if urgency else 'diff':>8} "
+            f"{'same' if fa['error_name'] == ca['error_name'] else 'diff':>5} {cause:6.2f} {action:8.2f}"
+        )
+
+    n = len(ERRORS)
+    print(
+        f"\nanalysis prompt tokens: {sum(full_prompt)} -> {sum(compact_prompt)} "
+        f"({1 - sum(compact_prompt) / sum(full_prompt):.0%} fewer, local tokenizer)"
+    )
+    print(f"provider input tokens (analysis + solution): {full_input} -> {compact_input}")
+    print(f"same urgency {same_urgency}/{n}, root cause overlap {sum(causes) / n:.2f}, actions overlap {sum(actions) / n:.2f}")
+
+
+if __name__ == "__main__":
+    main()
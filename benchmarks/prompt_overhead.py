@@ -0,0 +1,100 @@
+"""
+Per-call overhead of the analysis and solution LLM calls, network excluded:
+the structured-output runnable and messages rebuilt on every call (how the
+nodes used to do it) vs the prompt | model pipelines ai/graph.py builds once
+per process (_pipeline).
+
+--provider openai: ChatOpenAI over an in-process HTTP transport answering a
+schema-valid sample, so request building, JSON schema generation and response
+parsing are all counted. --provider fake: the stub model with no latency.
+
+    python -m benchmarks.prompt_overhead --calls 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def openai_stub():
+    """ChatOpenAI whose HTTP requests are answered in-process."""
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    from ai.fake_llm import _sample
+
+    def answer(request):
+        body = json.loads(request.content)
+        schema = body["response_format"]["json_schema"]
+        content = _sample(schema["schema"], schema["schema"].get("$defs", {}), random.Random(0), schema["name"])
+        return httpx.Response(200, json={
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(content)}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    transport = httpx.MockTransport(answer)
+    return ChatOpenAI(
+        model="gpt-4.1-mini", temperature=0, api_key="sk-bench",
+        http_client=httpx.Client(transport=transport),
+        http_async_client=httpx.AsyncClient(transport=transport),
+    )
+
+
+def per_call_us(fn, calls):
+    fn()
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--provider", choices=["openai", "fake"], default="openai")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = "0"
+    from ai import graph
+    from ai.models import ErrorAnalysis, ErrorSolution
+    from error_sending.config import ERRORS
+
+    llm = openai_stub() if args.provider == "openai" else graph.get_llm()
+    # every graph runnable is built on this model
+    graph.get_llm = lambda: llm
+
+    error = {k: v for k, v in ERRORS[0].items() if k != "name"}
+    analysis = graph.analyze_error_node(error)
+    stages = {
+        "analysis": (ErrorAnalysis, graph.ANALYSIS_PROMPT, graph._analysis_inputs(error)),
+        "solution": (ErrorSolution, graph.SOLUTION_PROMPT, graph._solution_inputs(analysis)),
+    }
+
+    print(f"{args.provider}, median of {args.calls} calls, us")
+    print(f"{'stage':<10}{'runnable':>10}{'messages':>10}{'rebuilt':>10}{'prebuilt':>10}{'saved':>8}")
+    for stage, (schema, prompt, inputs) in stages.items():
+        build_us = per_call_us(lambda: llm.with_structured_output(schema), args.calls)
+        messages_us = per_call_us(lambda: prompt.format_messages(**inputs), args.calls)
+        rebuilt_us = per_call_us(lambda: llm.with_structured_output(schema).invoke(prompt.format_messages(**inputs)), args.calls)
+        prebuilt_us = per_call_us(lambda: graph._pipeline(stage).invoke(inputs), args.calls)
+        print(
+            f"{stage:<10}{build_us:>10.0f}{messages_us:>10.0f}{rebuilt_us:>10.0f}{prebuilt_us:>10.0f}"
+            f"{(rebuilt_us - prebuilt_us) / rebuilt_us * 100:>7.0f}%"
+        )
+    print("(runnable: with_structured_output alone, messages: prompt formatting alone)")
+
+
+if __name__ == "__main__":
+    main()
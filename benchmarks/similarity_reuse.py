@@ -0,0 +1,93 @@
+"""
+How many LLM calls and tokens the similarity index saves on near-duplicate errors.
+
+Ingests --errors variants of the built-in ERRORS (renamed services, reworded
+details and messages, so fingerprints differ) through the full async pipeline
+with the stub model, then reports the calls/tokens that went to the LLM and
+the ones avoided by reusing or seeding from similar past analyses.
+
+Use a scratch SQLite database, its tables created from the models as load_test
+does (the migrations are written for Postgres):
+
+    DATABASE_URL=sqlite:///bench.sqlite python -c \\
+        "from db.session import engine; from db.models import Base; Base.metadata.create_all(engine)"
+    DATABASE_URL=sqlite:///bench.sqlite LLM_PROVIDER=fake GRAPH_CHECKPOINTER=memory \\
+        python -m benchmarks.similarity_reuse --errors 200 --threshold 0.92
+"""
+import argparse
+import asyncio
+import copy
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+REGIONS = ["eu", "us", "ap"]
+PREFIXES = ["", "Request failed: ", "Upstream error: ", "Retry exhausted. "]
+
+
+def variant(base, rng):
+    error = copy.deepcopy(base)
+    error["error_name"] = error.pop("name")
+    context = error.setdefault("context", {})
+    kind = rng.random()
+    if kind < 0.4:
+        context["service"] = f"{context.get('service', 'svc')}-{rng.choice(REGIONS)}"
+    elif kind < 0.8:
+        error["detail"] = rng.choice(PREFIXES) + error.get("detail", "")
+    else:
+        context["error_message"] = f"{context.get('error_message', '')} (attempt {rng.randint(1, 5)})".strip()
+    return error
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--errors", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=None, help="override SIMILARITY_THRESHOLD")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    os.environ.setdefault("FAKE_LLM_LATENCY", "0")
+    os.environ.setdefault("GRAPH_CHECKPOINTER", "memory")
+
+    from db.session import async_engine
+    from error_sending.config import ERRORS
+    from services import similarity
+    from services.dedup import dedup_cache
+    from services.error_service import aclose_error_graph, aingest_error
+    from services.metrics import counter_total
+    from services.similarity import similarity_index
+
+    if args.threshold is not None:
+        similarity.SIMILARITY_THRESHOLD = args.threshold
+
+    rng = random.Random(args.seed)
+    payloads = [variant(ERRORS[i % len(ERRORS)], rng) for i in range(args.errors)]
+
+    async def run():
+        for payload in payloads:
+            await aingest_error(payload)
+        await aclose_error_graph()
+        await async_engine.dispose()
+
+    # llm_tokens_total, not a usage callback: batched analyses (LLM_BATCH_SIZE) run out of its reach
+    asyncio.run(run())
+    tokens = int(counter_total("llm_tokens_total"))
+
+    stats = similarity_index.stats()
+    dedup = dedup_cache.stats()
+    print(f"\n{args.errors} errors, similarity threshold {similarity.SIMILARITY_THRESHOLD}")
+    print(f"LLM tokens used              : {tokens}")
+    print(f"reused via exact fingerprint : {dedup['hits']} errors, {dedup['llm_calls_saved']} LLM calls avoided")
+    print(
+        f"reused via similarity        : {stats['short_circuits']} errors, {stats['llm_calls_avoided']} LLM calls "
+        f"and ~{stats['tokens_avoided']} tokens avoided"
+    )
+    print(f"analyzed with similar context: {stats['with_context']} errors, +{stats['context_tokens_added']} prompt tokens")
+
+
+if __name__ == "__main__":
+    main()
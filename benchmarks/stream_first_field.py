@@ -0,0 +1,110 @@
+"""
+Time to the first analysis field with streamed structured output vs waiting
+for the whole answer.
+
+Ingests --errors distinct errors through the async pipeline with the stub model
+(first-token latency + per-token latency, like a real model), each with a
+reader subscribed the way GET /errors/{id}/analysis/stream is, and reports
+when the reader got its first field, the full analysis and the solution.
+
+Use a fresh scratch SQLite database for every run, its tables created from the
+models as load_test does (the migrations are written for Postgres):
+
+    DATABASE_URL=sqlite:///bench.sqlite python -c \\
+        "from db.session import engine; from db.models import Base; Base.metadata.create_all(engine)"
+    DATABASE_URL=sqlite:///bench.sqlite LLM_PROVIDER=fake GRAPH_CHECKPOINTER=memory \\
+        python -m benchmarks.stream_first_field --errors 20 --no-streaming
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def letters(i):
+    """0 -> "a", 27 -> "bb": digits are normalized out of fingerprints, letters are not."""
+    return chr(ord("a") + i % 26) * (i // 26 + 1)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--errors", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.4, help="stub model first-token latency, seconds")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="stub model seconds per output token")
+    parser.add_argument("--no-streaming", action="store_true", help="LLM_STREAMING=off baseline")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    os.environ.setdefault("GRAPH_CHECKPOINTER", "memory")
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    os.environ["FAKE_LLM_TOKEN_LATENCY"] = str(args.token_latency)
+    os.environ["LLM_STREAMING"] = "off" if args.no_streaming else "on"
+    # every error goes to the model
+    os.environ["SIMILARITY_THRESHOLD"] = "2"
+
+    from ai.graph import SOLUTION_MIN_URGENCY
+    from db.session import async_engine
+    from error_sending.config import ERRORS
+    from services.analysis_stream import analysis_streams
+    from services.error_service import aanalyze_error, aclose_error_graph, apersist_error
+
+    first_field, analysis_done, done = [], [], []
+
+    async def one(i, semaphore):
+        payload = dict(ERRORS[i % len(ERRORS)])
+        payload["error_name"] = payload.pop("name")
+        # a distinct fingerprint per error, so none is served from dedup
+        payload["context"] = {**payload.get("context", {}), "service": f"svc-{letters(i)}"}
+        async with semaphore:
+            error_id = await apersist_error(payload)
+            subscription = analysis_streams.subscribe(error_id)
+            start = time.perf_counter()
+            task = asyncio.create_task(aanalyze_error(error_id, payload))
+            stored = {"error_id": error_id, "analysis": None, "solution": None, "finished": False}
+            got_field = False
+            async for item in analysis_streams.events(subscription, stored, timeout=120):
+                if item is None:
+                    continue
+                event, _ = item
+                elapsed = time.perf_counter() - start
+                if event in ("analysis", "analysis_done") and not got_field:
+                    got_field = True
+                    first_field.append(elapsed)
+                if event == "analysis_done":
+                    analysis_done.append(elapsed)
+                if event == "done":
+                    done.append(elapsed)
+            await task
+
+    async def run():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        await asyncio.gather(*(one(i, semaphore) for i in range(args.errors)))
+        await aclose_error_graph()
+        await async_engine.dispose()
+
+    asyncio.run(run())
+
+    mode = "off" if args.no_streaming else "on"
+    print(f"\n{args.errors} errors, LLM_STREAMING={mode}, solutions from urgency {SOLUTION_MIN_URGENCY}")
+    for label, values in (("first field", first_field), ("full analysis", analysis_done), ("done", done)):
+        print(
+            f"{label:<14}: p50 {percentile(values, 0.5) * 1000:8.1f} ms  p95 {percentile(values, 0.95) * 1000:8.1f} ms  "
+            f"avg {statistics.mean(values) * 1000 if values else 0:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -19,6 +20,12 @@ from db.base import Base
 
 class Error(Base):
     __tablename__ = "errors"
+    __table_args__ = (
+        # /errors listanje: najnoviji prvi, keyset po (created_at, id)
+        Index("ix_errors_created_at", "created_at", "id"),
+        Index("ix_errors_name_created_at", "name", "created_at", "id"),
+        Index("ix_errors_severity", "severity", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
@@ -27,6 +34,8 @@ class Error(Base):
     status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     severity: Mapped[str] = mapped_column(String(20), nullable=False)  # "error"|"warning"|"info"
     detail: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # hash iz services/dedup.py, isti za ponovljene greske
+    fingerprint: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
 
     # sve ostalo spremi kao JSON (context, metrics, suggested_checks, itd.)
     payload: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=False)
@@ -98,3 +107,74 @@ class ErrorSolution(Base):
     )
 
     error: Mapped["Error"] = relationship(back_populates="solution")
+
+
+class ErrorFingerprint(Base):
+    __tablename__ = "error_fingerprints"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    error_name: Mapped[str] = mapped_column(String(200), nullable=False)
+
+    # prvi error s ovim fingerprintom, njegov analysis/solution se koristi za sve ponovljene
+    canonical_error_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("errors.id", ondelete="SET NULL"), nullable=True
+    )
+    occurrences: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+    first_seen_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    last_seen_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    canonical_error: Mapped[Optional["Error"]] = relationship()
+
+
+class ErrorStatsBucket(Base):
+    """Broj errora po minuti/satu za jednu dimenziju (name, severity, service, urgency)."""
+
+    __tablename__ = "error_stats_buckets"
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "dimension", "value", "bucket_start", name="uq_error_stats_buckets_key"
+        ),
+        Index("ix_error_stats_buckets_window", "granularity", "bucket_start"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    granularity: Mapped[str] = mapped_column(String(10), nullable=False)  # "minute"|"hour"
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    dimension: Mapped[str] = mapped_column(String(20), nullable=False)  # "name"|"severity"|"service"|"urgency"
+    value: Mapped[str] = mapped_column(String(200), nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class AnalysisJob(Base):
+    """Posao analize jednog errora, workeri ga preuzimaju s FOR UPDATE SKIP LOCKED (services/analysis_jobs.py)."""
+
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        Index("ix_analysis_jobs_due", "status", "run_after"),
+        Index("ix_analysis_jobs_lease", "status", "leased_until"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    error_id: Mapped[int] = mapped_column(ForeignKey("errors.id", ondelete="CASCADE"), nullable=False, unique=True)
+    status: Mapped[str] = mapped_column(String(10), nullable=False, server_default="pending")  # "pending"|"running"|"done"|"failed"
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+    # pending: ne prije ovoga (retry s backoffom)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # running: worker ga drzi do ovoga, nakon toga ga preuzima drugi worker
+    leased_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    worker: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# rows per INSERT statement in the bulk writers, keeps bind parameters well under driver limits
+BULK_CHUNK_SIZE = 500
+
+
+def insert_for(db: Session | AsyncSession):
+    """Dialect specific insert() so ON CONFLICT upserts work on Postgres and SQLite."""
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def chunks(rows: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    for i in range(0, len(rows), BULK_CHUNK_SIZE):
+        yield rows[i:i + BULK_CHUNK_SIZE]
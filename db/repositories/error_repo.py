@@ -1,47 +1,459 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import base64
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from db.models import Error, ErrorAnalysis, ErrorSolution
+from db.models import Error, ErrorAnalysis, ErrorFingerprint, ErrorSolution
+from db.repositories._bulk import chunks, insert_for
+from db.repositories.job_repo import aenqueue_jobs, enqueue_jobs
 
 
-def save_error(db: Session, error_payload: Dict[str, Any]) -> Error:
-    err = Error(
-        name=error_payload.get("error_name", "UnknownError"),
-        status_code=error_payload.get("status_code"),
-        severity=error_payload.get("severity", "error"),
-        detail=error_payload.get("detail"),
-        payload=error_payload,
-    )
+def _error_row(error_payload: Dict[str, Any], fingerprint: Optional[str]) -> Dict[str, Any]:
+    return {
+        "name": error_payload.get("error_name", "UnknownError"),
+        "status_code": error_payload.get("status_code"),
+        "severity": error_payload.get("severity", "error"),
+        "detail": error_payload.get("detail"),
+        "fingerprint": fingerprint,
+        "payload": error_payload,
+    }
+
+
+def _new_error(error_payload: Dict[str, Any], fingerprint: Optional[str]) -> Error:
+    return Error(**_error_row(error_payload, fingerprint))
+
+
+def save_error(
+    db: Session, error_payload: Dict[str, Any], fingerprint: Optional[str] = None, with_job: bool = False
+) -> Error:
+    """with_job: also a pending analysis job (db.repositories.job_repo), committed with the error."""
+    err = _new_error(error_payload, fingerprint)
     db.add(err)
     db.flush()
+    if with_job:
+        enqueue_jobs(db, [err.id])
     return err
 
 
-def save_error_analysis(db: Session, error_id: int, analysis_dict: Dict[str, Any]) -> ErrorAnalysis:
-    a = ErrorAnalysis(
-        error_id=error_id,
-        probable_root_cause=analysis_dict["probable_root_cause"],
-        impact_assesment=analysis_dict["impact_assesment"],
-        urgency=analysis_dict["urgency"],
-        confidence=analysis_dict["confidence"],
-        signals_used=analysis_dict.get("signals_used", []),
-        immediate_actions=analysis_dict.get("immediate_actions", []),
-        deeper_investigation=analysis_dict.get("deeper_investigation", []),
-        assumptions=analysis_dict.get("assumptions", []),
+async def asave_error(
+    db: AsyncSession, error_payload: Dict[str, Any], fingerprint: Optional[str] = None, with_job: bool = False
+) -> Error:
+    err = _new_error(error_payload, fingerprint)
+    db.add(err)
+    await db.flush()
+    if with_job:
+        await aenqueue_jobs(db, [err.id])
+    return err
+
+
+def _bulk_error_stmt():
+    # executemany with RETURNING, ids come back in the order of the rows
+    return insert(Error).returning(Error.id, sort_by_parameter_order=True)
+
+
+def save_errors_bulk(
+    db: Session, errors: Sequence[Tuple[Dict[str, Any], Optional[str]]], with_jobs: bool = False
+) -> List[int]:
+    """Insert (payload, fingerprint) pairs in a few statements, returns the new ids in order."""
+    rows = [_error_row(payload, fingerprint) for payload, fingerprint in errors]
+    ids: List[int] = []
+    for chunk in chunks(rows):
+        ids.extend(db.scalars(_bulk_error_stmt(), chunk))
+    if with_jobs:
+        enqueue_jobs(db, ids)
+    return ids
+
+
+async def asave_errors_bulk(
+    db: AsyncSession, errors: Sequence[Tuple[Dict[str, Any], Optional[str]]], with_jobs: bool = False
+) -> List[int]:
+    rows = [_error_row(payload, fingerprint) for payload, fingerprint in errors]
+    ids: List[int] = []
+    for chunk in chunks(rows):
+        ids.extend(await db.scalars(_bulk_error_stmt(), chunk))
+    if with_jobs:
+        await aenqueue_jobs(db, ids)
+    return ids
+
+
+def _analysis_row(error_id: int, analysis_dict: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "error_id": error_id,
+        "probable_root_cause": analysis_dict["probable_root_cause"],
+        "impact_assesment": analysis_dict["impact_assesment"],
+        "urgency": analysis_dict["urgency"],
+        "confidence": analysis_dict["confidence"],
+        "signals_used": analysis_dict.get("signals_used", []),
+        "immediate_actions": analysis_dict.get("immediate_actions", []),
+        "deeper_investigation": analysis_dict.get("deeper_investigation", []),
+        "assumptions": analysis_dict.get("assumptions", []),
+    }
+
+
+def _solution_row(error_id: int, solution_dict: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "error_id": error_id,
+        "code_fixes": solution_dict.get("code_fixes", []),
+        "configuration_changes": solution_dict.get("configuration_changes", []),
+        "deployment_steps": solution_dict.get("deployment_steps", []),
+        "rollback_plan": solution_dict.get("rollback_plan", {"signals_to_monitor": [], "steps": []}),
+    }
+
+
+def encode_cursor(err: Error) -> str:
+    """Opaque keyset cursor: position of the last row of a page in (created_at, id) order."""
+    return base64.urlsafe_b64encode(f"{err.created_at.isoformat()}|{err.id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for cursors this API did not hand out."""
+    try:
+        created_at, error_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(error_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _error_filters(
+    name: Optional[str] = None,
+    severity: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> list:
+    filters = []
+    if name is not None:
+        filters.append(Error.name == name)
+    if severity is not None:
+        filters.append(Error.severity == severity)
+    if since is not None:
+        filters.append(Error.created_at >= since)
+    if until is not None:
+        filters.append(Error.created_at < until)
+    return filters
+
+
+def _list_errors_stmt(limit: int, cursor: Optional[str], **filters):
+    stmt = select(Error).where(*_error_filters(**filters))
+    if cursor is not None:
+        # keyset: rows strictly after the cursor, served straight from the (…, created_at, id) indexes
+        stmt = stmt.where(tuple_(Error.created_at, Error.id) < decode_cursor(cursor))
+    # one extra row tells whether there is a next page
+    return stmt.order_by(Error.created_at.desc(), Error.id.desc()).limit(limit + 1)
+
+
+def _page(rows: List[Error], limit: int) -> Tuple[List[Error], Optional[str]]:
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def list_errors(db: Session, limit: int, cursor: Optional[str] = None, **filters) -> Tuple[List[Error], Optional[str]]:
+    """Newest first. Returns the page and the cursor of the next one (None on the last page)."""
+    return _page(list(db.scalars(_list_errors_stmt(limit, cursor, **filters))), limit)
+
+
+async def alist_errors(db: AsyncSession, limit: int, cursor: Optional[str] = None, **filters) -> Tuple[List[Error], Optional[str]]:
+    return _page(list(await db.scalars(_list_errors_stmt(limit, cursor, **filters))), limit)
+
+
+def _error_counts_stmt(column, **filters):
+    return select(column, func.count()).where(*_error_filters(**filters)).group_by(column)
+
+
+def _edge_error_stmt(newest: bool, **filters):
+    order = (Error.created_at.desc(), Error.id.desc()) if newest else (Error.created_at, Error.id)
+    return select(Error).where(*_error_filters(**filters)).order_by(*order).limit(1)
+
+
+def edge_errors(db: Session, **filters) -> Tuple[Optional[Error], Optional[Error]]:
+    """(first, latest) error matching the filters, one index lookup each."""
+    return (
+        db.scalars(_edge_error_stmt(False, **filters)).first(),
+        db.scalars(_edge_error_stmt(True, **filters)).first(),
+    )
+
+
+async def aedge_errors(db: AsyncSession, **filters) -> Tuple[Optional[Error], Optional[Error]]:
+    return (
+        (await db.scalars(_edge_error_stmt(False, **filters))).first(),
+        (await db.scalars(_edge_error_stmt(True, **filters))).first(),
     )
+
+
+def error_stats(db: Session, **filters) -> Dict[str, Any]:
+    """Exact counts from the errors table (GROUP BY over the matching rows)."""
+    by_name = dict(db.execute(_error_counts_stmt(Error.name, **filters)).all())
+    by_severity = dict(db.execute(_error_counts_stmt(Error.severity, **filters)).all())
+    first, latest = edge_errors(db, **filters)
+    return {
+        "total_errors": sum(by_name.values()),
+        "error_distribution": by_name,
+        "severity_distribution": by_severity,
+        "first_error": first,
+        "latest_error": latest,
+    }
+
+
+async def aerror_stats(db: AsyncSession, **filters) -> Dict[str, Any]:
+    by_name = dict((await db.execute(_error_counts_stmt(Error.name, **filters))).all())
+    by_severity = dict((await db.execute(_error_counts_stmt(Error.severity, **filters))).all())
+    first, latest = await aedge_errors(db, **filters)
+    return {
+        "total_errors": sum(by_name.values()),
+        "error_distribution": by_name,
+        "severity_distribution": by_severity,
+        "first_error": first,
+        "latest_error": latest,
+    }
+
+
+def _count_errors_stmt(**filters):
+    return select(func.count()).select_from(Error).where(*_error_filters(**filters))
+
+
+def count_errors(db: Session, **filters) -> int:
+    return db.scalar(_count_errors_stmt(**filters))
+
+
+async def acount_errors(db: AsyncSession, **filters) -> int:
+    return await db.scalar(_count_errors_stmt(**filters))
+
+
+def save_error_analysis(db: Session, error_id: int, analysis_dict: Dict[str, Any]) -> ErrorAnalysis:
+    a = ErrorAnalysis(**_analysis_row(error_id, analysis_dict))
     db.add(a)
     return a
 
 
 def save_error_solution(db: Session, error_id: int, solution_dict: Dict[str, Any]) -> ErrorSolution:
-    s = ErrorSolution(
-        error_id=error_id,
-        code_fixes=solution_dict.get("code_fixes", []),
-        configuration_changes=solution_dict.get("configuration_changes", []),
-        deployment_steps=solution_dict.get("deployment_steps", []),
-        rollback_plan=solution_dict.get("rollback_plan", {"signals_to_monitor": [], "steps": []}),
-    )
+    s = ErrorSolution(**_solution_row(error_id, solution_dict))
     db.add(s)
-    return s
\ No newline at end of file
+    return s
+
+
+def _upsert_by_error_id_stmts(db: Session | AsyncSession, model, rows: List[Dict[str, Any]]):
+    """INSERT ... ON CONFLICT (error_id) DO UPDATE, one statement per chunk (uq_*_error_id constraints)."""
+    insert = insert_for(db)
+    # one row per error_id, a single statement may not touch the same row twice
+    rows = list({row["error_id"]: row for row in rows}.values())
+    for chunk in chunks(rows):
+        stmt = insert(model).values(chunk)
+        yield stmt.on_conflict_do_update(
+            index_elements=[model.error_id],
+            set_={key: stmt.excluded[key] for key in chunk[0] if key != "error_id"},
+        )
+
+
+def upsert_error_analyses(db: Session, analyses: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+    rows = [_analysis_row(error_id, analysis) for error_id, analysis in analyses]
+    for stmt in _upsert_by_error_id_stmts(db, ErrorAnalysis, rows):
+        db.execute(stmt)
+
+
+async def aupsert_error_analyses(db: AsyncSession, analyses: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+    rows = [_analysis_row(error_id, analysis) for error_id, analysis in analyses]
+    for stmt in _upsert_by_error_id_stmts(db, ErrorAnalysis, rows):
+        await db.execute(stmt)
+
+
+def upsert_error_solutions(db: Session, solutions: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+    rows = [_solution_row(error_id, solution) for error_id, solution in solutions]
+    for stmt in _upsert_by_error_id_stmts(db, ErrorSolution, rows):
+        db.execute(stmt)
+
+
+async def aupsert_error_solutions(db: AsyncSession, solutions: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+    rows = [_solution_row(error_id, solution) for error_id, solution in solutions]
+    for stmt in _upsert_by_error_id_stmts(db, ErrorSolution, rows):
+        await db.execute(stmt)
+
+
+def _record_fingerprint_stmt(db: Session | AsyncSession, rows: List[Dict[str, Any]]):
+    insert = insert_for(db)
+    stmt = insert(ErrorFingerprint).values(rows)
+    # canonical_error_id stays the first one: dedup hits and the similarity index point at its analysis
+    return stmt.on_conflict_do_update(
+        index_elements=[ErrorFingerprint.fingerprint],
+        set_={
+            "occurrences": ErrorFingerprint.occurrences + stmt.excluded.occurrences,
+            "last_seen_at": func.now(),
+        },
+    )
+
+
+def _fingerprint_rows(fingerprints: Iterable[Tuple[str, str, int]]) -> List[Dict[str, Any]]:
+    """One row per fingerprint, the first error wins and repeats add up."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for fingerprint, error_name, error_id in fingerprints:
+        if fingerprint in rows:
+            rows[fingerprint]["occurrences"] += 1
+            continue
+        rows[fingerprint] = {
+            "fingerprint": fingerprint,
+            "error_name": error_name,
+            "canonical_error_id": error_id,
+            "occurrences": 1,
+        }
+    return list(rows.values())
+
+
+def record_fingerprint(db: Session, fingerprint: str, error_name: str, error_id: int) -> None:
+    """First analyzed occurrence: its analysis/solution become the canonical ones, later ones only count."""
+    db.execute(_record_fingerprint_stmt(db, _fingerprint_rows([(fingerprint, error_name, error_id)])))
+
+
+async def arecord_fingerprint(db: AsyncSession, fingerprint: str, error_name: str, error_id: int) -> None:
+    await db.execute(_record_fingerprint_stmt(db, _fingerprint_rows([(fingerprint, error_name, error_id)])))
+
+
+def record_fingerprints_bulk(db: Session, fingerprints: Sequence[Tuple[str, str, int]]) -> None:
+    for chunk in chunks(_fingerprint_rows(fingerprints)):
+        db.execute(_record_fingerprint_stmt(db, chunk))
+
+
+async def arecord_fingerprints_bulk(db: AsyncSession, fingerprints: Sequence[Tuple[str, str, int]]) -> None:
+    for chunk in chunks(_fingerprint_rows(fingerprints)):
+        await db.execute(_record_fingerprint_stmt(db, chunk))
+
+
+def _fingerprint_hit_stmt(fingerprint: str):
+    return (
+        update(ErrorFingerprint)
+        .where(ErrorFingerprint.fingerprint == fingerprint)
+        .values(occurrences=ErrorFingerprint.occurrences + 1, last_seen_at=func.now())
+    )
+
+
+def count_fingerprint_hit(db: Session, fingerprint: str) -> None:
+    db.execute(_fingerprint_hit_stmt(fingerprint))
+
+
+async def acount_fingerprint_hit(db: AsyncSession, fingerprint: str) -> None:
+    await db.execute(_fingerprint_hit_stmt(fingerprint))
+
+
+def _fingerprint_analysis_stmt(fingerprint: str):
+    return (
+        select(ErrorFingerprint, ErrorAnalysis, ErrorSolution)
+        .join(ErrorAnalysis, ErrorAnalysis.error_id == ErrorFingerprint.canonical_error_id)
+        .outerjoin(ErrorSolution, ErrorSolution.error_id == ErrorFingerprint.canonical_error_id)
+        .where(ErrorFingerprint.fingerprint == fingerprint)
+    )
+
+
+def _analysis_dict(a: ErrorAnalysis, error_name: str) -> Dict[str, Any]:
+    return {
+        "error_name": error_name,
+        "probable_root_cause": a.probable_root_cause,
+        "impact_assesment": a.impact_assesment,
+        "urgency": a.urgency,
+        "confidence": a.confidence,
+        "signals_used": a.signals_used,
+        "immediate_actions": a.immediate_actions,
+        "deeper_investigation": a.deeper_investigation,
+        "assumptions": a.assumptions,
+    }
+
+
+def _solution_dict(s: Optional[ErrorSolution]) -> Optional[Dict[str, Any]]:
+    if s is None:
+        return None
+    return {
+        "code_fixes": s.code_fixes,
+        "configuration_changes": s.configuration_changes,
+        "deployment_steps": s.deployment_steps,
+        "rollback_plan": s.rollback_plan,
+    }
+
+
+def _stored_analysis(row) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    fp, a, s = row
+    return {
+        "error_id": fp.canonical_error_id,
+        "analysis": _analysis_dict(a, fp.error_name),
+        "solution": _solution_dict(s),
+    }
+
+
+def get_fingerprint_analysis(db: Session, fingerprint: str) -> Optional[Dict[str, Any]]:
+    """Stored analysis/solution of the canonical error for a fingerprint, if any."""
+    return _stored_analysis(db.execute(_fingerprint_analysis_stmt(fingerprint)).first())
+
+
+async def aget_fingerprint_analysis(db: AsyncSession, fingerprint: str) -> Optional[Dict[str, Any]]:
+    return _stored_analysis((await db.execute(_fingerprint_analysis_stmt(fingerprint))).first())
+
+
+def _recent_analyses_stmt(limit: int):
+    return (
+        select(Error, ErrorAnalysis, ErrorSolution)
+        .join(ErrorAnalysis, ErrorAnalysis.error_id == Error.id)
+        .outerjoin(ErrorSolution, ErrorSolution.error_id == Error.id)
+        .order_by(Error.id.desc())
+        .limit(limit)
+    )
+
+
+def _recent_rows(rows) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    # oldest first, like they were analyzed
+    return [
+        (err.payload, {"error_id": err.id, "analysis": _analysis_dict(a, err.name), "solution": _solution_dict(s)})
+        for err, a, s in reversed(rows)
+    ]
+
+
+def recent_analyses(db: Session, limit: int) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(payload, stored analysis/solution) of the last `limit` analyzed errors."""
+    return _recent_rows(db.execute(_recent_analyses_stmt(limit)).all())
+
+
+async def arecent_analyses(db: AsyncSession, limit: int) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    return _recent_rows((await db.execute(_recent_analyses_stmt(limit))).all())
+
+
+def _error_analysis_stmt(error_id: int):
+    return (
+        select(Error, ErrorAnalysis, ErrorSolution)
+        .outerjoin(ErrorAnalysis, ErrorAnalysis.error_id == Error.id)
+        .outerjoin(ErrorSolution, ErrorSolution.error_id == Error.id)
+        .where(Error.id == error_id)
+    )
+
+
+def _own_analysis(err: Error, a: Optional[ErrorAnalysis], s: Optional[ErrorSolution]) -> Dict[str, Any]:
+    return {
+        "error_id": err.id,
+        "analysis": _analysis_dict(a, err.name) if a is not None else None,
+        "solution": _solution_dict(s),
+    }
+
+
+def get_error_analysis(db: Session, error_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Stored analysis/solution of an error: its own, or for a repeat the one of
+    the canonical error of its fingerprint. None if the error does not exist.
+    """
+    row = db.execute(_error_analysis_stmt(error_id)).first()
+    if row is None:
+        return None
+    err, a, s = row
+    if a is None and err.fingerprint:
+        return get_fingerprint_analysis(db, err.fingerprint) or _own_analysis(err, a, s)
+    return _own_analysis(err, a, s)
+
+
+async def aget_error_analysis(db: AsyncSession, error_id: int) -> Optional[Dict[str, Any]]:
+    row = (await db.execute(_error_analysis_stmt(error_id))).first()
+    if row is None:
+        return None
+    err, a, s = row
+    if a is None and err.fingerprint:
+        return await aget_fingerprint_analysis(db, err.fingerprint) or _own_analysis(err, a, s)
+    return _own_analysis(err, a, s)
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db.models import AnalysisJob, Error
+
+# (job_id, error_id, attempts so far including this one, error payload)
+ClaimedJob = Tuple[int, int, int, Dict[str, Any]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _job_rows(error_ids: Sequence[int]) -> List[Dict[str, Any]]:
+    return [{"error_id": error_id} for error_id in error_ids]
+
+
+def enqueue_jobs(db: Session, error_ids: Sequence[int]) -> None:
+    """A pending analysis job per error, in the transaction that saves the errors."""
+    if error_ids:
+        db.execute(insert(AnalysisJob), _job_rows(error_ids))
+
+
+async def aenqueue_jobs(db: AsyncSession, error_ids: Sequence[int]) -> None:
+    if error_ids:
+        await db.execute(insert(AnalysisJob), _job_rows(error_ids))
+
+
+def _give_up_stmt(max_attempts: int):
+    """Jobs whose worker died on their last attempt: failed instead of leased once more."""
+    now = _now()
+    return (
+        update(AnalysisJob)
+        .where(
+            AnalysisJob.status == "running",
+            AnalysisJob.leased_until < now,
+            AnalysisJob.attempts >= max_attempts,
+        )
+        .values(
+            status="failed",
+            leased_until=None,
+            last_error="lease ran out on the last attempt, its worker stopped renewing it",
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _claim_stmt(limit: int, lease: float, worker: str, max_attempts: int):
+    now = _now()
+    # materialized with its row locks before the UPDATE runs: rows locked by other
+    # workers are skipped instead of waited for (SQLite has no FOR UPDATE, it
+    # serializes the whole statement instead)
+    due = (
+        select(AnalysisJob.id)
+        .where(or_(
+            and_(AnalysisJob.status == "pending", AnalysisJob.run_after <= now),
+            # the worker holding it stopped renewing the lease
+            and_(
+                AnalysisJob.status == "running",
+                AnalysisJob.leased_until < now,
+                AnalysisJob.attempts < max_attempts,
+            ),
+        ))
+        .order_by(AnalysisJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    return (
+        update(AnalysisJob)
+        .where(AnalysisJob.id == due.c.id)
+        .values(
+            status="running",
+            attempts=AnalysisJob.attempts + 1,
+            leased_until=now + timedelta(seconds=lease),
+            worker=worker,
+            updated_at=now,
+        )
+        .returning(AnalysisJob.id, AnalysisJob.error_id, AnalysisJob.attempts)
+    )
+
+
+def _payloads_stmt(error_ids: Sequence[int]):
+    return select(Error.id, Error.payload).where(Error.id.in_(list(error_ids)))
+
+
+def _claimed(jobs, payloads: Dict[int, Dict[str, Any]]) -> List[ClaimedJob]:
+    return sorted(
+        (job_id, error_id, attempts, payloads[error_id])
+        for job_id, error_id, attempts in jobs
+        if error_id in payloads
+    )
+
+
+def claim_jobs(db: Session, limit: int, lease: float, worker: str, max_attempts: int) -> List[ClaimedJob]:
+    """
+    Lease up to `limit` due jobs to `worker` for `lease` seconds: pending ones
+    past run_after and running ones whose lease ran out. The latter fail for
+    good once they had `max_attempts`. Commit to hand them out.
+    """
+    db.execute(_give_up_stmt(max_attempts))
+    jobs = db.execute(_claim_stmt(limit, lease, worker, max_attempts)).all()
+    if not jobs:
+        return []
+    payloads = dict(db.execute(_payloads_stmt([error_id for _, error_id, _ in jobs])).all())
+    return _claimed(jobs, payloads)
+
+
+async def aclaim_jobs(db: AsyncSession, limit: int, lease: float, worker: str, max_attempts: int) -> List[ClaimedJob]:
+    await db.execute(_give_up_stmt(max_attempts))
+    jobs = (await db.execute(_claim_stmt(limit, lease, worker, max_attempts))).all()
+    if not jobs:
+        return []
+    payloads = dict((await db.execute(_payloads_stmt([error_id for _, error_id, _ in jobs]))).all())
+    return _claimed(jobs, payloads)
+
+
+async def acomplete_jobs(db: AsyncSession, job_ids: Sequence[int], worker: str) -> None:
+    """Ack jobs `worker` still holds: one whose lease ran out and was claimed again is left to its new worker."""
+    await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.id.in_(list(job_ids)), AnalysisJob.worker == worker, AnalysisJob.status == "running")
+        .values(status="done", leased_until=None, last_error=None, updated_at=_now())
+    )
+
+
+async def aretry_job(db: AsyncSession, job_id: int, message: str, run_after: Optional[datetime], worker: str) -> None:
+    """Back to pending from `run_after` on, or "failed" for good if run_after is None (if `worker` still holds it)."""
+    values = {"leased_until": None, "last_error": message[:2000], "updated_at": _now()}
+    if run_after is None:
+        values["status"] = "failed"
+    else:
+        values.update(status="pending", run_after=run_after)
+    await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.id == job_id, AnalysisJob.worker == worker, AnalysisJob.status == "running")
+        .values(**values)
+    )
+
+
+async def arenew_leases(db: AsyncSession, job_ids: Sequence[int], lease: float, worker: str) -> None:
+    await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.id.in_(list(job_ids)), AnalysisJob.worker == worker, AnalysisJob.status == "running")
+        .values(leased_until=_now() + timedelta(seconds=lease))
+    )
+
+
+async def arelease_jobs(db: AsyncSession, job_ids: Sequence[int], worker: str) -> None:
+    """Unfinished jobs of a worker that is stopping: pending again right away, the attempt does not count."""
+    await db.execute(
+        update(AnalysisJob)
+        .where(AnalysisJob.id.in_(list(job_ids)), AnalysisJob.worker == worker, AnalysisJob.status == "running")
+        .values(status="pending", attempts=AnalysisJob.attempts - 1, leased_until=None, run_after=_now())
+    )
+
+
+def _job_counts_stmt():
+    return select(AnalysisJob.status, func.count()).group_by(AnalysisJob.status)
+
+
+def job_counts(db: Session) -> Dict[str, int]:
+    return dict(db.execute(_job_counts_stmt()).all())
+
+
+async def ajob_counts(db: AsyncSession) -> Dict[str, int]:
+    return dict((await db.execute(_job_counts_stmt())).all())
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db.models import ErrorStatsBucket
+from db.repositories._bulk import chunks, insert_for
+
+GRANULARITIES = ("minute", "hour")
+DIMENSIONS = ("name", "severity", "service", "urgency")
+
+# (when it happened, {dimension: value}) e.g. (now, {"name": "MemoryError", "severity": "high"})
+StatsEvent = Tuple[datetime, Dict[str, str]]
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ts = ts.astimezone(timezone.utc)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(second=0, microsecond=0)
+
+
+def _stats_rows(events: Iterable[StatsEvent]) -> List[Dict[str, Any]]:
+    """Counts summed per bucket first, so one statement never touches a bucket twice."""
+    counts: Counter = Counter()
+    for ts, dimensions in events:
+        for granularity in GRANULARITIES:
+            start = bucket_start(ts, granularity)
+            for dimension, value in dimensions.items():
+                counts[(granularity, start, dimension, str(value)[:200])] += 1
+    return [
+        {"granularity": g, "bucket_start": start, "dimension": d, "value": v, "count": n}
+        for (g, start, d, v), n in counts.items()
+    ]
+
+
+def _bump_stats_stmt(db: Session | AsyncSession, rows: List[Dict[str, Any]]):
+    insert = insert_for(db)
+    stmt = insert(ErrorStatsBucket).values(rows)
+    return stmt.on_conflict_do_update(
+        # uq_error_stats_buckets_key
+        index_elements=[
+            ErrorStatsBucket.granularity,
+            ErrorStatsBucket.dimension,
+            ErrorStatsBucket.value,
+            ErrorStatsBucket.bucket_start,
+        ],
+        set_={"count": ErrorStatsBucket.count + stmt.excluded["count"]},
+    )
+
+
+def record_error_stats(db: Session, events: Iterable[StatsEvent]) -> None:
+    """Add occurrences to the minute and hour buckets, in the caller's transaction."""
+    for chunk in chunks(_stats_rows(events)):
+        db.execute(_bump_stats_stmt(db, chunk))
+
+
+async def arecord_error_stats(db: AsyncSession, events: Iterable[StatsEvent]) -> None:
+    for chunk in chunks(_stats_rows(events)):
+        await db.execute(_bump_stats_stmt(db, chunk))
+
+
+def _window_condition(since: Optional[datetime], until: datetime):
+    """
+    Whole hours inside the window come from hour buckets, the partial hours at
+    both edges from minute buckets: at most ~120 minute rows + one row per hour.
+    """
+    since_minute = bucket_start(since, "minute") if since is not None else None
+    until = until.astimezone(timezone.utc) if until.tzinfo else until.replace(tzinfo=timezone.utc)
+    last_full_hour = bucket_start(until, "hour")
+    if since_minute is None:
+        first_full_hour = None
+    else:
+        first_full_hour = bucket_start(since_minute, "hour")
+        if first_full_hour < since_minute:
+            first_full_hour += timedelta(hours=1)
+
+    minute = ErrorStatsBucket.granularity == "minute"
+    if first_full_hour is not None and first_full_hour >= last_full_hour:
+        return and_(minute, ErrorStatsBucket.bucket_start >= since_minute, ErrorStatsBucket.bucket_start < until)
+
+    hours = [ErrorStatsBucket.granularity == "hour", ErrorStatsBucket.bucket_start < last_full_hour]
+    parts = [and_(minute, ErrorStatsBucket.bucket_start >= last_full_hour, ErrorStatsBucket.bucket_start < until)]
+    if first_full_hour is not None:
+        hours.append(ErrorStatsBucket.bucket_start >= first_full_hour)
+        parts.append(and_(minute, ErrorStatsBucket.bucket_start >= since_minute, ErrorStatsBucket.bucket_start < first_full_hour))
+    return or_(and_(*hours), *parts)
+
+
+def _rollup_stmt(since: Optional[datetime], until: Optional[datetime]):
+    until = until or datetime.now(timezone.utc)
+    return (
+        select(ErrorStatsBucket.dimension, ErrorStatsBucket.value, func.sum(ErrorStatsBucket.count))
+        .where(_window_condition(since, until))
+        .group_by(ErrorStatsBucket.dimension, ErrorStatsBucket.value)
+    )
+
+
+def _distributions(rows) -> Dict[str, Dict[str, int]]:
+    result: Dict[str, Dict[str, int]] = {dimension: {} for dimension in DIMENSIONS}
+    for dimension, value, count in rows:
+        result.setdefault(dimension, {})[value] = int(count)
+    return result
+
+
+def rollup_stats(db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+    """{dimension: {value: count}} for [since, until), minute resolution."""
+    return _distributions(db.execute(_rollup_stmt(since, until)).all())
+
+
+async def arollup_stats(db: AsyncSession, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+    return _distributions((await db.execute(_rollup_stmt(since, until))).all())
+
+
+def _clear_stats_stmt(since: Optional[datetime]):
+    stmt = delete(ErrorStatsBucket)
+    if since is not None:
+        stmt = stmt.where(ErrorStatsBucket.bucket_start >= bucket_start(since, "hour"))
+    return stmt.execution_options(synchronize_session=False)
+
+
+def clear_error_stats(db: Session, since: Optional[datetime] = None) -> int:
+    """Drop buckets from the hour of `since` on (all if None)."""
+    return db.execute(_clear_stats_stmt(since)).rowcount
+
+
+async def aclear_error_stats(db: AsyncSession, since: Optional[datetime] = None) -> int:
+    return (await db.execute(_clear_stats_stmt(since))).rowcount
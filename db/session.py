@@ -1,18 +1,241 @@
 import os
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from services import fast_json
+from services.metrics import METRICS_ENABLED, counter, histogram
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set in .env")
 
-engine = create_engine(DATABASE_URL, echo=False)
+# sync driver -> async driver for the same database
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+psycopg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (to_async_url(DATABASE_URL) if DATABASE_URL else None)
+
+# per engine (sync and async each get their own pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 = never
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# SQLite only: "wal" lets reads run next to the single writer, busy timeout is how long a
+# write waits for the lock before "database is locked" (ms, 0 = the driver's 5 s)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "0"))
+
+
+class _TimedPool:
+    """Observes how long a checkout waited for a connection into the `<name>` histogram."""
+
+    metric_name = "db_pool_wait"
+    timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            type(self).timeouts += 1
+            raise
+        finally:
+            histogram(self.metric_name).observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    metric_name = "db_pool_wait"
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    metric_name = "db_async_pool_wait"
+
+
+def _pool_options(url: str, poolclass) -> Dict[str, Any]:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # in-memory sqlite lives in a single connection, keep its default pool
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# JSON/JSONB columns (payload, analysis lists) encoded once with orjson when FAST_JSON is on
+_JSON_OPTIONS = {"json_serializer": fast_json.dumps, "json_deserializer": fast_json.loads}
+
+# engines are built on first use, importing this module (models, repositories, CLIs) costs no connection setup
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+
+
+def _require(url: Optional[str]) -> str:
+    if not url:
+        raise RuntimeError("DATABASE_URL is not set in .env")
+    return url
+
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = _require(DATABASE_URL)
+                _engine = create_engine(url, echo=False, **_JSON_OPTIONS, **_pool_options(url, TimedQueuePool))
+                _sqlite_pragmas(_engine, url)
+                # no listeners at all with METRICS=off
+                if METRICS_ENABLED:
+                    _instrument(_engine, "sync")
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                url = _require(ASYNC_DATABASE_URL)
+                _async_engine = create_async_engine(
+                    url, echo=False, **_JSON_OPTIONS, **_pool_options(url, TimedAsyncQueuePool)
+                )
+                _sqlite_pragmas(_async_engine.sync_engine, url)
+                if METRICS_ENABLED:
+                    _instrument(_async_engine.sync_engine, "async")
+    return _async_engine
+
+
+def __getattr__(name: str):
+    # `from db.session import engine` still works, the engine is built at that point
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazySession(Session):
+    """Bound to get_engine() when the first session is opened."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+class _LazyAsyncSession(AsyncSession):
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_async_engine(), **kwargs)
+
 
 SessionLocal = sessionmaker(
-    bind=engine,
+    class_=_LazySession,
     autoflush=False,
     autocommit=False,
 )
+
+AsyncSessionLocal = async_sessionmaker(
+    class_=_LazyAsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def _sqlite_pragmas(sync_engine, url: str):
+    """SQLITE_JOURNAL_MODE / SQLITE_BUSY_TIMEOUT on every new connection of a SQLite engine."""
+    if make_url(url).get_backend_name() != "sqlite" or not (SQLITE_JOURNAL_MODE or SQLITE_BUSY_TIMEOUT):
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        if SQLITE_BUSY_TIMEOUT:
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
+
+
+def _instrument(sync_engine, name: str):
+    """
+    Every statement sent to the database (one executemany = one round-trip) ->
+    db_round_trips_total{engine, statement} and the "db_<name>_query" histogram.
+    """
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        counter("db_round_trips_total", engine=name, statement=verb).inc()
+        histogram(f"db_{name}_query").observe(time.perf_counter() - conn.info.pop("query_start", time.perf_counter()))
+
+
+def get_db() -> Iterator[Session]:
+    """FastAPI dependency: one session per request, closed (connection returned) after the response."""
+    with SessionLocal() as db:
+        yield db
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _pool_stats(pool) -> Dict[str, Any]:
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats = {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # QueuePool counts overflow from -size, only connections above pool_size are overflow
+        "overflow": max(pool.overflow(), 0),
+        "timeout_s": pool.timeout(),
+    }
+    if isinstance(pool, _TimedPool):
+        stats["timeouts"] = type(pool).timeouts
+        stats["wait"] = histogram(pool.metric_name).snapshot()
+    return stats
+
+
+def pool_stats() -> Dict[str, Optional[Dict[str, Any]]]:
+    """None for an engine nothing has used yet."""
+    return {
+        "sync": _pool_stats(_engine.pool) if _engine is not None else None,
+        "async": _pool_stats(_async_engine.pool) if _async_engine is not None else None,
+    }
+
+
+async def adispose_engines():
+    """Close the pooled connections of the engines that were built, on shutdown."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
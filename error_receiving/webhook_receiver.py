@@ -1,63 +1,203 @@
 # webhook_receiver.py
-from fastapi import FastAPI, Request
-from datetime import datetime
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from datetime import datetime, timezone
+from typing import Optional
+from contextlib import asynccontextmanager
 import logging
-from ai.graph import analyze_error_node, generate_solution_node
-from services.error_service import ingest_error
+from services.error_service import (
+    aclose_error_graph,
+    aload_similarity_index,
+    apersist_error,
+    astored_analysis,
+    aunfinished_analyses,
+)
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.session import adispose_engines, get_async_db, pool_stats
+from db.repositories.error_repo import acount_errors, aedge_errors, aerror_stats, alist_errors
+from db.repositories.job_repo import ajob_counts
+from db.repositories.stats_repo import arollup_stats
+from services.stats_rollup import parse_window
+from services.analysis_queue import analysis_queue
+from services.analysis_stream import analysis_streams
+from services.batch_ingest import aingest_batch
+from services.error_payload import PayloadError, decode_error_payload
+from services import fast_json
+from services.dedup import dedup_cache
+from services.similarity import similarity_index
+from services.metrics import counter, render_prometheus, stage_stats, timed
+from services.logging_config import setup_logging
+from ai.graph import analysis_batcher, get_llm, llm_resilience
+from services.write_buffer import write_buffer
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Webhook Receiver", version="1.0.0")
 
-# Store received errors
-received_errors = []
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the background analysis workers"""
+    await analysis_queue.start()
+    if analysis_queue.in_process:
+        # built here instead of on import, so the first analysis does not pay for it either
+        get_llm()
+        indexed = await aload_similarity_index()
+        logger.info(f"🔎 Similarity index loaded with {indexed} past analyses")
 
+        # resume graph runs a previous process left unfinished (from the checkpointer)
+        unfinished = await aunfinished_analyses()
+        for error_id, error_data in unfinished:
+            analysis_queue.submit(error_id, error_data)
+        if unfinished:
+            logger.info(f"♻️  Resuming {len(unfinished)} unfinished analyses")
 
-@app.post("/webhook/error")
-async def receive_error(request: Request):
+    yield
+    await analysis_queue.stop()
+    await write_buffer.drain()
+    await aclose_error_graph()
+    await adispose_engines()
+
+
+app = FastAPI(title="Webhook Receiver", version="1.0.0", lifespan=lifespan)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Rendered with services/fast_json (orjson when installed). Returned directly by
+    the read endpoints, which also skips FastAPI's jsonable_encoder pass over the payloads.
+    """
+
+    def render(self, content) -> bytes:
+        return fast_json.dumps_bytes(content)
+
+
+# errors received by this process since start, the history itself is in the errors table
+total_errors_received = 0
+# DELETE /errors: older errors are hidden from the read endpoints of this process, not deleted
+errors_cleared_before: Optional[datetime] = None
+
+
+def _failed(status_code: int, message: str) -> JSONResponse:
+    """Error response of the webhooks: 400 bad payload, 503 database failed or unreachable, 500 anything else."""
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "status": "invalid" if status_code < 500 else "error",
+            "message": message,
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
+
+@app.post("/webhook/error", status_code=202)
+async def receive_error(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Webhook endpoint that receives error data from the error generator service.
-    This is where you would integrate your AI analysis logic.
+    The error is persisted right away and AI analysis runs in the background queue.
     """
+    global total_errors_received
     try:
-        error_data = await request.json()
+        if analysis_queue.is_full() and analysis_queue.overflow == "reject":
+            analysis_queue.reject()
+            counter("webhook_requests_total", status="rejected").inc()
+            return JSONResponse(
+                status_code=429,
+                content={
+                    "status": "rejected",
+                    "message": "Analysis queue is full, retry later",
+                    "timestamp": datetime.now().isoformat()
+                }
+            )
 
-        error_id = ingest_error(error_data)
-        print(error_id)
-        
-        # Store the error
-        received_errors.append(error_data)
+        with timed("webhook_parse"):
+            # decoded once and shape-checked, this dict is what gets stored and analyzed
+            error_data = decode_error_payload(await request.body())
+
+        error_id = await apersist_error(error_data, db)
+        queued = analysis_queue.submit(error_id, error_data)
         
-        # Keep only last 100 errors
-        if len(received_errors) > 100:
-            received_errors.pop(0)
+        total_errors_received += 1
+        counter("webhook_requests_total", status="accepted").inc()
         
         # Log the received error
-        logger.info("=" * 60)
-        logger.info(f"🚨 ERROR RECEIVED")
-        logger.info(f"📛 Error Name: {error_data.get('error_name')}")
-        logger.info(f"⚠️  Severity: {error_data.get('severity')}")
-        logger.info(f"📊 Status Code: {error_data.get('status_code')}")
-        logger.info(f"📝 Detail: {error_data.get('detail')}")
-        logger.info(f"🔧 Service: {error_data.get('context', {}).get('service')}")
-        logger.info("=" * 60)
-        
-        # Here you would trigger your AI analysis
-        # await analyze_error_with_ai(error_data)
+        logger.info("🚨 error received", extra={
+            "error_id": error_id,
+            "error_name": error_data.get("error_name"),
+            "severity": error_data.get("severity"),
+            "status_code": error_data.get("status_code"),
+            "detail": error_data.get("detail"),
+            "service": error_data.get("context", {}).get("service"),
+            "queued": queued,
+        })
         
         return {
-            "status": "success",
-            "message": "Error received and logged",
+            "status": "accepted",
+            "message": "Error received and queued for analysis" if queued else "Error received, analysis deferred",
+            "error_id": error_id,
+            "queued": queued,
             "timestamp": datetime.now().isoformat()
         }
         
+    except PayloadError as e:
+        counter("webhook_requests_total", status="invalid").inc()
+        return _failed(400, str(e))
+    except (SQLAlchemyError, OSError) as e:
+        # nothing was stored, the sender should retry
+        logger.error(f"❌ Failed to persist webhook error: {str(e)}")
+        counter("webhook_requests_total", status="error").inc()
+        return _failed(503, "Error could not be stored, retry later")
     except Exception as e:
         logger.error(f"❌ Failed to process webhook: {str(e)}")
-        return {
-            "status": "error",
-            "message": str(e)
-        }
+        counter("webhook_requests_total", status="error").inc()
+        return _failed(500, str(e))
+
+
+@app.post("/webhook/errors", status_code=202)
+async def receive_errors(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Batch webhook: a JSON array of errors, or NDJSON (Content-Type:
+    application/x-ndjson) one per line. The body is parsed as it streams in,
+    persisted with one bulk insert per group and queued for analysis group by
+    group. Returns per-item results in body order: error_id and "queued" /
+    "deferred" (queue full, kept as a pending analysis job), or "invalid" with a message.
+    """
+    global total_errors_received
+    if analysis_queue.is_full() and analysis_queue.overflow == "reject":
+        analysis_queue.reject()
+        counter("webhook_requests_total", status="rejected").inc()
+        return JSONResponse(
+            status_code=429,
+            content={
+                "status": "rejected",
+                "message": "Analysis queue is full, retry later",
+                "timestamp": datetime.now().isoformat()
+            }
+        )
+
+    try:
+        batch = await aingest_batch(request.stream(), request.headers.get("content-type", ""), db)
+    except (SQLAlchemyError, OSError) as e:
+        logger.error(f"❌ Failed to persist batch webhook: {str(e)}")
+        counter("webhook_requests_total", status="error").inc()
+        return _failed(503, "Errors could not be stored, retry later")
+    except Exception as e:
+        logger.error(f"❌ Failed to process batch webhook: {str(e)}")
+        counter("webhook_requests_total", status="error").inc()
+        return _failed(500, str(e))
+
+    if batch["parse_error"] is not None and not batch["items"]:
+        counter("webhook_requests_total", status="invalid").inc()
+        return _failed(400, batch["parse_error"])
+    accepted = batch["items"] - batch["summary"].get("invalid", 0)
+    total_errors_received += accepted
+    counter("webhook_requests_total", status="accepted").inc()
+    return {
+        "status": "accepted",
+        "message": f"{accepted} of {batch['items']} errors received",
+        **batch,
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 @app.get("/")
@@ -66,66 +206,195 @@ async def root():
     return {
         "status": "running",
         "service": "Webhook Receiver",
-        "total_errors_received": len(received_errors),
+        "total_errors_received": total_errors_received,
+        "analysis_queue": analysis_queue.stats(),
+        "dedup": dedup_cache.stats(),
+        "similarity": similarity_index.stats(),
+        "llm_batching": analysis_batcher.stats(),
+        "llm_resilience": llm_resilience.stats(),
+        "db_write_buffer": write_buffer.stats(),
+        "analysis_streams": analysis_streams.stats(),
+        "stages": stage_stats(),
         "endpoints": {
             "webhook": "POST /webhook/error",
-            "errors": "GET /errors",
-            "latest": "GET /errors/latest"
+            "webhook_batch": "POST /webhook/errors (JSON array or NDJSON)",
+            "errors": "GET /errors?cursor=&name=&severity=&since=&until=",
+            "latest": "GET /errors/latest",
+            "stats": "GET /errors/stats",
+            "analysis_stream": "GET /errors/{error_id}/analysis/stream",
+            "analysis_jobs": "GET /analysis/jobs",
+            "db_pool": "GET /db/pool",
+            "metrics": "GET /metrics"
         }
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latency histograms, LLM tokens per model, parse failures and DB round-trips, Prometheus text format"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/analysis/jobs")
+async def get_analysis_jobs(db: AsyncSession = Depends(get_async_db)):
+    """Analysis jobs per status (pending, running, done, failed), filled while ANALYSIS_IN_PROCESS=off"""
+    return {"jobs": await ajob_counts(db), "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/db/pool")
+async def get_db_pool():
+    """Connection pool utilisation (checked out, overflow, checkout wait) of the sync and async engines"""
+    return pool_stats()
+
+
+def _visible_since(since: Optional[datetime]) -> Optional[datetime]:
+    if errors_cleared_before is None:
+        return since
+    return errors_cleared_before if since is None else max(since, errors_cleared_before)
+
+
+def _error_out(err):
+    """Stored error as it was received, plus its id and receipt time."""
+    return {**err.payload, "id": err.id, "received_at": err.created_at.isoformat()}
+
+
 @app.get("/errors")
-async def get_all_errors(limit: int = 10):
-    """Get all received errors"""
-    return {
-        "total": len(received_errors),
-        "errors": received_errors[-limit:]
-    }
+async def get_all_errors(
+    limit: int = Query(10, ge=1, le=500),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    severity: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Stored errors, newest first. Pass next_cursor back as cursor for the next page."""
+    try:
+        errors, next_cursor = await alist_errors(
+            db, limit, cursor, name=name, severity=severity, since=_visible_since(since), until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({
+        "count": len(errors),
+        "errors": [_error_out(err) for err in errors],
+        "next_cursor": next_cursor,
+    })
 
 
 @app.get("/errors/latest")
-async def get_latest_error():
+async def get_latest_error(db: AsyncSession = Depends(get_async_db)):
     """Get the most recent error"""
-    if not received_errors:
+    errors, _ = await alist_errors(db, 1, since=_visible_since(None))
+    if not errors:
         return {"message": "No errors received yet"}
     
-    return received_errors[-1]
+    return FastJSONResponse(_error_out(errors[0]))
+
+
+@app.get("/errors/{error_id}/analysis/stream")
+async def stream_error_analysis(error_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Server-sent events with the analysis of an error as the model writes it:
+    `analysis` (fields parsed so far) ... `analysis_done`, then `solution` ...
+    `solution_done`, then `done` (or `failed` / `timeout`). A `retry` event
+    ({stage, attempt}) means that stage's LLM call starts over: drop its fields
+    so far. What is already stored is sent first, a finished error gets it and
+    `done` right away. Only LLM calls that start while a reader is subscribed
+    are streamed, one already running sends just its `*_done` event.
+    """
+    # subscribe before reading the database, events published in between are queued
+    subscription = analysis_streams.subscribe(error_id)
+    try:
+        stored = await astored_analysis(db, error_id)
+    except BaseException:
+        subscription.close()
+        raise
+    if stored is None:
+        subscription.close()
+        raise HTTPException(status_code=404, detail=f"Error {error_id} not found")
+
+    async def events():
+        async for item in analysis_streams.events(subscription, stored):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            event, data = item
+            yield f"event: {event}\ndata: {fast_json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # no proxy buffering, a field is only useful when it arrives
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/errors/stats")
-async def get_error_statistics():
-    """Get statistics about received errors"""
-    if not received_errors:
-        return {"message": "No errors received yet"}
-    
-    error_counts = {}
-    severity_counts = {}
+async def get_error_statistics(
+    window: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    name: Optional[str] = None,
+    severity: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Get statistics about stored errors, over the last `window` (15m, 6h, 7d) or since/until.
+    Served from the per minute/hour rollup; name/severity filters count the errors table itself.
+    """
+    if window is not None:
+        try:
+            since = datetime.now(timezone.utc) - parse_window(window)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    since = _visible_since(since)
     
-    for error in received_errors:
-        # Count by error name
-        name = error.get('error_name', 'Unknown')
-        error_counts[name] = error_counts.get(name, 0) + 1
-        
-        # Count by severity
-        severity = error.get('severity', 'Unknown')
-        severity_counts[severity] = severity_counts.get(severity, 0) + 1
+    if name is not None or severity is not None:
+        stats = await aerror_stats(db, name=name, severity=severity, since=since, until=until)
+        stats["source"] = "errors"
+    else:
+        distributions = await arollup_stats(db, since, until)
+        first, latest = await aedge_errors(db, since=since, until=until)
+        stats = {
+            "total_errors": sum(distributions["name"].values()),
+            "error_distribution": distributions["name"],
+            "severity_distribution": distributions["severity"],
+            "service_distribution": distributions["service"],
+            "urgency_distribution": distributions["urgency"],
+            "first_error": first,
+            "latest_error": latest,
+            "source": "rollup",
+        }
+    if not stats["total_errors"] or stats["latest_error"] is None:
+        return {"message": "No errors received yet"}
     
-    return {
-        "total_errors": len(received_errors),
-        "error_distribution": error_counts,
-        "severity_distribution": severity_counts,
-        "first_error": received_errors[0],
-        "latest_error": received_errors[-1]
-    }
+    return FastJSONResponse({
+        **stats,
+        "window": {"since": since.isoformat() if since else None, "until": until.isoformat() if until else None},
+        "first_error": _error_out(stats["first_error"]),
+        "latest_error": _error_out(stats["latest_error"]),
+    })
 
 
 @app.delete("/errors")
-async def clear_errors():
-    """Clear all received errors"""
-    count = len(received_errors)
-    received_errors.clear()
+async def clear_errors(until: Optional[datetime] = None, db: AsyncSession = Depends(get_async_db)):
+    """
+    Clear the received errors (all, or those older than `until`) from /errors,
+    /errors/latest and /errors/stats of this process (the rollup counts to the
+    minute). Nothing is deleted: the stored errors, analyses and solutions stay
+    for dedup and similarity reuse.
+    """
+    global errors_cleared_before
+    # whole seconds: what SQLite's CURRENT_TIMESTAMP stores, a later error in the same second stays visible
+    cutoff = until or datetime.now(timezone.utc).replace(microsecond=0)
+    if cutoff.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=timezone.utc)
+    if errors_cleared_before is not None and cutoff <= errors_cleared_before:
+        return {"message": "Cleared 0 errors", "remaining": await acount_errors(db, since=errors_cleared_before)}
+    count = await acount_errors(db, since=errors_cleared_before, until=cutoff)
+    errors_cleared_before = cutoff
     return {
         "message": f"Cleared {count} errors",
-        "remaining": len(received_errors)
-    }
\ No newline at end of file
+        "remaining": await acount_errors(db, since=cutoff),
+    }
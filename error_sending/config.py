@@ -3,6 +3,28 @@ import os
 
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "http://localhost:8000/webhook/error")
 ERROR_ROTATION_INTERVAL = int(os.getenv("ERROR_ROTATION_INTERVAL", "60"))  # seconds
+# POST /load targets, comma separated, WEBHOOK_URL if unset
+WEBHOOK_URLS = [url.strip() for url in os.getenv("WEBHOOK_URLS", WEBHOOK_URL).split(",") if url.strip()]
+# the one pooled client all sends go through
+GENERATOR_MAX_CONNECTIONS = int(os.getenv("GENERATOR_MAX_CONNECTIONS", "100"))
+GENERATOR_HTTP2 = os.getenv("GENERATOR_HTTP2", "off") == "on"  # needs httpx[http2]
+
+# payload variation (error_sending/variation.py)
+# "on" -> the rotation and /send-error send a varied payload of the current type instead of the static one
+GENERATOR_VARIATION = os.getenv("GENERATOR_VARIATION", "off") == "on"
+GENERATOR_ZIPF_S = float(os.getenv("GENERATOR_ZIPF_S", "1.1"))  # skew of the error type mix, 0 = uniform
+# distinct services per error type and extra stack frames: these make distinct fingerprints
+GENERATOR_SERVICES = int(os.getenv("GENERATOR_SERVICES", "4"))
+GENERATOR_FRAME_VARIANTS = int(os.getenv("GENERATOR_FRAME_VARIANTS", "8"))
+GENERATOR_FRAME_RATE = float(os.getenv("GENERATOR_FRAME_RATE", "0.1"))  # share of payloads with an extra frame
+# volatile values, same fingerprint
+GENERATOR_USERS = int(os.getenv("GENERATOR_USERS", "1000"))
+GENERATOR_PODS = int(os.getenv("GENERATOR_PODS", "50"))
+GENERATOR_IPS = int(os.getenv("GENERATOR_IPS", "500"))
+# POST /load "replay" files (benchmarks/generate_payloads.py output), only file names in here are accepted
+GENERATOR_REPLAY_DIR = os.getenv(
+    "GENERATOR_REPLAY_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "payloads")
+)
 
 ERRORS = [
     {
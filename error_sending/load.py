@@ -0,0 +1,222 @@
+# load.py
+"""
+High-rate load generator: payloads from the variation engine (or replayed from a
+pre-generated file) sent to one or more webhooks at a mean rate (constant,
+Poisson or burst arrivals, or as fast as `concurrency` allows) over one
+long-lived pooled client.
+"""
+import asyncio
+import itertools
+import logging
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
+
+import httpx
+
+from error_sending.variation import PayloadVariation
+
+logger = logging.getLogger(__name__)
+
+PROFILES = ("constant", "poisson", "burst")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.lags: List[float] = []  # how late a send started against its schedule
+        self.statuses: Dict[str, int] = {}
+        self.queued = 0
+        self.started = 0.0
+        self.finished = 0.0
+
+    def record(self, status: str, latency: Optional[float], lag: float, queued: bool = False):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.lags.append(lag)
+        if latency is not None:
+            self.latencies.append(latency)
+        if queued:
+            self.queued += 1
+
+    def report(self) -> Dict[str, Any]:
+        sent = sum(self.statuses.values())
+        failed = sent - self.statuses.get("202", 0)
+        # a run still going reports up to now
+        elapsed = (self.finished or time.perf_counter()) - self.started if self.started else 0.0
+        return {
+            "requests": sent,
+            "duration_s": round(elapsed, 3),
+            "achieved_rate_rps": round(sent / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(failed / sent, 4) if sent else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+            "queued_for_analysis": self.queued,
+            "latency_ms": {
+                "p50": round(percentile(self.latencies, 0.5) * 1000, 2),
+                "p95": round(percentile(self.latencies, 0.95) * 1000, 2),
+                "p99": round(percentile(self.latencies, 0.99) * 1000, 2),
+                "max": round(max(self.latencies, default=0) * 1000, 2),
+            },
+            "schedule_lag_p99_ms": round(percentile(self.lags, 0.99) * 1000, 2),
+        }
+
+
+def create_client(max_connections: int, http2: bool = False, timeout: float = 10.0) -> httpx.AsyncClient:
+    """One long-lived client: keep-alive connections reused across sends, HTTP/2 if h2 is installed."""
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️  HTTP/2 needs the h2 package (pip install 'httpx[http2]'), using HTTP/1.1 keep-alive")
+            http2 = False
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=30)
+    return httpx.AsyncClient(http2=http2, timeout=timeout, limits=limits)
+
+
+def schedule(profile: str, rate: float, rng: random.Random, burst_size: int = 50) -> Iterator[float]:
+    """
+    Endless send offsets in seconds from the start of a run, for a mean of `rate`/s.
+    "constant": evenly spaced | "poisson": exponential gaps | "burst": `burst_size`
+    at once, then a pause. rate 0: everything due right away (closed loop).
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown load profile: {profile} (expected one of {', '.join(PROFILES)})")
+    offset = 0.0
+    for i in itertools.count():
+        if rate <= 0:
+            yield 0.0
+        elif profile == "constant":
+            yield i / rate
+        elif profile == "poisson":
+            offset += rng.expovariate(rate)
+            yield offset
+        else:
+            yield (i // burst_size) * burst_size / rate
+
+
+Payload = Union[Dict[str, Any], bytes]
+
+
+async def _send(client: httpx.AsyncClient, url: str, payload: Payload, result: LoadResult, scheduled: float):
+    start = time.perf_counter()
+    try:
+        if isinstance(payload, bytes):
+            # replayed, already serialized
+            response = await client.post(url, content=payload, headers={"Content-Type": "application/json"})
+        else:
+            response = await client.post(url, json=payload)
+    except httpx.HTTPError as e:
+        result.record(type(e).__name__, None, start - scheduled)
+        return
+    latency = time.perf_counter() - start
+    status = str(response.status_code)
+    # 202: persisted, "queued" false if it waits as a pending job (queue full); 4xx/5xx: not stored
+    queued = response.status_code == 202 and response.json().get("queued", False)
+    result.record(status, latency, start - scheduled, queued)
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    targets: List[str],
+    requests: Optional[int] = None,
+    duration: Optional[float] = None,
+    rate: float = 0.0,
+    concurrency: int = 50,
+    profile: str = "constant",
+    burst_size: int = 50,
+    seed: int = 7,
+    stop: Optional[asyncio.Event] = None,
+    result: Optional[LoadResult] = None,
+    payloads: Optional[Iterator[Payload]] = None,
+) -> LoadResult:
+    """
+    Send until `requests` were sent, `duration` seconds passed, `stop` is set or
+    `payloads` ran out, round-robin over `targets`, at most `concurrency` in
+    flight. Sends that start late (concurrency exhausted) show up as schedule lag.
+    `payloads` defaults to PayloadVariation(seed) with the GENERATOR_* defaults.
+    """
+    if requests is None and duration is None and stop is None:
+        raise ValueError("run_load needs requests, duration or a stop event")
+    rng = random.Random(seed)
+    payloads = iter(payloads if payloads is not None else PayloadVariation(seed))
+    result = result or LoadResult()
+    stop = stop or asyncio.Event()
+    semaphore = asyncio.Semaphore(concurrency)
+    running: Set[asyncio.Task] = set()
+
+    async def one(url, payload, scheduled):
+        try:
+            await _send(client, url, payload, result, scheduled)
+        finally:
+            semaphore.release()
+
+    result.started = time.perf_counter()
+    for i, offset in enumerate(schedule(profile, rate, rng, burst_size)):
+        if requests is not None and i >= requests:
+            break
+        # closed loop has no offsets to go by
+        if duration is not None and max(offset, time.perf_counter() - result.started) >= duration:
+            break
+        scheduled = result.started + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        if stop.is_set():
+            break
+        payload = next(payloads, None)
+        if payload is None:
+            break
+        await semaphore.acquire()
+        if rate <= 0:
+            scheduled = time.perf_counter()
+        task = asyncio.create_task(one(targets[i % len(targets)], payload, scheduled))
+        running.add(task)
+        task.add_done_callback(running.discard)
+    if running:
+        await asyncio.gather(*running)
+    result.finished = time.perf_counter()
+    return result
+
+
+class LoadRun:
+    """A run started from POST /load: the task, its stop switch and live results."""
+
+    def __init__(
+        self,
+        params: Dict[str, Any],
+        payloads: Optional[Iterator[Payload]] = None,
+        source: Optional[Dict[str, Any]] = None,
+    ):
+        self.params = params
+        self.payloads = payloads
+        self.source = source  # how the payloads are made, for the report
+        self.result = LoadResult()
+        self.stop = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, client: httpx.AsyncClient):
+        self.task = asyncio.create_task(run_load(client, stop=self.stop, result=self.result, payloads=self.payloads, **self.params))
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def cancel(self):
+        self.stop.set()
+        if self.task is not None:
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def report(self) -> Dict[str, Any]:
+        report = {"running": self.running, "params": self.params, "payloads": self.source, **self.result.report()}
+        if self.task is not None and self.task.done() and self.task.exception() is not None:
+            report["failed"] = str(self.task.exception())
+        return report
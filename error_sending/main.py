@@ -1,12 +1,25 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from datetime import datetime
 import asyncio
+import os
 from contextlib import asynccontextmanager
 import httpx
-from typing import Optional
+from typing import List, Literal, Optional
 import logging
-from error_sending.config import WEBHOOK_URL, ERRORS, ERROR_ROTATION_INTERVAL
+from pydantic import BaseModel, Field
+from error_sending.config import (
+    ERROR_ROTATION_INTERVAL,
+    ERRORS,
+    GENERATOR_HTTP2,
+    GENERATOR_MAX_CONNECTIONS,
+    GENERATOR_REPLAY_DIR,
+    GENERATOR_VARIATION,
+    WEBHOOK_URL,
+    WEBHOOK_URLS,
+)
+from error_sending.load import PROFILES, LoadRun, create_client
+from error_sending.variation import PayloadVariation, read_payloads, replay_path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,23 +29,28 @@ app = FastAPI(title="Error Generator Service", version="1.0.0")
 
 # Configuration
 current_error_index = 0
+# one long-lived pooled client (keep-alive), created in lifespan
+http_client: Optional[httpx.AsyncClient] = None
+# the POST /load run, if one was started
+load_run: Optional[LoadRun] = None
+# GENERATOR_VARIATION=on
+variation = PayloadVariation(seed=int(datetime.now().timestamp()))
 
 async def send_error_to_webhook(error_data: dict):
     """Send error data to webhook endpoint"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                WEBHOOK_URL,
-                json=error_data,
-                headers={"Content-Type": "application/json"}
-            )
+        response = await http_client.post(
+            WEBHOOK_URL,
+            json=error_data,
+            headers={"Content-Type": "application/json"}
+        )
+        
+        if response.status_code in (200, 202):
+            logger.info(f"✅ Successfully sent error '{error_data['error_name']}' to webhook")
+        else:
+            logger.error(f"❌ Webhook returned status code: {response.status_code}")
             
-            if response.status_code == 200:
-                logger.info(f"✅ Successfully sent error '{error_data['error_name']}' to webhook")
-            else:
-                logger.error(f"❌ Webhook returned status code: {response.status_code}")
-                
-            return response.status_code
+        return response.status_code
             
     except httpx.RequestError as e:
         logger.error(f"❌ Failed to send error to webhook: {str(e)}")
@@ -44,6 +62,8 @@ async def send_error_to_webhook(error_data: dict):
 
 def create_error_payload(error_index: int) -> dict:
     """Create error payload with current timestamp"""
+    if GENERATOR_VARIATION:
+        return variation.payload(error_index)
     error = ERRORS[error_index]
     
     return {
@@ -81,7 +101,9 @@ async def rotate_and_send_errors():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle"""
+    global http_client
     # Startup
+    http_client = create_client(GENERATOR_MAX_CONNECTIONS, http2=GENERATOR_HTTP2)
     logger.info("=" * 60)
     logger.info("🚀 Error Generator Service Started")
     logger.info(f"📡 Webhook URL: {WEBHOOK_URL}")
@@ -97,6 +119,9 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     task.cancel()
+    if load_run is not None:
+        await load_run.cancel()
+    await http_client.aclose()
     logger.info("🛑 Error Generator Service Stopped")
 
 
@@ -117,8 +142,10 @@ async def root():
         "current_error": ERRORS[current_error_index]['name'],
         "total_error_types": len(ERRORS),
         "rotation_interval": "60 seconds",
+        "load": load_run.report() if load_run is not None else None,
         "endpoints": {
-            "send_error": "POST /send-error - Manually trigger error send to webhook"
+            "send_error": "POST /send-error - Manually trigger error send to webhook",
+            "load": "POST /load - Start/stop a high-rate run, GET /load - its achieved rate and latencies"
         }
     }
 
@@ -135,7 +162,7 @@ async def send_error_immediately():
     
     status_code = await send_error_to_webhook(error_payload)
     
-    if status_code == 200:
+    if status_code in (200, 202):
         return {
             "success": True,
             "message": "Error sent successfully to webhook",
@@ -173,4 +200,87 @@ async def get_all_errors():
             }
             for i, error in enumerate(ERRORS)
         ]
-    }
\ No newline at end of file
+    }
+
+
+class LoadRequest(BaseModel):
+    action: Literal["start", "stop"] = "start"
+    rate: float = Field(100.0, ge=0, description="mean errors/s, 0 = as fast as concurrency allows")
+    concurrency: int = Field(50, ge=1)
+    profile: Literal[PROFILES] = "constant"
+    burst_size: int = Field(50, ge=1)
+    requests: Optional[int] = Field(None, ge=1)
+    duration: Optional[float] = Field(None, gt=0, description="seconds, runs until stopped if neither this nor requests")
+    targets: Optional[List[str]] = None
+    seed: int = 7
+    # payload variation, GENERATOR_* defaults if unset
+    zipf_s: Optional[float] = Field(None, ge=0)
+    services: Optional[int] = Field(None, ge=1)
+    frame_variants: Optional[int] = Field(None, ge=0)
+    frame_rate: Optional[float] = Field(None, ge=0, le=1)
+    users: Optional[int] = Field(None, ge=1)
+    pods: Optional[int] = Field(None, ge=1)
+    ips: Optional[int] = Field(None, ge=1)
+    replay: Optional[str] = Field(
+        None, description="file name in GENERATOR_REPLAY_DIR (benchmarks/generate_payloads.py) instead of live variation"
+    )
+
+    def variation(self) -> dict:
+        return {
+            key: value
+            for key, value in self.model_dump(
+                include={"zipf_s", "services", "frame_variants", "frame_rate", "users", "pods", "ips"}
+            ).items()
+            if value is not None
+        }
+
+
+@app.post("/load")
+async def control_load(load: LoadRequest):
+    """
+    Start a high-rate run (variants of ERRORS from the variation engine, or a
+    pre-generated file from GENERATOR_REPLAY_DIR, round-robin over the targets, WEBHOOK_URLS by
+    default) over the pooled client, or stop the current one.
+    """
+    global load_run
+    if load.action == "stop":
+        if load_run is None or not load_run.running:
+            raise HTTPException(status_code=409, detail="No load run in progress")
+        await load_run.cancel()
+        logger.info("🛑 Load run stopped")
+        return load_run.report()
+
+    if load_run is not None and load_run.running:
+        raise HTTPException(status_code=409, detail="A load run is already in progress, stop it first")
+    if load.replay:
+        try:
+            path = replay_path(load.replay, GENERATOR_REPLAY_DIR)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=400, detail=f"Replay file not found in {GENERATOR_REPLAY_DIR}: {load.replay}")
+        payloads, source = read_payloads(path), {"replay": load.replay}
+    else:
+        payloads = PayloadVariation(seed=load.seed, **load.variation())
+        source = {"variation": load.variation(), "seed": load.seed}
+    load_run = LoadRun({
+        "targets": load.targets or WEBHOOK_URLS,
+        "requests": load.requests,
+        "duration": load.duration,
+        "rate": load.rate,
+        "concurrency": min(load.concurrency, GENERATOR_MAX_CONNECTIONS),
+        "profile": load.profile,
+        "burst_size": load.burst_size,
+        "seed": load.seed,
+    }, payloads, source)
+    load_run.start(http_client)
+    logger.info(f"🚀 Load run started: {load.rate}/s {load.profile} to {len(load_run.params['targets'])} target(s)")
+    return load_run.report()
+
+
+@app.get("/load")
+async def get_load():
+    """Achieved rate, statuses and send latencies of the current (or last) load run"""
+    if load_run is None:
+        return {"message": "No load run started yet"}
+    return load_run.report()
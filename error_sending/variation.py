@@ -0,0 +1,188 @@
+# variation.py
+"""
+Payload variation engine: realistic-cardinality variants of ERRORS.
+
+Error types are drawn Zipf-distributed (a few types dominate, like in production).
+Each payload varies what differs between occurrences of the same error (pods,
+user ids, IPs, request/transaction ids, line numbers, metric values, timestamps)
+and, with controllable cardinality, what makes a different error: the service
+variant and an occasional extra stack frame. Distinct fingerprints are at most
+len(ERRORS) * services * (frame_variants + 1).
+
+Seeded: the same seed gives the same sequence (timestamps aside). write_payloads
+pre-generates NDJSON (gzip for *.gz) that read_payloads replays as raw bytes, with
+no generation or serialization cost per request.
+"""
+import gzip
+import itertools
+import json
+import os
+import random
+import re
+from datetime import datetime, timedelta
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+from error_sending.config import (
+    ERRORS,
+    GENERATOR_FRAME_RATE,
+    GENERATOR_FRAME_VARIANTS,
+    GENERATOR_IPS,
+    GENERATOR_PODS,
+    GENERATOR_SERVICES,
+    GENERATOR_USERS,
+    GENERATOR_ZIPF_S,
+)
+
+REGIONS = ["eu-west-1", "us-east-1", "ap-south-1"]
+DETAIL_PREFIXES = ["", "Request failed: ", "Upstream error: ", "Retry exhausted. "]
+
+_LINE = re.compile(r"line (\d+)")
+_PERCENT = re.compile(r"^\d+(\.\d+)?%$")
+
+
+def letters(i: int) -> str:
+    """0 -> "a", 27 -> "bb": digits are normalized out of fingerprints, letters are not."""
+    return chr(ord("a") + i % 26) * (i // 26 + 1)
+
+
+def zipf_weights(n: int, s: float) -> List[float]:
+    """Cumulative weights of ranks 1..n with P(k) ~ 1/k^s, s=0 is uniform."""
+    return list(itertools.accumulate(1 / k ** s for k in range(1, n + 1)))
+
+
+class PayloadVariation:
+    def __init__(
+        self,
+        seed: int = 7,
+        zipf_s: float = GENERATOR_ZIPF_S,
+        services: int = GENERATOR_SERVICES,
+        frame_variants: int = GENERATOR_FRAME_VARIANTS,
+        frame_rate: float = GENERATOR_FRAME_RATE,
+        users: int = GENERATOR_USERS,
+        pods: int = GENERATOR_PODS,
+        ips: int = GENERATOR_IPS,
+        errors: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.rng = random.Random(seed)
+        self.errors = errors or ERRORS
+        self.frame_rate = frame_rate
+        rng = self.rng
+        # rank order of the types is itself seeded, so which type is the heavy hitter varies by seed
+        self.types = rng.sample(range(len(self.errors)), len(self.errors))
+        self.type_weights = zipf_weights(len(self.types), zipf_s)
+        self.service_weights = zipf_weights(max(services, 1), zipf_s)
+        self.frame_weights = zipf_weights(frame_variants, zipf_s) if frame_variants else []
+        self.users = [f"user_{rng.randrange(16**8):08x}" for _ in range(max(users, 1))]
+        self.ips = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}" for _ in range(max(ips, 1))]
+        self.pod_suffixes = [f"{rng.randrange(16**6):06x}-{rng.randrange(36**3):03x}" for _ in range(max(pods, 1))]
+
+    def _service(self, base: str) -> str:
+        k = self.rng.choices(range(len(self.service_weights)), cum_weights=self.service_weights)[0]
+        return base if k == 0 else f"{base}-{letters(k - 1)}"
+
+    def _stack_trace(self, stack_trace: str, service: str) -> str:
+        rng = self.rng
+        stack_trace = _LINE.sub(lambda m: f"line {int(m.group(1)) + rng.randrange(40)}", stack_trace)
+        if self.frame_weights and rng.random() < self.frame_rate:
+            k = rng.choices(range(len(self.frame_weights)), cum_weights=self.frame_weights)[0]
+            module = service.split("-")[0]
+            frame = (
+                f'  File "/app/handlers/{module}.py", line {rng.randrange(20, 400)}, in handle_{letters(k)}\n'
+                f"    return await call_next(request)"
+            )
+            stack_trace = f"{frame}\n{stack_trace}"
+        return stack_trace
+
+    def _metrics(self, metrics: Dict[str, Any]) -> Dict[str, Any]:
+        rng = self.rng
+        varied = {}
+        for key, value in metrics.items():
+            if isinstance(value, bool):
+                varied[key] = value
+            elif isinstance(value, int):
+                varied[key] = max(0, int(value * rng.uniform(0.5, 1.5)))
+            elif isinstance(value, str) and _PERCENT.match(value):
+                varied[key] = f"{rng.randint(5, 99)}%"
+            else:
+                varied[key] = value
+        return varied
+
+    def payload(self, error_index: Optional[int] = None) -> Dict[str, Any]:
+        """
+        One webhook payload, of a Zipf-drawn type or of errors[error_index].
+        Nested dicts of the template are shared, not copied: treat as read-only.
+        """
+        rng = self.rng
+        if error_index is None:
+            error_index = rng.choices(self.types, cum_weights=self.type_weights)[0]
+        error = self.errors[error_index]
+        context = dict(error["context"])
+        service = self._service(context.get("service", "svc"))
+        context["service"] = service
+        context["region"] = rng.choice(REGIONS)
+        if "pod_name" in context:
+            context["pod_name"] = f"{service}-{rng.choice(self.pod_suffixes)}"
+        if "user_id" in context:
+            context["user_id"] = rng.choice(self.users)
+        if "ip_address" in context:
+            context["ip_address"] = rng.choice(self.ips)
+        for key in ("request_id", "transaction_id"):
+            if key in context:
+                context[key] = f"{context[key].rsplit('_', 1)[0]}_{rng.randrange(16**10):010x}"
+        if "stack_trace" in context:
+            context["stack_trace"] = self._stack_trace(context["stack_trace"], service)
+        detail = error["detail"]
+        if rng.random() < 0.3:
+            detail = rng.choice(DETAIL_PREFIXES) + detail
+        return {
+            "timestamp": (datetime.now() - timedelta(seconds=rng.randint(0, 5))).isoformat(),
+            "error_name": error["name"],
+            "status_code": error["status_code"],
+            "detail": detail,
+            "severity": error["severity"],
+            "context": context,
+            "metrics": self._metrics(error.get("metrics", {})),
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            yield self.payload()
+
+
+def _open(path: str, mode: str) -> IO:
+    # fastest gzip level: payloads are repetitive, it still shrinks them ~20x
+    return gzip.open(path, mode, compresslevel=1) if path.endswith(".gz") else open(path, mode)
+
+
+def write_payloads(path: str, count: int, variation: PayloadVariation) -> int:
+    """Pre-generate `count` payloads as NDJSON (gzip if path ends in .gz), returns bytes written."""
+    written = 0
+    with _open(path, "wb") as f:
+        for payload in itertools.islice(variation, count):
+            line = json.dumps(payload, separators=(",", ":")).encode("utf-8") + b"\n"
+            f.write(line)
+            written += len(line)
+    return written
+
+
+def replay_path(name: str, directory: str) -> str:
+    """
+    Path of the replay file `name` inside `directory`. Only a plain file name is
+    accepted, ValueError for anything else or for what resolves (symlinks) outside it.
+    """
+    if not name or name in (".", "..") or os.path.basename(name) != name or "\\" in name:
+        raise ValueError(f"Replay file must be a file name in {directory}: {name}")
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"Replay file must be a file name in {directory}: {name}")
+    return path
+
+
+def read_payloads(path: str) -> Iterator[bytes]:
+    """Replay a write_payloads file: each payload as the raw JSON body, ready to send."""
+    with _open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\n")
+            if line:
+                yield line
@@ -1,37 +1,240 @@
+"""
+Starts the receiver, the analysis workers and the error generator, restarts
+whatever dies or stops answering, and shuts everything down on Ctrl+C /
+SIGTERM. Linux, macOS and Windows.
+
+    python run_all.py --workers 4 --analysis-workers 2
+
+--workers N: receiver processes (uvicorn pre-fork, one port, the uvicorn
+supervisor replaces dead ones). --analysis-workers N: separate analysis
+processes (services/analysis_worker.py) and receivers that only persist
+errors and their analysis jobs (needs the analysis_jobs table, alembic
+upgrade head); 0 keeps the analysis inside the receiver (single receiver process).
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
 from pathlib import Path
-import subprocess, sys, time
+from typing import Dict, List, Optional
 
 BASE_DIR = Path(__file__).parent.resolve()
+WINDOWS = sys.platform == "win32"
 
-SENDER_DIR = BASE_DIR / "error_sending"
-RECEIVER_DIR = BASE_DIR / "error_receiving"
+logger = logging.getLogger("run_all")
 
 
-def popen(cmd: str, cwd: Path):
-    return subprocess.Popen(
-        cmd,
-        cwd=str(cwd),
-        shell=True,
-        creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
-    )
+class Child:
+    """
+    One supervised process: restarted with exponential backoff when it exits
+    or fails `health_failures` health checks in a row, stopped with SIGTERM
+    (CTRL_BREAK_EVENT on Windows) and killed if it does not exit in time.
+    """
+
+    def __init__(self, name: str, args: List[str], opts: argparse.Namespace,
+                 env: Optional[Dict[str, str]] = None, health_url: Optional[str] = None):
+        self.name = name
+        self.args = args
+        self.opts = opts
+        self.env = {**os.environ, **(env or {})}
+        self.health_url = health_url
+        self.proc: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.started_at = 0.0
+        self.restart_at: Optional[float] = None
+        self.failed_checks = 0
+        self.next_check = 0.0
+        self.healthy = False
+
+    def start(self):
+        kwargs = {}
+        if WINDOWS:
+            # own process group: Ctrl+C reaches only run_all, which then stops the group
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        self.proc = subprocess.Popen(self.args, cwd=str(BASE_DIR), env=self.env, **kwargs)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        self.failed_checks = 0
+        self.healthy = False
+        self.next_check = self.started_at + self.opts.health_grace
+        logger.info(f"▶️  {self.name} started (pid {self.proc.pid})")
+
+    def supervise(self, now: float):
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.restarts += 1
+                self.start()
+            return
+        code = self.proc.poll()
+        if code is not None:
+            self._schedule_restart(now, f"exited with code {code}")
+        elif self.health_url and now >= self.next_check:
+            self.next_check = now + self.opts.health_interval
+            if self.check():
+                self.failed_checks = 0
+            else:
+                self.failed_checks += 1
+                if self.failed_checks >= self.opts.health_failures:
+                    self.stop()
+                    self._schedule_restart(time.monotonic(), f"failed {self.failed_checks} health checks")
+
+    def _schedule_restart(self, now: float, reason: str):
+        # a process that stayed up a while starts over at the shortest delay
+        if now - self.started_at > self.opts.max_backoff * 2:
+            self.restarts = 0
+        delay = min(self.opts.max_backoff, 2 ** self.restarts)
+        self.restart_at = now + delay
+        logger.warning(f"⚠️  {self.name} {reason}, restarting in {delay}s")
+
+    def check(self) -> bool:
+        try:
+            with urllib.request.urlopen(self.health_url, timeout=self.opts.health_timeout) as response:
+                self.healthy = response.status == 200
+        except Exception:
+            self.healthy = False
+        return self.healthy
+
+    def signal_stop(self):
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        if WINDOWS:
+            self.proc.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            self.proc.terminate()
+
+    def kill(self):
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        logger.warning(f"⚠️  {self.name} did not stop in {self.opts.shutdown_timeout}s, killing it")
+        if WINDOWS:
+            subprocess.run(["taskkill", "/PID", str(self.proc.pid), "/T", "/F"], capture_output=True)
+        else:
+            # the whole session, uvicorn's worker processes included
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        self.proc.wait()
+
+    def stop(self):
+        self.signal_stop()
+        try:
+            self.proc.wait(self.opts.shutdown_timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
 
-if __name__ == "__main__":
-    receiver = popen(
-        "uvicorn webhook_receiver:app --port 8000",
-        cwd=RECEIVER_DIR
-    )
 
-    time.sleep(1)
+def uvicorn(app: str, host: str, port: int, workers: int = 1) -> List[str]:
+    return [sys.executable, "-m", "uvicorn", app, "--host", host, "--port", str(port), "--workers", str(workers)]
 
-    sender = popen(
-        "uvicorn main:app --port 8001",
-        cwd=SENDER_DIR
+
+def stop_all(groups: List[List[Child]], timeout: float):
+    """Group by group (generator, receivers, analysis workers), each group in parallel."""
+    for group in groups:
+        for child in group:
+            child.signal_stop()
+        deadline = time.monotonic() + timeout
+        for child in group:
+            if child.proc is None:
+                continue
+            try:
+                child.proc.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                child.kill()
+            logger.info(f"⏹️  {child.name} stopped")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python run_all.py")
+    parser.add_argument("--workers", type=int, default=1, help="receiver processes")
+    parser.add_argument("--analysis-workers", type=int, default=0,
+                        help="analysis processes, 0 = analysis inside the receiver")
+    parser.add_argument("--analysis-concurrency", type=int,
+                        help="concurrent analyses per process (ANALYSIS_WORKERS)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--receiver-port", type=int, default=8000)
+    parser.add_argument("--sender-port", type=int, default=8001)
+    parser.add_argument("--no-sender", action="store_true", help="do not start the error generator")
+    parser.add_argument("--health-interval", type=float, default=5.0, help="seconds between health checks")
+    parser.add_argument("--health-timeout", type=float, default=3.0)
+    parser.add_argument("--health-failures", type=int, default=3, help="failed checks in a row before a restart")
+    parser.add_argument("--health-grace", type=float, default=30.0, help="seconds after a start before checks begin")
+    parser.add_argument("--max-backoff", type=float, default=30.0, help="longest delay between restarts, seconds")
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0, help="seconds to exit before a kill")
+    args = parser.parse_args()
+    if args.workers < 1 or not 0 <= args.analysis_workers <= 256:
+        parser.error("--workers must be >= 1 and --analysis-workers 0-256")
+    if args.workers > 1 and args.analysis_workers == 0:
+        # every receiver would run its own queue and resume the same unfinished analyses
+        parser.error("--workers > 1 needs --analysis-workers >= 1")
+    return args
+
+
+def main():
+    opts = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s run_all %(message)s")
+    env = {}
+    if opts.analysis_concurrency:
+        env["ANALYSIS_WORKERS"] = str(opts.analysis_concurrency)
+
+    receiver = Child(
+        "receiver",
+        uvicorn("error_receiving.webhook_receiver:app", opts.host, opts.receiver_port, opts.workers),
+        opts,
+        {**env, "ANALYSIS_IN_PROCESS": "off" if opts.analysis_workers else "on"},
+        health_url=f"http://{opts.host}:{opts.receiver_port}/",
     )
+    analysis = [
+        Child(
+            f"analysis worker {i + 1}/{opts.analysis_workers}",
+            [sys.executable, "-m", "services.analysis_worker", "--name", f"{socket.gethostname()}-analysis-{i + 1}"],
+            opts,
+            env,
+        )
+        for i in range(opts.analysis_workers)
+    ]
+    senders = [] if opts.no_sender else [Child(
+        "sender",
+        uvicorn("error_sending.main:app", opts.host, opts.sender_port),
+        opts,
+        health_url=f"http://{opts.host}:{opts.sender_port}/",
+    )]
+
+    stopping = []
+
+    def request_stop(signum, frame):
+        if not stopping:
+            logger.info(f"🛑 {signal.Signals(signum).name}, stopping")
+        stopping.append(signum)
+
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+
+    children = [receiver, *analysis]
+    for child in children:
+        child.start()
+    # the generator starts sending right away, give it a receiver to send to
+    deadline = time.monotonic() + opts.health_grace
+    while senders and not stopping and time.monotonic() < deadline and not receiver.check():
+        time.sleep(0.5)
+    for child in senders:
+        if not stopping:
+            child.start()
+            children.append(child)
 
     try:
-        receiver.wait()
-        sender.wait()
-    except KeyboardInterrupt:
-        subprocess.run(f"taskkill /PID {receiver.pid} /F /T", shell=True)
-        subprocess.run(f"taskkill /PID {sender.pid} /F /T", shell=True)
-        sys.exit(0)
\ No newline at end of file
+        while not stopping:
+            now = time.monotonic()
+            for child in children:
+                child.supervise(now)
+            time.sleep(0.5)
+    finally:
+        stop_all([[c for c in senders if c.proc], [receiver], analysis], opts.shutdown_timeout)
+
+if __name__ == "__main__":
+    main()
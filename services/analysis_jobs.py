@@ -0,0 +1,139 @@
+"""
+Durable analysis job queue (analysis_jobs table, db/repositories/job_repo.py).
+
+With ANALYSIS_IN_PROCESS=off every persisted error gets a pending job in the
+same transaction, analysis worker processes (services/analysis_worker.py)
+lease them in batches and ack them once the analysis is stored. A job whose
+worker dies is leased again when its lease runs out, so every error is
+analyzed at least once.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.repositories.job_repo import (
+    aclaim_jobs,
+    acomplete_jobs,
+    arelease_jobs,
+    arenew_leases,
+    aretry_job,
+)
+from db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# "off" -> this process only persists errors (plus their jobs), analysis worker processes
+# run them (python -m services.analysis_worker, run_all.py --analysis-workers)
+ANALYSIS_IN_PROCESS = os.getenv("ANALYSIS_IN_PROCESS", "on") == "on"
+ANALYSIS_JOBS = not ANALYSIS_IN_PROCESS
+
+ANALYSIS_JOB_BATCH = int(os.getenv("ANALYSIS_JOB_BATCH", "50"))  # jobs leased per claim
+ANALYSIS_JOB_LEASE = float(os.getenv("ANALYSIS_JOB_LEASE", "300"))  # seconds, renewed every third of it
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "5"))
+ANALYSIS_JOB_RETRY_DELAY = float(os.getenv("ANALYSIS_JOB_RETRY_DELAY", "10"))  # seconds, doubled per attempt
+
+
+class JobConsumer:
+    """
+    Jobs leased by one worker process. `finished` is the AnalysisQueue hook,
+    acks and retries are collected there and written by `aflush` in one transaction.
+    """
+
+    def __init__(self, worker: str, lease: float = ANALYSIS_JOB_LEASE,
+                 max_attempts: int = ANALYSIS_JOB_MAX_ATTEMPTS, retry_delay: float = ANALYSIS_JOB_RETRY_DELAY):
+        self.worker = worker
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # error_id -> (job_id, attempts)
+        self.held: Dict[int, Tuple[int, int]] = {}
+        self._done: List[int] = []
+        self._failed: List[Tuple[int, int, str]] = []
+        self._renewed_at = time.monotonic()
+
+        self.claimed = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+
+    async def aclaim(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Lease up to `limit` due jobs, returns (error_id, payload) to submit."""
+        async with AsyncSessionLocal() as db:
+            jobs = await aclaim_jobs(db, limit, self.lease, self.worker, self.max_attempts)
+            await db.commit()
+        for job_id, error_id, attempts, _ in jobs:
+            self.held[error_id] = (job_id, attempts)
+        self.claimed += len(jobs)
+        return [(error_id, payload) for _, error_id, _, payload in jobs]
+
+    def finished(self, error_id: int, exc: Optional[BaseException] = None):
+        job = self.held.pop(error_id, None)
+        if job is None:
+            return
+        job_id, attempts = job
+        if exc is None:
+            self._done.append(job_id)
+        else:
+            self._failed.append((job_id, attempts, str(exc) or type(exc).__name__))
+
+    def _retry_at(self, attempts: int) -> Optional[datetime]:
+        if attempts >= self.max_attempts:
+            return None
+        return datetime.now(timezone.utc) + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+
+    async def aflush(self):
+        """Ack finished jobs, put failed ones back with a delay (or mark them failed for good)."""
+        if not self._done and not self._failed:
+            return
+        done, self._done = self._done, []
+        failed, self._failed = self._failed, []
+        try:
+            async with AsyncSessionLocal() as db:
+                if done:
+                    await acomplete_jobs(db, done, self.worker)
+                for job_id, attempts, message in failed:
+                    await aretry_job(db, job_id, message, self._retry_at(attempts), self.worker)
+                await db.commit()
+        except Exception:
+            # tried again on the next flush; if this process dies first, the leases run out
+            self._done = done + self._done
+            self._failed = failed + self._failed
+            raise
+        self.completed += len(done)
+        for job_id, attempts, _ in failed:
+            if self._retry_at(attempts) is None:
+                self.dead += 1
+                logger.error(f"❌ Analysis job {job_id} failed {attempts} times, giving up")
+            else:
+                self.retried += 1
+
+    async def arenew(self):
+        """Extend the leases of the held jobs every third of the lease."""
+        if not self.held or time.monotonic() - self._renewed_at < self.lease / 3:
+            return
+        async with AsyncSessionLocal() as db:
+            await arenew_leases(db, [job_id for job_id, _ in self.held.values()], self.lease, self.worker)
+            await db.commit()
+        self._renewed_at = time.monotonic()
+
+    async def arelease(self):
+        """Unfinished jobs back to pending, for the other workers (on shutdown)."""
+        if not self.held:
+            return
+        async with AsyncSessionLocal() as db:
+            await arelease_jobs(db, [job_id for job_id, _ in self.held.values()], self.worker)
+            await db.commit()
+        logger.info(f"↩️  Released {len(self.held)} unfinished analysis jobs")
+        self.held.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker,
+            "held": len(self.held),
+            "claimed": self.claimed,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.dead,
+        }
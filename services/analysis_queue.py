@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from ai.graph import llm_resilience
+from ai.resilience import CircuitOpenError
+from db.repositories.job_repo import aenqueue_jobs
+from db.session import AsyncSessionLocal
+from services.analysis_jobs import ANALYSIS_IN_PROCESS, JobConsumer
+from services.analysis_stream import analysis_streams
+from services.error_service import adiscard_analysis, afinish_analysis, astart_analysis
+from services.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", "100"))
+# workers are coroutines, hundreds of them can wait on the LLM at once
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "32"))
+# stage 2 (generate_solution_node) gets its own workers so stage 1 of the next
+# error runs while the solution of the previous one is still in flight
+SOLUTION_WORKERS = int(os.getenv("SOLUTION_WORKERS", str(ANALYSIS_WORKERS)))
+# "reject" -> webhook answers 429 when the queue is full
+# "spill"  -> error stays in the DB with a pending analysis job and is picked up once
+#             the queue has room (by this process or, after a restart, the next one)
+# either way an error persisted while the queue filled up is spilled, never dropped
+ANALYSIS_QUEUE_OVERFLOW = os.getenv("ANALYSIS_QUEUE_OVERFLOW", "reject")
+ANALYSIS_SPILL_POLL_INTERVAL = float(os.getenv("ANALYSIS_SPILL_POLL_INTERVAL", "5"))
+
+
+class AnalysisQueue:
+    """
+    Bounded in-process queue that runs error analysis off the request path.
+    Two stages: analysis workers feed a bounded solution queue drained by solution workers.
+    on_finished(error_id, exc) is called once per error, exc is None if it was analyzed.
+    While the LLM circuit breaker is open the workers wait and errors stay queued,
+    calls it turned away go back into their queue once it lets calls through again.
+    refill_spilled=False leaves claiming pending jobs to the caller (services/analysis_worker.py).
+    """
+
+    def __init__(self, maxsize: int, concurrency: int, overflow: str, solution_concurrency: int, in_process: bool = True,
+                 on_finished: Optional[Callable[[int, Optional[BaseException]], None]] = None,
+                 refill_spilled: bool = True):
+        if overflow not in ("reject", "spill"):
+            raise ValueError(f"Unknown ANALYSIS_QUEUE_OVERFLOW: {overflow}")
+        self.maxsize = maxsize
+        self.concurrency = concurrency
+        self.solution_concurrency = solution_concurrency
+        self.overflow = overflow
+        self.in_process = in_process
+        self.on_finished = on_finished
+        self.refill_spilled = refill_spilled
+        self._queue: Optional[asyncio.Queue] = None
+        self._solutions: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # spilled, their jobs not written yet
+        self._spilling: List[int] = []
+        self._spill_writes: Set[asyncio.Task] = set()
+        self._spill_jobs: Optional[JobConsumer] = None
+        self._deferred: Set[asyncio.Task] = set()
+
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.spilled = 0
+        self.deferred = 0
+        self.handed_off = 0
+        self._dequeued = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def start(self):
+        if not self.in_process:
+            logger.info("🧵 Analysis runs in worker processes (ANALYSIS_IN_PROCESS=off)")
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._solutions = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._analysis_worker(i)) for i in range(self.concurrency)
+        ] + [
+            asyncio.create_task(self._solution_worker(i)) for i in range(self.solution_concurrency)
+        ]
+        if self.refill_spilled:
+            # in reject mode too: requests that passed the full-queue check race for the last slots
+            self._spill_jobs = JobConsumer(f"{socket.gethostname()}-{os.getpid()}-spill")
+            self._tasks.append(asyncio.create_task(self._refill_spilled()))
+        logger.info(
+            f"🧵 Analysis queue started (size={self.maxsize}, workers={self.concurrency}+{self.solution_concurrency}, overflow={self.overflow})"
+        )
+
+    async def stop(self):
+        waiting = len(self._deferred)
+        for task in [*self._tasks, *self._deferred]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._deferred, return_exceptions=True)
+        self._tasks = []
+        # spilled errors are left for the next start as pending jobs
+        await asyncio.gather(*self._spill_writes, return_exceptions=True)
+        if self._spill_jobs is not None:
+            try:
+                await self._spill_jobs.aflush()
+                await self._spill_jobs.arelease()
+            except Exception as e:
+                logger.error(f"❌ Could not hand back spilled analysis jobs, their leases run out instead: {str(e)}")
+        if self._queue is not None and not self._queue.empty() or waiting:
+            queued = self._queue.qsize() if self._queue is not None else 0
+            logger.warning(f"⚠️  Analysis queue stopped with {queued + waiting} errors still queued")
+
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def free(self) -> int:
+        """Errors that can be submitted right now without overflowing."""
+        return self.maxsize - self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, error_id: int, error_data: Dict[str, Any]) -> bool:
+        """
+        Queue an already persisted error. Returns False if it did not fit, it is
+        spilled then (a pending analysis job) whatever the overflow mode.
+        """
+        if not self.in_process:
+            # persisted with its job is all it takes, a worker process claims it (services/analysis_jobs.py)
+            self.handed_off += 1
+            return True
+        try:
+            self._queue.put_nowait((error_id, error_data, time.monotonic()))
+            return True
+        except asyncio.QueueFull:
+            self._spill(error_id)
+            self.spilled += 1
+            return False
+
+    def submit_many(self, errors: List[Tuple[int, Dict[str, Any]]]) -> List[bool]:
+        """Queue a persisted batch in body order, one result per error as for submit()."""
+        return [self.submit(error_id, error_data) for error_id, error_data in errors]
+
+    def reject(self):
+        """Count a webhook turned away before anything was persisted."""
+        self.rejected += 1
+
+    async def _analysis_worker(self, worker_id: int):
+        while True:
+            await self._breaker_closed()
+            error_id, error_data, enqueued_at = await self._queue.get()
+            waited = time.monotonic() - enqueued_at
+            self._dequeued += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            histogram("analysis_queue_wait").observe(waited)
+            self.in_flight += 1
+            try:
+                staged = await astart_analysis(error_id, error_data)
+                if staged is None:
+                    self._finished(error_id)
+                else:
+                    # blocks while stage 2 is full, which in turn fills this queue
+                    await self._solutions.put((staged, time.monotonic()))
+            except CircuitOpenError as e:
+                self._defer(self._queue, (error_id, error_data), e.retry_after)
+            except Exception as e:
+                await self._discard(error_id)
+                self._finished(error_id, e)
+                logger.error(f"❌ Analysis of error {error_id} failed: {str(e)}")
+                analysis_streams.publish(error_id, "failed", {"error_id": error_id, "stage": "analysis", "message": str(e)})
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def _solution_worker(self, worker_id: int):
+        while True:
+            await self._breaker_closed()
+            staged, enqueued_at = await self._solutions.get()
+            histogram("solution_queue_wait").observe(time.monotonic() - enqueued_at)
+            self.in_flight += 1
+            try:
+                await afinish_analysis(staged)
+                self._finished(staged["error_id"])
+            except CircuitOpenError as e:
+                # the graph run stopped before solve, resuming it runs solve again
+                self._defer(self._solutions, (staged,), e.retry_after)
+            except Exception as e:
+                await self._discard(staged["error_id"])
+                self._finished(staged["error_id"], e)
+                logger.error(f"❌ Solution for error {staged['error_id']} failed: {str(e)}")
+                analysis_streams.publish(
+                    staged["error_id"], "failed", {"error_id": staged["error_id"], "stage": "solution", "message": str(e)}
+                )
+            finally:
+                self.in_flight -= 1
+                self._solutions.task_done()
+
+    @staticmethod
+    async def _breaker_closed():
+        while (delay := llm_resilience.breaker.retry_after()) > 0:
+            await asyncio.sleep(delay)
+
+    def _defer(self, queue: asyncio.Queue, item: tuple, delay: float):
+        """`item` back into `queue` after `delay` seconds, when the breaker lets a call through."""
+        self.deferred += 1
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            await queue.put((*item, time.monotonic()))
+
+        task = asyncio.create_task(requeue())
+        self._deferred.add(task)
+        task.add_done_callback(self._deferred.discard)
+
+    @staticmethod
+    async def _discard(error_id: int):
+        """
+        A failed run is not resumed on the next start (the LLM already retried it),
+        a job retry of it starts over.
+        """
+        try:
+            await adiscard_analysis(error_id)
+        except Exception as e:
+            logger.error(f"❌ Could not drop the graph run of error {error_id}: {str(e)}")
+
+    def _finished(self, error_id: int, exc: Optional[BaseException] = None):
+        if exc is None:
+            self.processed += 1
+        else:
+            self.failed += 1
+        if self._spill_jobs is not None:
+            self._spill_jobs.finished(error_id, exc)
+        if self.on_finished is not None:
+            self.on_finished(error_id, exc)
+
+    def _spill(self, error_id: int):
+        """A pending analysis job for the error, written right away (ids spilled meanwhile go along)."""
+        self._spilling.append(error_id)
+        if len(self._spilling) == 1:
+            task = asyncio.create_task(self._write_spilled())
+            self._spill_writes.add(task)
+            task.add_done_callback(self._spill_writes.discard)
+
+    async def _write_spilled(self):
+        error_ids, self._spilling = self._spilling, []
+        try:
+            async with AsyncSessionLocal() as db:
+                await aenqueue_jobs(db, error_ids)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"❌ Could not save analysis jobs of {len(error_ids)} spilled errors: {str(e)}")
+
+    async def _refill_spilled(self):
+        """
+        Lease pending jobs into the free queue slots: spilled errors, including the
+        ones a previous process left behind (checked right at start).
+        """
+        while True:
+            try:
+                await self._spill_jobs.aflush()
+                await self._spill_jobs.arenew()
+                free = min(self.free(), self.maxsize - len(self._spill_jobs.held))
+                if free > 0 and llm_resilience.breaker.retry_after() <= 0:
+                    for error_id, payload in await self._spill_jobs.aclaim(free):
+                        # webhooks may have taken the room meanwhile
+                        await self._queue.put((error_id, payload, time.monotonic()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Refilling spilled analyses failed: {str(e)}")
+            await asyncio.sleep(ANALYSIS_SPILL_POLL_INTERVAL)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "solution_depth": self._solutions.qsize() if self._solutions is not None else 0,
+            "max_size": self.maxsize,
+            "workers": self.concurrency,
+            "solution_workers": self.solution_concurrency,
+            "overflow": self.overflow,
+            "in_process": self.in_process,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "spilled": self.spilled,
+            "spill_jobs": self._spill_jobs.stats() if self._spill_jobs is not None else None,
+            "deferred": self.deferred,
+            "deferred_pending": len(self._deferred),
+            "handed_off": self.handed_off,
+            "avg_wait_ms": round(self._wait_total / self._dequeued * 1000, 2) if self._dequeued else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+        }
+
+
+analysis_queue = AnalysisQueue(
+    ANALYSIS_QUEUE_SIZE, ANALYSIS_WORKERS, ANALYSIS_QUEUE_OVERFLOW, SOLUTION_WORKERS, ANALYSIS_IN_PROCESS
+)
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set, Tuple
+
+from services.metrics import histogram
+
+# seconds of silence before a keep-alive, and how long one stream may stay open
+ANALYSIS_STREAM_HEARTBEAT = float(os.getenv("ANALYSIS_STREAM_HEARTBEAT", "15"))
+ANALYSIS_STREAM_TIMEOUT = float(os.getenv("ANALYSIS_STREAM_TIMEOUT", "300"))
+
+# in the order a run produces them, late subscribers get the latest of each replayed
+# "analysis"/"solution" carry the fields parsed so far, "*_done" the final stored dict
+EVENTS = ("analysis", "analysis_done", "solution", "solution_done", "done", "failed")
+# {"stage", "attempt"}: the LLM call of that stage is retried, its fields so far are void (not replayed)
+RETRY_EVENT = "retry"
+PARTIAL_EVENTS = ("analysis", "solution")
+FINAL_EVENTS = ("done", "failed")
+
+Event = Tuple[str, Any]
+
+
+class Subscription:
+    """Events of one error for one reader. Partial snapshots are cumulative, a slow reader only gets the newest."""
+
+    def __init__(self, streams: "AnalysisStreams", error_id: int):
+        self.streams = streams
+        self.error_id = error_id
+        self._events: Deque[Event] = deque()
+        self._ready = asyncio.Event()
+
+    def put(self, event: str, data: Any):
+        if event in PARTIAL_EVENTS and self._events and self._events[-1][0] == event:
+            self._events[-1] = (event, data)
+            self.streams.coalesced += 1
+        else:
+            self._events.append((event, data))
+        self._ready.set()
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """Next event, None after `timeout` seconds without one."""
+        if not self._events:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+    def close(self):
+        self.streams._unsubscribe(self)
+
+
+class AnalysisStreams:
+    """
+    Fan-out of partial analysis/solution fields from the graph nodes (ai/graph.py)
+    to GET /errors/{id}/analysis/stream readers, in-process. Publishing without
+    readers only keeps the latest event per kind until the run is done.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._latest: Dict[int, Dict[str, Any]] = {}
+
+        self.published = 0
+        self.coalesced = 0
+        self.streams_opened = 0
+
+    def publish(self, error_id: Optional[int], event: str, data: Any):
+        if error_id is None:
+            return
+        self.published += 1
+        if event in FINAL_EVENTS:
+            self._latest.pop(error_id, None)
+        elif event == RETRY_EVENT:
+            self._latest.get(error_id, {}).pop(data["stage"], None)
+        else:
+            self._latest.setdefault(error_id, {})[event] = data
+        for subscription in self._subscribers.get(error_id, ()):
+            subscription.put(event, data)
+
+    def subscribe(self, error_id: int) -> Subscription:
+        """Register before reading what is stored, so nothing published in between is missed."""
+        subscription = Subscription(self, error_id)
+        latest = self._latest.get(error_id, {})
+        for event in EVENTS:
+            if event in latest:
+                subscription.put(event, latest[event])
+        self._subscribers.setdefault(error_id, set()).add(subscription)
+        self.streams_opened += 1
+        return subscription
+
+    def watched(self, error_id: int) -> bool:
+        """A reader is subscribed to the error right now."""
+        return error_id in self._subscribers
+
+    def _unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.error_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.error_id]
+
+    async def events(
+        self,
+        subscription: Subscription,
+        stored: Dict[str, Any],
+        timeout: float = ANALYSIS_STREAM_TIMEOUT,
+        heartbeat: float = ANALYSIS_STREAM_HEARTBEAT,
+    ) -> AsyncIterator[Optional[Event]]:
+        """
+        What is already stored first (services/error_service.astored_analysis), then
+        the live events of the run until done/failed or `timeout`. Yields None after
+        `heartbeat` seconds of silence. Closes the subscription when done.
+        """
+        start = time.perf_counter()
+        sent = set()
+
+        def first_field(event):
+            if event in ("analysis", "analysis_done") and "first_field" not in sent:
+                sent.add("first_field")
+                histogram("stream_first_field").observe(time.perf_counter() - start)
+
+        try:
+            for event in ("analysis", "solution"):
+                if stored.get(event) is not None:
+                    first_field(f"{event}_done")
+                    sent.add(f"{event}_done")
+                    yield f"{event}_done", stored[event]
+            if stored.get("finished"):
+                yield "done", done_event(subscription.error_id, stored["error_id"])
+                return
+
+            deadline = start + timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    yield "timeout", {"error_id": subscription.error_id, "after_seconds": timeout}
+                    return
+                item = await subscription.get(min(heartbeat, remaining))
+                if item is None:
+                    yield None
+                    continue
+                event, data = item
+                stage = event.split("_")[0]
+                # replayed partials of a stage already delivered from the database
+                if f"{stage}_done" in sent:
+                    continue
+                if event.endswith("_done"):
+                    sent.add(event)
+                first_field(event)
+                yield event, data
+                if event in FINAL_EVENTS:
+                    return
+        finally:
+            subscription.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self._latest),
+            "readers": sum(len(s) for s in self._subscribers.values()),
+            "streams_opened": self.streams_opened,
+            "events_published": self.published,
+            "partials_coalesced": self.coalesced,
+        }
+
+
+def done_event(error_id: int, analyzed_error_id: int) -> Dict[str, Any]:
+    """Data of "done": reused_from is the error whose analysis a repeat got."""
+    return {"error_id": error_id, "reused_from": analyzed_error_id if analyzed_error_id != error_id else None}
+
+
+analysis_streams = AnalysisStreams()
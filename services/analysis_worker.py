@@ -0,0 +1,123 @@
+"""
+Analysis worker process: the two-stage analysis queue of the receiver, fed
+from the analysis_jobs table instead of the webhook. Receivers started with
+ANALYSIS_IN_PROCESS=off only persist errors and their jobs, any number of
+these processes (on any number of machines) lease the jobs in batches with
+SELECT ... FOR UPDATE SKIP LOCKED (services/analysis_jobs.py). run_all.py
+--analysis-workers N starts and supervises them:
+
+    python -m services.analysis_worker --name worker-1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+from ai.graph import get_llm, llm_resilience
+from db.session import adispose_engines
+from services.analysis_jobs import ANALYSIS_JOB_BATCH, JobConsumer
+from services.analysis_queue import ANALYSIS_QUEUE_SIZE, ANALYSIS_WORKERS, SOLUTION_WORKERS, AnalysisQueue
+from services.error_service import aclose_error_graph, aload_similarity_index
+from services.logging_config import setup_logging
+from services.write_buffer import write_buffer
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", "1"))  # seconds, while no jobs are due
+
+
+def _on_signals(stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    # SIGBREAK: what run_all.py sends on Windows (CTRL_BREAK_EVENT)
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        sig = getattr(signal, name, None)
+        if sig is None:
+            continue
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop.set))
+
+
+async def arun(name: str):
+    jobs = JobConsumer(name)
+    # always analyzes, whatever ANALYSIS_IN_PROCESS says; only claims what fits, so never overflows
+    queue = AnalysisQueue(
+        ANALYSIS_QUEUE_SIZE, ANALYSIS_WORKERS, "reject", SOLUTION_WORKERS,
+        on_finished=jobs.finished, refill_spilled=False,
+    )
+    stop = asyncio.Event()
+    _on_signals(stop)
+
+    get_llm()
+    await queue.start()
+    indexed = await aload_similarity_index()
+    # no resume step: a job another process left running is claimed again once its
+    # lease runs out, astart_analysis continues its graph run from the checkpointer
+    logger.info(
+        f"👷 Analysis worker {name} started "
+        f"(similarity index {indexed}, batch {ANALYSIS_JOB_BATCH}, poll every {ANALYSIS_POLL_INTERVAL}s)"
+    )
+
+    # jobs held at once: what both stages can work on, the rest stays due for other workers
+    capacity = ANALYSIS_WORKERS + SOLUTION_WORKERS
+    try:
+        while not stop.is_set():
+            wait = ANALYSIS_POLL_INTERVAL
+            try:
+                await jobs.aflush()
+                await jobs.arenew()
+                room = min(capacity - len(jobs.held), queue.free(), ANALYSIS_JOB_BATCH)
+                paused = llm_resilience.breaker.retry_after()
+                if paused > 0:
+                    # LLM circuit breaker open: jobs stay due for when it closes (or for other workers)
+                    wait = min(ANALYSIS_POLL_INTERVAL, paused)
+                elif room <= 0:
+                    # busy, claim again as soon as an analysis finishes
+                    wait = min(ANALYSIS_POLL_INTERVAL, 0.05)
+                else:
+                    errors = await jobs.aclaim(room)
+                    queue.submit_many(errors)
+                    if len(errors) == room:
+                        # more are probably due
+                        wait = 0
+            except Exception as e:
+                logger.error(f"❌ Analysis job bookkeeping failed: {str(e)}")
+            try:
+                await asyncio.wait_for(stop.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # acks of what finished, the rest goes back to pending for the other workers
+        # (in-flight graph runs resume from the checkpointer wherever they are claimed)
+        await queue.stop()
+        await write_buffer.drain()
+        try:
+            await jobs.aflush()
+            await jobs.arelease()
+        except Exception as e:
+            logger.error(f"❌ Releasing analysis jobs failed, their leases run out instead: {str(e)}")
+        await aclose_error_graph()
+        await adispose_engines()
+        stats = jobs.stats()
+        logger.info(
+            f"👋 Analysis worker {name} stopped "
+            f"(claimed {stats['claimed']}, completed {stats['completed']}, "
+            f"retried {stats['retried']}, failed {stats['failed']})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m services.analysis_worker")
+    parser.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="worker name recorded on the jobs it leases (default: host-pid)")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(arun(args.name))
+
+
+if __name__ == "__main__":
+    main()
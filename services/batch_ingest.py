@@ -0,0 +1,169 @@
+import codecs
+import json
+import logging
+import os
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from services import fast_json
+from services.analysis_queue import analysis_queue
+from services.error_payload import PayloadError, check_error_payload
+from services.error_service import apersist_errors
+from services.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# errors per bulk insert + group enqueue, a batch body is persisted group by group while it streams in
+WEBHOOK_BATCH_GROUP = int(os.getenv("WEBHOOK_BATCH_GROUP", "500"))
+# one item (NDJSON line / array element) larger than this fails the rest of the body
+WEBHOOK_BATCH_MAX_ITEM_BYTES = int(os.getenv("WEBHOOK_BATCH_MAX_ITEM_BYTES", str(1024 * 1024)))
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/jsonlines")
+
+# (payload, None) for an item that parsed, (None, reason) for one that did not
+Item = Tuple[Optional[Dict[str, Any]], Optional[str]]
+
+# orjson has no raw_decode, array elements go through the stdlib decoder
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class BatchParseError(ValueError):
+    """The body stops being parseable: nothing after this point is read."""
+
+
+def _item(value: Any) -> Item:
+    try:
+        return check_error_payload(value), None
+    except PayloadError as e:
+        return None, str(e)
+
+
+async def aiter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Item]:
+    """One item per line; a bad line is an invalid item, the lines after it still count."""
+    rest = b""
+    async for chunk in chunks:
+        *lines, rest = (rest + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+        if len(rest) > WEBHOOK_BATCH_MAX_ITEM_BYTES:
+            raise BatchParseError(f"NDJSON line longer than {WEBHOOK_BATCH_MAX_ITEM_BYTES} bytes")
+    if rest.strip():
+        yield _parse_line(rest)
+
+
+def _parse_line(line: bytes) -> Item:
+    try:
+        return _item(fast_json.loads(line))
+    except ValueError as e:
+        return None, f"invalid JSON: {e}"
+
+
+async def aiter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Item]:
+    """
+    Elements of a top-level JSON array as the body arrives, only the element
+    being read is buffered. A malformed element ends the body (BatchParseError).
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text, pos = "", 0
+    # "open" -> "[" next, "first" -> element or "]", "element", "separator" -> "," or "]", "closed"
+    state = "open"
+
+    def elements(final):
+        """Complete elements in text[pos:], advancing pos/state past them."""
+        nonlocal pos, state
+        while True:
+            pos = _WHITESPACE.match(text, pos).end()
+            if pos == len(text):
+                return
+            char = text[pos]
+            if state == "open":
+                if char != "[":
+                    raise BatchParseError("expected a JSON array or an NDJSON body")
+                pos, state = pos + 1, "first"
+            elif state == "separator" or (state == "first" and char == "]"):
+                if char == "]":
+                    pos, state = pos + 1, "closed"
+                elif char == ",":
+                    pos, state = pos + 1, "element"
+                else:
+                    raise BatchParseError(f"expected ',' or ']' at character {pos}")
+            elif state == "closed":
+                raise BatchParseError("data after the end of the JSON array")
+            else:
+                try:
+                    value, end = _decoder.raw_decode(text, pos)
+                except json.JSONDecodeError as e:
+                    if final or len(text) - pos > WEBHOOK_BATCH_MAX_ITEM_BYTES:
+                        raise BatchParseError(f"invalid JSON array element: {e.msg}")
+                    return  # element not complete yet
+                # a number cut by the chunk boundary decodes fine, wait for what follows it
+                if end == len(text) and not final and not isinstance(value, (dict, list, str)):
+                    return
+                pos, state = end, "separator"
+                yield _item(value)
+
+    async for chunk in chunks:
+        text, pos = text[pos:] + utf8.decode(chunk), 0
+        for item in elements(final=False):
+            yield item
+    text, pos = text[pos:] + utf8.decode(b"", final=True), 0
+    for item in elements(final=True):
+        yield item
+    if state != "closed":
+        raise BatchParseError("body ended inside the JSON array" if state != "open" else "empty body")
+
+
+def aiter_batch(chunks: AsyncIterator[bytes], content_type: str) -> AsyncIterator[Item]:
+    if content_type.split(";")[0].strip().lower() in NDJSON_TYPES:
+        return aiter_ndjson(chunks)
+    return aiter_json_array(chunks)
+
+
+async def aingest_batch(chunks: AsyncIterator[bytes], content_type: str, db=None) -> Dict[str, Any]:
+    """
+    Parse a batch body incrementally, persist every WEBHOOK_BATCH_GROUP valid
+    errors with one bulk insert and enqueue them for analysis together.
+    Returns per-item results in body order: {index, status, error_id | message},
+    status "queued", "deferred" (persisted, queue full, analyzed
+    later from its pending job) or "invalid".
+    """
+    results: List[Dict[str, Any]] = []
+    group: List[Tuple[int, Dict[str, Any]]] = []
+    parse_error = None
+
+    async def flush():
+        payloads = [payload for _, payload in group]
+        error_ids = await apersist_errors(payloads, db)
+        queued = analysis_queue.submit_many(list(zip(error_ids, payloads)))
+        for (index, _), error_id, ok in zip(group, error_ids, queued):
+            results[index] = {"index": index, "status": "queued" if ok else "deferred", "error_id": error_id}
+        logger.info("🚨 errors received", extra={
+            "count": len(group),
+            "first_error_id": error_ids[0],
+            "queued": sum(queued),
+        })
+        group.clear()
+
+    try:
+        async for payload, problem in aiter_batch(chunks, content_type):
+            index = len(results)
+            if problem is not None:
+                results.append({"index": index, "status": "invalid", "message": problem})
+                continue
+            results.append(None)
+            group.append((index, payload))
+            if len(group) >= WEBHOOK_BATCH_GROUP:
+                await flush()
+    except BatchParseError as e:
+        parse_error = str(e)
+    if group:
+        await flush()
+
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    for status, count in summary.items():
+        counter("webhook_batch_items_total", status=status).inc(count)
+    return {"items": len(results), "summary": summary, "parse_error": parse_error, "results": results}
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", "1024"))
+DEDUP_CACHE_TTL = float(os.getenv("DEDUP_CACHE_TTL", "3600"))  # seconds
+
+# volatile bits that differ between occurrences of the same error (applied to lowercased text)
+_VOLATILE = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b\d{1,3}(\.\d{1,3}){3}(:\d+)?\b"), "<ip>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b"), "<uuid>"),
+    # kubernetes pod names: <deployment>-<replicaset hash>-<pod suffix>
+    (re.compile(r"\b([a-z][a-z0-9-]*?)-(?=[a-z]*\d)[a-z0-9]{5,10}-[a-z0-9]{3,5}\b"), r"\1-<pod>"),
+    (re.compile(r"\b0x[0-9a-f]+\b"), "<hex>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+_FRAME = re.compile(r'File "([^"]+)", line \d+, in (\S+)')
+
+
+def _normalize(text: str) -> str:
+    text = text.strip().lower()
+    for pattern, replacement in _VOLATILE:
+        text = pattern.sub(replacement, text)
+    return re.sub(r"\s+", " ", text)
+
+
+def _frames(stack_trace: str) -> list:
+    """Keep `file:function` per frame, line numbers move between deploys."""
+    frames = [f"{path}:{func}" for path, func in _FRAME.findall(stack_trace)]
+    if frames:
+        return frames
+    # not a python traceback, fall back to the normalized text
+    return [_normalize(line) for line in stack_trace.splitlines() if line.strip()]
+
+
+def fingerprint_error(error_data: Dict[str, Any]) -> str:
+    """Stable hash of what identifies an error: name, status, service and stack frames."""
+    context = error_data.get("context") or {}
+    parts = [
+        _normalize(str(error_data.get("error_name", "UnknownError"))),
+        str(error_data.get("status_code")),
+        _normalize(str(context.get("service", ""))),
+        *_frames(str(context.get("stack_trace", ""))),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class DedupCache:
+    """LRU cache with TTL: fingerprint -> stored analysis/solution of the first occurrence."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.llm_calls_saved = 0
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[fingerprint]
+            return None
+        self._entries.move_to_end(fingerprint)
+        return value
+
+    def put(self, fingerprint: str, value: Dict[str, Any]):
+        self._entries[fingerprint] = (time.monotonic(), value)
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def record(self, hit: bool, solved: bool = False):
+        """A hit skipped analyze_error_node, and generate_solution_node if the reused entry has a solution."""
+        if hit:
+            self.hits += 1
+            self.llm_calls_saved += 2 if solved else 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached_fingerprints": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": self.llm_calls_saved,
+        }
+
+
+dedup_cache = DedupCache(DEDUP_CACHE_SIZE, DEDUP_CACHE_TTL)
@@ -0,0 +1,53 @@
+from typing import Any, Dict, TypedDict
+
+from services import fast_json
+
+
+class ErrorPayload(TypedDict, total=False):
+    """What the error generator sends (error_sending/config.py), only severity is required."""
+
+    timestamp: str
+    error_name: str
+    status_code: int
+    detail: str
+    severity: str
+    context: Dict[str, Any]
+    metrics: Dict[str, Any]
+
+
+class PayloadError(ValueError):
+    pass
+
+
+# field -> accepted types, checked when the field is present
+_FIELD_TYPES = {
+    "timestamp": (str,),
+    "error_name": (str,),
+    "status_code": (int,),
+    "detail": (str,),
+    "severity": (str,),
+    "context": (dict,),
+    "metrics": (dict,),
+}
+_TYPE_NAMES = {str: "a string", int: "an integer", dict: "an object"}
+
+
+def check_error_payload(value: Any) -> ErrorPayload:
+    """The decoded payload itself (no copy) if it has the ErrorPayload shape, PayloadError otherwise."""
+    if not isinstance(value, dict):
+        raise PayloadError(f"expected a JSON object, got {type(value).__name__}")
+    if "severity" not in value:
+        raise PayloadError("missing field 'severity'")
+    for field, types in _FIELD_TYPES.items():
+        if field in value and (not isinstance(value[field], types) or isinstance(value[field], bool)):
+            raise PayloadError(f"'{field}' must be {_TYPE_NAMES[types[0]]}")
+    return value
+
+
+def decode_error_payload(body: bytes) -> ErrorPayload:
+    """Request body -> checked payload, decoded once (orjson with FAST_JSON=on)."""
+    try:
+        value = fast_json.loads(body)
+    except ValueError as e:
+        raise PayloadError(f"invalid JSON: {e}")
+    return check_error_payload(value)
@@ -1,142 +1,523 @@
+import asyncio
+import logging
 from datetime import datetime
-from ai.graph import analyze_error_node, generate_solution_node
-from db.repositories.error_repo import save_error, save_error_analysis, save_error_solution
-from db.session import SessionLocal
+from langchain_core.runnables import RunnableLambda
+from ai.checkpoint import aclose_checkpointer, acreate_checkpointer, create_checkpointer
+from ai.compaction import count_tokens
+from ai.graph import build_error_graph, estimate_tokens, needs_solution, similar_context
+from ai.models import to_level
+from db.repositories.error_repo import (
+    acount_fingerprint_hit,
+    aget_error_analysis,
+    aget_fingerprint_analysis,
+    arecent_analyses,
+    arecord_fingerprint,
+    asave_error,
+    asave_errors_bulk,
+    aupsert_error_analyses,
+    aupsert_error_solutions,
+    count_fingerprint_hit,
+    get_fingerprint_analysis,
+    record_fingerprint,
+    save_error,
+    save_error_analysis,
+    save_error_solution,
+)
+from db.repositories.stats_repo import arecord_error_stats, record_error_stats
+from db.session import AsyncSessionLocal, SessionLocal
+from services.analysis_jobs import ANALYSIS_JOBS
+from services.analysis_stream import analysis_streams, done_event
+from services.dedup import dedup_cache, fingerprint_error
+from services.logging_config import LOG_VERBOSE
+from services.metrics import timed
+from services.similarity import similarity_index
+from services.stats_rollup import ingest_event, urgency_event
+from services.write_buffer import write_buffer
 
-def ingest_error(error_data):
-        if error_data["severity"] == "error":
-            error_data["severity"] = "high"
-        elif error_data["severity"] == "warning":
-            error_data["severity"] = "medium"
+logger = logging.getLogger(__name__)
+
+# fingerprint -> Event, set once the first occurrence in this process is analyzed
+_analyses_in_flight = {}
+
+
+def persist_error(error_data):
+    error_data["severity"] = to_level(error_data["severity"])
+    
+    with SessionLocal() as db:
+        err = save_error(db, error_data, fingerprint_error(error_data), with_job=ANALYSIS_JOBS)
+        record_error_stats(db, [ingest_event(error_data)])
+        db.commit()
+        error_id = err.id
+    
+    # Add receipt timestamp
+    error_data['received_at'] = datetime.now().isoformat()
+    
+    return error_id
+
+
+async def apersist_error(error_data, db=None):
+    """`db`: request scoped session (db.session.get_async_db), a short-lived one is opened otherwise."""
+    error_data["severity"] = to_level(error_data["severity"])
+    
+    with timed("persist_error"):
+        if write_buffer.enabled:
+            error_id, _ = await write_buffer.write(
+                ("error", (error_data, fingerprint_error(error_data))),
+                ("stats", ingest_event(error_data)),
+            )
+        elif db is not None:
+            err = await asave_error(db, error_data, fingerprint_error(error_data), with_job=ANALYSIS_JOBS)
+            await arecord_error_stats(db, [ingest_event(error_data)])
+            await db.commit()
+            error_id = err.id
         else:
-            error_data["severity"] = "low"
-        
-        db = SessionLocal()
-        
-        err = save_error(db, error_data)
+            async with AsyncSessionLocal() as db:
+                err = await asave_error(db, error_data, fingerprint_error(error_data), with_job=ANALYSIS_JOBS)
+                await arecord_error_stats(db, [ingest_event(error_data)])
+                await db.commit()
+                error_id = err.id
+    
+    # Add receipt timestamp
+    error_data['received_at'] = datetime.now().isoformat()
+    
+    return error_id
+
+
+async def apersist_errors(errors, db=None):
+    """
+    Many errors in one transaction (bulk insert, stats summed per bucket), for
+    the batch webhook. Returns the new ids in order.
+    """
+    for error_data in errors:
+        error_data["severity"] = to_level(error_data["severity"])
+    rows = [(error_data, fingerprint_error(error_data)) for error_data in errors]
+    events = [ingest_event(error_data) for error_data in errors]
+    
+    with timed("persist_error_batch"):
+        if write_buffer.enabled:
+            results = await write_buffer.write(*[("error", row) for row in rows], *[("stats", e) for e in events])
+            error_ids = results[:len(rows)]
+        elif db is not None:
+            error_ids = await asave_errors_bulk(db, rows, with_jobs=ANALYSIS_JOBS)
+            await arecord_error_stats(db, events)
+            await db.commit()
+        else:
+            async with AsyncSessionLocal() as db:
+                error_ids = await asave_errors_bulk(db, rows, with_jobs=ANALYSIS_JOBS)
+                await arecord_error_stats(db, events)
+                await db.commit()
+    
+    received_at = datetime.now().isoformat()
+    for error_data in errors:
+        error_data['received_at'] = received_at
+    
+    return error_ids
+
+
+def reuse_analysis(error_id, fingerprint):
+    """Repeat occurrence: count it against the stored analysis instead of calling the LLM."""
+    stored = dedup_cache.get(fingerprint)
+    with SessionLocal() as db:
+        if stored is None:
+            stored = get_fingerprint_analysis(db, fingerprint)
+        if stored is None:
+            return False
+        count_fingerprint_hit(db, fingerprint)
+        record_error_stats(db, [urgency_event(stored["analysis"]["urgency"])])
+        db.commit()
+    
+    dedup_cache.put(fingerprint, stored)
+    dedup_cache.record(hit=True, solved=stored["solution"] is not None)
+    _log_reused("duplicate error, reusing stored analysis", error_id, fingerprint, stored)
+    return True
+
+
+async def areuse_analysis(error_id, fingerprint):
+    stored = dedup_cache.get(fingerprint)
+    async with AsyncSessionLocal() as db:
+        if stored is None:
+            stored = await aget_fingerprint_analysis(db, fingerprint)
+        if stored is None:
+            return False
+        await acount_fingerprint_hit(db, fingerprint)
+        await arecord_error_stats(db, [urgency_event(stored["analysis"]["urgency"])])
+        await db.commit()
+    
+    dedup_cache.put(fingerprint, stored)
+    dedup_cache.record(hit=True, solved=stored["solution"] is not None)
+    _publish_stored(error_id, stored)
+    _log_reused("duplicate error, reusing stored analysis", error_id, fingerprint, stored)
+    return True
+
+
+def reuse_similar_analysis(error_id, error_data, fingerprint, stored):
+    """
+    Near-identical error (services/similarity.py): reuse the stored analysis and point
+    this fingerprint at it, so later exact repeats hit the dedup path directly.
+    """
+    with SessionLocal() as db:
+        record_fingerprint(db, fingerprint, error_data.get("error_name", "UnknownError"), stored["error_id"])
+        record_error_stats(db, [urgency_event(stored["analysis"]["urgency"])])
         db.commit()
-        db.refresh(err)
-        
-        result = analyze_error_node(error_data)
-        # Add receipt timestamp
-        error_data['received_at'] = datetime.now().isoformat()
-        
-        if result["urgency"] == "error":
-            result["urgency"] = "high"
-        elif result["urgency"] == "warning":
-            result["urgency"] = "medium"
+    
+    _reused_similar(error_id, error_data, fingerprint, stored)
+
+
+async def areuse_similar_analysis(error_id, error_data, fingerprint, stored):
+    async with AsyncSessionLocal() as db:
+        await arecord_fingerprint(db, fingerprint, error_data.get("error_name", "UnknownError"), stored["error_id"])
+        await arecord_error_stats(db, [urgency_event(stored["analysis"]["urgency"])])
+        await db.commit()
+    
+    _reused_similar(error_id, error_data, fingerprint, stored)
+    _publish_stored(error_id, stored)
+
+
+def _reused_similar(error_id, error_data, fingerprint, stored):
+    stored = {k: stored[k] for k in ("error_id", "analysis", "solution")}
+    dedup_cache.put(fingerprint, stored)
+    tokens = estimate_tokens(error_data, stored["analysis"], stored["solution"])
+    similarity_index.record_short_circuit(stored, tokens)
+    _log_reused("similar error, reusing stored analysis", error_id, fingerprint, stored, tokens_avoided=tokens)
+
+
+def _log_reused(message, error_id, fingerprint, stored, **fields):
+    logger.info(message, extra={
+        "error_id": error_id,
+        "fingerprint": fingerprint,
+        "reused_from": stored["error_id"],
+        "urgency": stored["analysis"]["urgency"],
+        **fields,
+    })
+
+
+def _publish_stored(error_id, stored):
+    """A reused analysis reaches stream readers (services/analysis_stream.py) whole."""
+    analysis_streams.publish(error_id, "analysis_done", stored["analysis"])
+    if stored.get("solution"):
+        analysis_streams.publish(error_id, "solution_done", stored["solution"])
+    analysis_streams.publish(error_id, "done", done_event(error_id, stored["error_id"]))
+
+
+async def astored_analysis(db, error_id):
+    """
+    What a stream reader of this error gets before the live events:
+    {error_id, analysis, solution, finished}, None if there is no such error.
+    """
+    stored = await aget_error_analysis(db, error_id)
+    if stored is None:
+        return None
+    analysis = stored["analysis"]
+    stored["finished"] = analysis is not None and (stored["solution"] is not None or not needs_solution(analysis))
+    return stored
+
+
+def _initial_state(error_id, error_data, similar):
+    if similar:
+        similarity_index.record_context(count_tokens(similar_context(similar)))
+    return {"error_id": error_id, "error": error_data, "similar": similar}
+
+
+def _persist_analysis(state):
+    with timed("persist_analysis") as timing:
+        with SessionLocal() as db:
+            save_error_analysis(db, state["error_id"], state["analysis"])
+            record_error_stats(db, [urgency_event(state["analysis"]["urgency"])])
+            db.commit()
+    log_analysis(state)
+    return {"metrics": {"persist_analysis_ms": timing.ms}}
+
+
+async def _apersist_analysis(state):
+    with timed("persist_analysis") as timing:
+        if write_buffer.enabled:
+            await write_buffer.write(
+                ("analysis", (state["error_id"], state["analysis"])),
+                ("stats", urgency_event(state["analysis"]["urgency"])),
+            )
         else:
-            result["urgency"] = "low"
-            
-        if result:
-            save_error_analysis(db, err.id, result)
-        
-        
-        print("-"*20)
-        print("AI ANALYSIS")
-        print("-"*20)
-        print()
-        print("-"*20)
-        print("ERROR NAME:")
-        print("-"*20)
-        print(result["error_name"])
-        print()
-        print("-"*20)
-        print("PROBABLE ROOT CAUSE:")
-        print("-"*20)
-        print(result["probable_root_cause"])
-        print()
-        print("-"*20)
-        print("IMPACT ASSESMENT:")
-        print("-"*20)
-        print(result["impact_assesment"])
-        print()
-        print("-"*20)
-        print("URGENCY:")
-        print("-"*20)
-        print(result["urgency"])
-        print()
-        print("-"*20)
-        print("CONFIDENCE:")
-        print("-"*20)
-        print(result["confidence"])
-        print()
-        print("-"*20)
-        print("SIGNALS USED:")
-        print("-"*20)
-        for a in result["signals_used"]:
-            print(a)
-        print()
-        print("-"*20)
-        print("IMMEDIATE ACTIONS:")
-        print("-"*20)
-        for a in result["immediate_actions"]:
-            print(a)
-        print()
-        print("-"*20)
-        print("DEEPER INVESTIGATION:")
-        print("-"*20)
-        for a in result["deeper_investigation"]:
-            print(a)
-        print()
-        print("-"*20)
-        print("ASSUMPTIONS:")
-        print("-"*20)
-        for a in result["assumptions"]:
-            print(a)
-        print()
-        
-        solution = generate_solution_node(result)
-        
-        if solution:
-            save_error_solution(db, err.id, solution)
-        
-        if result or solution:
+            async with AsyncSessionLocal() as db:
+                # upsert: a job leased again after its worker died may store the analysis a second time
+                await aupsert_error_analyses(db, [(state["error_id"], state["analysis"])])
+                await arecord_error_stats(db, [urgency_event(state["analysis"]["urgency"])])
+                await db.commit()
+    # only enqueues the record, services/logging_config.py writes it on its own thread
+    log_analysis(state)
+    return {"metrics": {"persist_analysis_ms": timing.ms}}
+
+
+def _persist(state):
+    error = state["error"]
+    fingerprint = fingerprint_error(error)
+    with timed("persist_solution") as timing:
+        with SessionLocal() as db:
+            if state.get("solution"):
+                save_error_solution(db, state["error_id"], state["solution"])
+            record_fingerprint(db, fingerprint, error.get("error_name", "UnknownError"), state["error_id"])
             db.commit()
-        
-        print("-"*20)
-        print("SOLUTION")
-        print("-"*20)
-        print()
-        print("-"*20)
-        print("CODE FIXES:")
-        print("-"*20)
-        for code_fix in solution["code_fixes"]:
-            print("FILE:", code_fix["file"])
-            print("DESCRIPTION:", code_fix["description"])
-            print("CODE:")
-            print(code_fix["code"])
-            print()
-        
-        print("-"*20)
-        print("CONFIGURATION CHANGES:")
-        print("-"*20)
-        for config_change in solution["configuration_changes"]:
-            print("KEY:", config_change["key"])
-            print("VALUE:", config_change["value"])
-            print("REASON:", config_change["reason"])
-            print()
-        
-        print("-"*20)
-        print("DEPLOYMENT STEPS:")
-        print("-"*20)
-        for step in solution["deployment_steps"]:
-            print(step)
-        
-        print()
-        print("-"*20)
-        print("ROLLBACK PLAN:")
-        print("-"*20)
-        print("SIGNALS TO MONITOR:")
-        
-        for signal in solution["rollback_plan"]["signals_to_monitor"]:
-            print(signal)
-            
-        print()
-        print("STEPS:")
-        for step in solution["rollback_plan"]["steps"]:
-            print(step)
-            
-        print()
-        
-        return err.id
\ No newline at end of file
+    stored = {"error_id": state["error_id"], "analysis": state["analysis"], "solution": state.get("solution")}
+    dedup_cache.put(fingerprint, stored)
+    similarity_index.add(error, stored)
+    log_finished(state, fingerprint, timing.ms)
+    return {}
+
+
+async def _apersist(state):
+    error = state["error"]
+    fingerprint = fingerprint_error(error)
+    error_name = error.get("error_name", "UnknownError")
+    with timed("persist_solution") as timing:
+        if write_buffer.enabled:
+            rows = [("fingerprint", (fingerprint, error_name, state["error_id"]))]
+            if state.get("solution"):
+                rows.insert(0, ("solution", (state["error_id"], state["solution"])))
+            await write_buffer.write(*rows)
+        else:
+            async with AsyncSessionLocal() as db:
+                if state.get("solution"):
+                    await aupsert_error_solutions(db, [(state["error_id"], state["solution"])])
+                await arecord_fingerprint(db, fingerprint, error_name, state["error_id"])
+                await db.commit()
+    stored = {"error_id": state["error_id"], "analysis": state["analysis"], "solution": state.get("solution")}
+    dedup_cache.put(fingerprint, stored)
+    similarity_index.add(error, stored)
+    analysis_streams.publish(state["error_id"], "done", done_event(state["error_id"], state["error_id"]))
+    log_finished(state, fingerprint, timing.ms)
+    return {}
+
+
+_graph = None
+_async_graph = None
+_async_graph_lock = asyncio.Lock()
+
+
+def get_error_graph():
+    global _graph
+    if _graph is None:
+        _graph = build_error_graph(
+            RunnableLambda(_persist_analysis, afunc=_apersist_analysis),
+            RunnableLambda(_persist, afunc=_apersist),
+            create_checkpointer(),
+        )
+    return _graph
+
+
+async def aget_error_graph():
+    global _async_graph
+    async with _async_graph_lock:
+        if _async_graph is None:
+            _async_graph = build_error_graph(
+                RunnableLambda(_persist_analysis, afunc=_apersist_analysis),
+                RunnableLambda(_persist, afunc=_apersist),
+                await acreate_checkpointer(),
+            )
+    return _async_graph
+
+
+async def aclose_error_graph():
+    global _async_graph
+    async with _async_graph_lock:
+        if _async_graph is not None:
+            await aclose_checkpointer(_async_graph.checkpointer)
+            _async_graph = None
+
+
+def _graph_config(error_id):
+    return {"configurable": {"thread_id": f"error-{error_id}"}}
+
+
+def analyze_error(error_id, error_data):
+    graph = get_error_graph()
+    config = _graph_config(error_id)
+    
+    if graph.get_state(config).next:
+        # unfinished run from before a restart, continue after the last finished node
+        graph.invoke(None, config)
+    else:
+        fingerprint = fingerprint_error(error_data)
+        if reuse_analysis(error_id, fingerprint):
+            return
+        dedup_cache.record(hit=False)
+        stored, similar = similarity_index.lookup(error_data)
+        if stored is not None:
+            reuse_similar_analysis(error_id, error_data, fingerprint, stored)
+            return
+        graph.invoke(_initial_state(error_id, error_data, similar), config)
+    
+    graph.checkpointer.delete_thread(config["configurable"]["thread_id"])
+
+
+async def aanalyze_error(error_id, error_data):
+    staged = await astart_analysis(error_id, error_data)
+    if staged is not None:
+        await afinish_analysis(staged)
+
+
+async def astart_analysis(error_id, error_data):
+    """
+    Stage 1: dedup lookup and the graph up to (and including) the analyze node.
+    Returns the state for afinish_analysis, or None if a stored analysis was reused.
+    """
+    graph = await aget_error_graph()
+    config = _graph_config(error_id)
+    fingerprint = fingerprint_error(error_data)
+    
+    snapshot = await graph.aget_state(config)
+    if snapshot.next:
+        # unfinished run from before a restart, continue after the last finished node
+        if "analyze" in snapshot.next:
+            await graph.ainvoke(None, config, interrupt_after=["analyze"])
+        return {"error_id": error_id, "fingerprint": fingerprint, "config": config, "claimed": False}
+    
+    with timed("dedup_lookup"):
+        if await areuse_analysis(error_id, fingerprint):
+            return None
+        # a burst of the same error waits for the first one instead of paying for the LLM N times
+        while fingerprint in _analyses_in_flight:
+            await _analyses_in_flight[fingerprint].wait()
+            if await areuse_analysis(error_id, fingerprint):
+                return None
+    dedup_cache.record(hit=False)
+    
+    with timed("similarity_lookup"):
+        stored, similar = similarity_index.lookup(error_data)
+    if stored is not None:
+        await areuse_similar_analysis(error_id, error_data, fingerprint, stored)
+        return None
+    
+    _analyses_in_flight[fingerprint] = asyncio.Event()
+    try:
+        await graph.ainvoke(_initial_state(error_id, error_data, similar), config, interrupt_after=["analyze"])
+    except BaseException:
+        _release_fingerprint(fingerprint)
+        raise
+    
+    return {"error_id": error_id, "fingerprint": fingerprint, "config": config, "claimed": True}
+
+
+async def afinish_analysis(staged):
+    """
+    Stage 2: resume the graph after analyze. generate_solution_node runs in the
+    same step as committing and rendering the analysis, then persist stores the solution.
+    """
+    graph = await aget_error_graph()
+    try:
+        await graph.ainvoke(None, staged["config"])
+        await graph.checkpointer.adelete_thread(staged["config"]["configurable"]["thread_id"])
+    finally:
+        if staged["claimed"]:
+            _release_fingerprint(staged["fingerprint"])
+
+
+async def adiscard_analysis(error_id):
+    """Drop the checkpointed graph run of an analysis that failed, so no restart resumes it."""
+    graph = await aget_error_graph()
+    await graph.checkpointer.adelete_thread(_graph_config(error_id)["configurable"]["thread_id"])
+
+
+def _release_fingerprint(fingerprint):
+    done = _analyses_in_flight.pop(fingerprint, None)
+    if done is not None:
+        done.set()
+
+
+async def aunfinished_analyses():
+    """(error_id, payload) of graph runs a previous process left unfinished."""
+    graph = await aget_error_graph()
+    # collect first, the sqlite saver holds its connection lock while listing
+    thread_ids = []
+    async for checkpoint in graph.checkpointer.alist(None):
+        thread_id = checkpoint.config["configurable"]["thread_id"]
+        if thread_id not in thread_ids:
+            thread_ids.append(thread_id)
+    
+    unfinished = []
+    for thread_id in thread_ids:
+        snapshot = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+        if snapshot.next and "error" in snapshot.values:
+            unfinished.append((snapshot.values["error_id"], snapshot.values["error"]))
+    return unfinished
+
+
+async def aload_similarity_index():
+    """Fill the similarity index with the most recent analyses, on startup."""
+    async with AsyncSessionLocal() as db:
+        rows = await arecent_analyses(db, similarity_index.capacity)
+    for payload, stored in rows:
+        similarity_index.add(payload, stored)
+    return len(rows)
+
+
+def ingest_error(error_data):
+    error_id = persist_error(error_data)
+    analyze_error(error_id, error_data)
+    return error_id
+
+
+async def aingest_error(error_data):
+    error_id = await apersist_error(error_data)
+    await aanalyze_error(error_id, error_data)
+    return error_id
+
+
+def log_analysis(state):
+    analysis = state["analysis"]
+    logger.info("analysis stored", extra={
+        "error_id": state["error_id"],
+        "error_name": state["error"].get("error_name", "UnknownError"),
+        "urgency": analysis["urgency"],
+        "confidence": analysis["confidence"],
+        **(state.get("metrics") or {}),
+    })
+    if LOG_VERBOSE:
+        logger.info(format_analysis(analysis), extra={"error_id": state["error_id"]})
+
+
+def log_finished(state, fingerprint, persist_ms):
+    metrics = {**(state.get("metrics") or {}), "persist_solution_ms": persist_ms}
+    logger.info("analysis finished", extra={
+        "error_id": state["error_id"],
+        "fingerprint": fingerprint,
+        "urgency": state["analysis"]["urgency"],
+        "has_solution": bool(state.get("solution")),
+        "total_tokens": metrics.get("analysis_tokens", 0) + metrics.get("solution_tokens", 0),
+        **metrics,
+    })
+    if LOG_VERBOSE and state.get("solution"):
+        logger.info(format_solution(state["solution"]), extra={"error_id": state["error_id"]})
+
+
+def _section(title, *lines):
+    return ["-"*20, title, "-"*20, *[str(line) for line in lines], ""]
+
+
+def format_analysis(result):
+    """Full analysis as a readable block, for LOG_VERBOSE=on."""
+    lines = ["-"*20, "AI ANALYSIS", "-"*20, ""]
+    lines += _section("ERROR NAME:", result["error_name"])
+    lines += _section("PROBABLE ROOT CAUSE:", result["probable_root_cause"])
+    lines += _section("IMPACT ASSESMENT:", result["impact_assesment"])
+    lines += _section("URGENCY:", result["urgency"])
+    lines += _section("CONFIDENCE:", result["confidence"])
+    lines += _section("SIGNALS USED:", *result["signals_used"])
+    lines += _section("IMMEDIATE ACTIONS:", *result["immediate_actions"])
+    lines += _section("DEEPER INVESTIGATION:", *result["deeper_investigation"])
+    lines += _section("ASSUMPTIONS:", *result["assumptions"])
+    return "\n".join(lines)
+
+
+def format_solution(solution):
+    """Full solution as a readable block, for LOG_VERBOSE=on."""
+    lines = ["-"*20, "SOLUTION", "-"*20, ""]
+    lines += ["-"*20, "CODE FIXES:", "-"*20]
+    for code_fix in solution["code_fixes"]:
+        lines += [f"FILE: {code_fix['file']}", f"DESCRIPTION: {code_fix['description']}", "CODE:", code_fix["code"], ""]
+
+    lines += ["-"*20, "CONFIGURATION CHANGES:", "-"*20]
+    for config_change in solution["configuration_changes"]:
+        lines += [f"KEY: {config_change['key']}", f"VALUE: {config_change['value']}", f"REASON: {config_change['reason']}", ""]
+
+    lines += _section("DEPLOYMENT STEPS:", *solution["deployment_steps"])
+    lines += ["-"*20, "ROLLBACK PLAN:", "-"*20, "SIGNALS TO MONITOR:", *solution["rollback_plan"]["signals_to_monitor"], ""]
+    lines += ["STEPS:", *solution["rollback_plan"]["steps"], ""]
+    return "\n".join(lines)
@@ -0,0 +1,45 @@
+import json
+import os
+from typing import Any
+
+# "on" -> orjson for request bodies, stored JSON, prompts and responses when it is
+# installed (pip install orjson), stdlib json otherwise. Same text either way.
+FAST_JSON = os.getenv("FAST_JSON", "on") == "on"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON = FAST_JSON and orjson is not None
+
+
+def loads(data: bytes | str) -> Any:
+    if ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """Compact UTF-8 JSON, what json.dumps(ensure_ascii=False, separators=(",", ":")) gives."""
+    if ORJSON:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            # ints over 64 bits, non-str keys: let the stdlib have a go
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def dumps(value: Any) -> str:
+    return dumps_bytes(value).decode("utf-8")
+
+
+def dumps_indent(value: Any) -> str:
+    """json.dumps(value, ensure_ascii=False, indent=2)"""
+    if ORJSON:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_INDENT_2).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(value, ensure_ascii=False, indent=2)
@@ -0,0 +1,100 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# "json" -> one JSON object per line, "text" -> human readable with key=value fields
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "on" -> also the full pretty dump of every analysis and solution (local dev)
+LOG_VERBOSE = os.getenv("LOG_VERBOSE", "off") == "on"
+
+# attributes every LogRecord has, anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """The extra= fields of a record, e.g. error_id, fingerprint, timings, tokens."""
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            text += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues the record unformatted. QueueHandler.prepare() would run the formatter
+    on the caller's thread (the event loop), here the listener's handler does it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # a shallow copy with the %-message resolved, later changes to its args do not show
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging() -> QueueListener:
+    """
+    Root logger -> DeferredQueueHandler: a log call only enqueues the record, formatting
+    and the write to stdout happen on the QueueListener thread, off the event loop.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush what is queued and stop the listener thread, on shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
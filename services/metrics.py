@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+# "off" -> histograms and counters are shared no-ops, GET /metrics is empty
+METRICS_ENABLED = os.getenv("METRICS", "on") == "on"
+
+# seconds, tuned for DB round-trips up to slow LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough to observe on every request."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+        }
+
+
+class _DisabledHistogram(Histogram):
+    def observe(self, value: float):
+        pass
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _DisabledCounter(Counter):
+    def inc(self, amount: float = 1.0):
+        pass
+
+
+class Gauge:
+    """Current value of something (a state, a level), set rather than counted."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class _DisabledGauge(Gauge):
+    def set(self, value: float):
+        pass
+
+
+_histograms: Dict[str, Histogram] = {}
+# (name, sorted label pairs) -> Counter
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Counter] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Gauge] = {}
+_registry_lock = threading.Lock()
+_disabled_histogram = _DisabledHistogram()
+_disabled_counter = _DisabledCounter()
+_disabled_gauge = _DisabledGauge()
+
+
+def histogram(name: str) -> Histogram:
+    if not METRICS_ENABLED:
+        return _disabled_histogram
+    h = _histograms.get(name)
+    if h is None:
+        with _registry_lock:
+            h = _histograms.setdefault(name, Histogram())
+    return h
+
+
+def counter(name: str, **labels: str) -> Counter:
+    """counter("llm_tokens_total", model="gpt-4.1-mini", type="prompt").inc(n)"""
+    if not METRICS_ENABLED:
+        return _disabled_counter
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    c = _counters.get(key)
+    if c is None:
+        with _registry_lock:
+            c = _counters.setdefault(key, Counter())
+    return c
+
+
+def gauge(name: str, **labels: str) -> Gauge:
+    """gauge("llm_circuit_state", breaker="llm").set(2)"""
+    if not METRICS_ENABLED:
+        return _disabled_gauge
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    g = _gauges.get(key)
+    if g is None:
+        with _registry_lock:
+            g = _gauges.setdefault(key, Gauge())
+    return g
+
+
+def counter_total(name: str, **labels: str) -> float:
+    """Sum of the `name` series that carry `labels`: counter_total("llm_tokens_total", type="prompt")"""
+    wanted = {(k, str(v)) for k, v in labels.items()}
+    return sum(c.value for (n, pairs), c in list(_counters.items()) if n == name and wanted <= set(pairs))
+
+
+class Timing:
+    seconds = 0.0
+
+    @property
+    def ms(self) -> float:
+        return round(self.seconds * 1000, 1)
+
+
+@contextmanager
+def timed(name: str):
+    """
+    with timed("analysis_llm") as timing: ... -> observed into the `name` histogram,
+    timing.ms is this one for per-run logs.
+    """
+    timing = Timing()
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.seconds = time.perf_counter() - start
+        histogram(name).observe(timing.seconds)
+
+
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: h.snapshot() for name, h in sorted(_histograms.items())}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Prometheus text exposition (version 0.0.4): every histogram as
+    stage_duration_seconds{stage=...}, counters under their own names.
+    """
+    lines: List[str] = []
+    if _histograms:
+        lines.append("# HELP stage_duration_seconds Time spent per pipeline stage")
+        lines.append("# TYPE stage_duration_seconds histogram")
+        for name, h in sorted(_histograms.items()):
+            with h._lock:
+                counts, total, count = list(h.counts), h.sum, h.count
+            cumulative = 0
+            for bound, n in zip(h.buckets, counts):
+                cumulative += n
+                lines.append(f"stage_duration_seconds_bucket{_labels([('stage', name), ('le', repr(float(bound)))])} {cumulative}")
+            lines.append(f"stage_duration_seconds_bucket{_labels([('stage', name), ('le', '+Inf')])} {count}")
+            lines.append(f"stage_duration_seconds_sum{_labels([('stage', name)])} {total}")
+            lines.append(f"stage_duration_seconds_count{_labels([('stage', name)])} {count}")
+
+    by_name: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], Counter]]] = {}
+    for (name, labels), c in sorted(_counters.items()):
+        by_name.setdefault(name, []).append((labels, c))
+    for name, series in by_name.items():
+        lines.append(f"# TYPE {name} counter")
+        for labels, c in series:
+            value = c.value
+            lines.append(f"{name}{_labels(labels)} {int(value) if value.is_integer() else value}")
+
+    gauges_by_name: Dict[str, List[Tuple[Tuple[Tuple[str, str], ...], Gauge]]] = {}
+    for (name, labels), g in sorted(_gauges.items()):
+        gauges_by_name.setdefault(name, []).append((labels, g))
+    for name, series in gauges_by_name.items():
+        lines.append(f"# TYPE {name} gauge")
+        for labels, g in series:
+            value = g.value
+            lines.append(f"{name}{_labels(labels)} {int(value) if value.is_integer() else value}")
+    return "\n".join(lines) + "\n" if lines else ""
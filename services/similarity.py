@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.dedup import _frames, _normalize
+
+logger = logging.getLogger(__name__)
+
+# "hashing" (offline, no model) | "sentence-transformers" (local model, falls back to hashing if missing)
+SIMILARITY_EMBEDDER = os.getenv("SIMILARITY_EMBEDDER", "hashing")
+SIMILARITY_MODEL = os.getenv("SIMILARITY_MODEL", "all-MiniLM-L6-v2")
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "2048"))  # hashing vectorizer width
+SIMILARITY_INDEX_SIZE = int(os.getenv("SIMILARITY_INDEX_SIZE", "10000"))  # analyses kept, oldest evicted
+# cosine similarity at or above which the stored analysis is reused without calling the LLM, > 1 = never
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.92"))
+# below the threshold, up to K prior analyses at least this similar go into the prompt as context
+SIMILARITY_CONTEXT_MIN = float(os.getenv("SIMILARITY_CONTEXT_MIN", "0.6"))
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "3"))
+
+# what of a prior analysis goes into the prompt
+_CONTEXT_FIELDS = ("error_name", "probable_root_cause", "urgency", "immediate_actions")
+
+
+def error_text(error_data: Dict[str, Any]) -> str:
+    """What makes two errors alike: name, service, messages and stack frames, volatile bits normalized."""
+    context = error_data.get("context") or {}
+    parts = [
+        str(error_data.get("error_name", "UnknownError")),
+        str(error_data.get("status_code")),
+        str(context.get("service", "")),
+        str(error_data.get("detail", "")),
+        str(context.get("error_message", "")),
+    ]
+    parts = [_normalize(p) for p in parts]
+    parts.extend(_frames(str(context.get("stack_trace", ""))))
+    return "\n".join(parts)
+
+
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams/bigrams and frames, L2 normalized. No model, no network."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for line in text.splitlines():
+            words = [w for w in line.replace(":", " ").replace("/", " ").split() if w]
+            features.extend(words)
+            features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+            # whole line once more: exact frames/messages weigh more than shared words
+            features.append(line)
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+def create_embedder():
+    if SIMILARITY_EMBEDDER == "sentence-transformers":
+        try:
+            return SentenceTransformerEmbedder(SIMILARITY_MODEL)
+        except Exception as e:
+            logger.warning(f"⚠️  Embedding model {SIMILARITY_MODEL} unavailable ({str(e)}), using the hashing vectorizer")
+    return HashingEmbedder(SIMILARITY_DIM)
+
+
+class SimilarityIndex:
+    """
+    In-memory nearest-neighbour index over analyzed errors: one row per canonical
+    error in a NumPy matrix, cosine similarity is a single matrix-vector product.
+    Entries hold what dedup stores: {error_id, analysis, solution}.
+    """
+
+    def __init__(self, create_embedder: Callable[[], Any], capacity: int):
+        self._create_embedder = create_embedder
+        self._embedder = None
+        self.capacity = capacity
+        # sized on the first add, the embedder decides the width
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries: List[Dict[str, Any]] = []
+        self._next = 0  # ring buffer slot, the oldest entry is overwritten once full
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.short_circuits = 0
+        self.with_context = 0
+        self.llm_calls_avoided = 0
+        self.tokens_avoided = 0
+        self.context_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def embedder(self):
+        """Built on first use (the receiver warms it while loading the index): a sentence-transformers model takes seconds."""
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = self._create_embedder()
+        return self._embedder
+
+    def embed(self, error_data: Dict[str, Any]) -> np.ndarray:
+        return self.embedder.embed(error_text(error_data))
+
+    def add(self, error_data: Dict[str, Any], stored: Dict[str, Any]):
+        vector = self.embed(error_data)
+        with self._lock:
+            if len(self._entries) < self.capacity:
+                if len(self._entries) == len(self._vectors):
+                    # grow by doubling instead of copying the matrix on every add
+                    grown = np.zeros((max(64, 2 * len(self._vectors)), self.embedder.dim), dtype=np.float32)
+                    if len(self._vectors):
+                        grown[:len(self._vectors)] = self._vectors
+                    self._vectors = grown
+                self._vectors[len(self._entries)] = vector
+                self._entries.append(stored)
+            else:
+                self._vectors[self._next] = vector
+                self._entries[self._next] = stored
+                self._next = (self._next + 1) % self.capacity
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """Top-k (similarity, entry), most similar first."""
+        with self._lock:
+            n = len(self._entries)
+            if not n:
+                return []
+            scores = self._vectors[:n] @ vector
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), self._entries[i]) for i in top]
+
+    def lookup(self, error_data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """(entry to reuse or None, prior analyses to give the LLM as context)."""
+        self.lookups += 1
+        matches = self.search(self.embed(error_data), SIMILARITY_TOP_K)
+        if matches and matches[0][0] >= SIMILARITY_THRESHOLD:
+            return {**matches[0][1], "similarity": round(matches[0][0], 3)}, []
+        context = [
+            {"similarity": round(score, 3), **{k: entry["analysis"].get(k) for k in _CONTEXT_FIELDS}}
+            for score, entry in matches
+            if score >= SIMILARITY_CONTEXT_MIN
+        ]
+        return None, context
+
+    def record_short_circuit(self, stored: Dict[str, Any], tokens: int):
+        self.short_circuits += 1
+        self.llm_calls_avoided += 2 if stored.get("solution") else 1
+        self.tokens_avoided += tokens
+
+    def record_context(self, tokens: int):
+        self.with_context += 1
+        self.context_tokens += tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            # None until the first add/lookup builds it
+            "embedder": type(self._embedder).__name__ if self._embedder is not None else None,
+            "indexed": len(self),
+            "capacity": self.capacity,
+            "threshold": SIMILARITY_THRESHOLD,
+            "lookups": self.lookups,
+            "short_circuits": self.short_circuits,
+            "with_context": self.with_context,
+            "llm_calls_avoided": self.llm_calls_avoided,
+            "tokens_avoided": self.tokens_avoided,
+            # prompt tokens the top-k context cost on the analyses that still went to the LLM
+            "context_tokens_added": self.context_tokens,
+        }
+
+
+similarity_index = SimilarityIndex(create_embedder, SIMILARITY_INDEX_SIZE)
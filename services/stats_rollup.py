@@ -0,0 +1,94 @@
+"""
+Per minute/hour error counts (error_stats_buckets), bumped on ingest and on
+analysis so /errors/stats reads O(buckets) rows instead of the errors table.
+
+Backfill or repair from the errors table:
+
+    python -m services.stats_rollup rebuild [--since 2024-01-15T00:00:00Z]
+"""
+import argparse
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from db.models import Error, ErrorAnalysis, ErrorFingerprint
+from db.repositories.stats_repo import StatsEvent, bucket_start, clear_error_stats, record_error_stats
+
+_WINDOW = re.compile(r"^(\d+)([mhd])$")
+_WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def ingest_event(error_data: Dict[str, Any], at: Optional[datetime] = None) -> StatsEvent:
+    context = error_data.get("context") or {}
+    return (at or datetime.now(timezone.utc), {
+        "name": error_data.get("error_name", "UnknownError"),
+        "severity": error_data.get("severity", "error"),
+        "service": context.get("service") or "unknown",
+    })
+
+
+def urgency_event(urgency: str, at: Optional[datetime] = None) -> StatsEvent:
+    return (at or datetime.now(timezone.utc), {"urgency": urgency})
+
+
+def parse_window(window: str) -> timedelta:
+    """"15m" | "6h" | "7d" -> timedelta, ValueError otherwise."""
+    match = _WINDOW.match(window.strip())
+    if not match:
+        raise ValueError(f"Invalid window: {window} (expected e.g. 15m, 6h, 7d)")
+    return timedelta(**{_WINDOW_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def rebuild(since: Optional[datetime] = None, chunk: int = 10_000) -> int:
+    """Recount buckets from `since` (whole hours, all history if None) in one transaction."""
+    from db.session import SessionLocal
+
+    own = aliased(ErrorAnalysis)
+    canonical = aliased(ErrorAnalysis)
+    stmt = (
+        # repeated errors have no analysis row of their own, they reused the canonical one
+        select(Error.created_at, Error.name, Error.severity, Error.payload, func.coalesce(own.urgency, canonical.urgency))
+        .outerjoin(own, own.error_id == Error.id)
+        .outerjoin(ErrorFingerprint, ErrorFingerprint.fingerprint == Error.fingerprint)
+        .outerjoin(canonical, canonical.error_id == ErrorFingerprint.canonical_error_id)
+        .execution_options(yield_per=chunk)
+    )
+    if since is not None:
+        stmt = stmt.where(Error.created_at >= bucket_start(since, "hour"))
+
+    rebuilt = 0
+    with SessionLocal() as db:
+        clear_error_stats(db, since)
+        events = []
+        for created_at, name, severity, payload, urgency in db.execute(stmt):
+            event_time, dimensions = ingest_event({**(payload or {}), "error_name": name, "severity": severity}, created_at)
+            if urgency is not None:
+                dimensions["urgency"] = urgency
+            events.append((event_time, dimensions))
+            if len(events) >= chunk:
+                record_error_stats(db, events)
+                rebuilt += len(events)
+                events = []
+        record_error_stats(db, events)
+        rebuilt += len(events)
+        db.commit()
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m services.stats_rollup")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = commands.add_parser("rebuild", help="recount error_stats_buckets from the errors table")
+    rebuild_cmd.add_argument("--since", type=datetime.fromisoformat, help="only buckets from this time on (ISO 8601)")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        count = rebuild(args.since)
+        print(f"✅ Rebuilt stats buckets from {count} errors")
+
+
+if __name__ == "__main__":
+    main()
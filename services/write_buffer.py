@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from db.repositories.error_repo import (
+    arecord_fingerprints_bulk,
+    asave_errors_bulk,
+    aupsert_error_analyses,
+    aupsert_error_solutions,
+)
+from db.repositories.stats_repo import arecord_error_stats
+from db.session import AsyncSessionLocal
+from services.analysis_jobs import ANALYSIS_JOBS
+from services.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+# group commit of error/analysis/solution rows: flush every N rows or T ms, 1 = off (one commit per write)
+DB_WRITE_BATCH_ROWS = int(os.getenv("DB_WRITE_BATCH_ROWS", "1"))
+DB_WRITE_BATCH_MS = float(os.getenv("DB_WRITE_BATCH_MS", "20"))
+
+# ("error", (payload, fingerprint)) | ("analysis", (error_id, analysis))
+# ("solution", (error_id, solution)) | ("fingerprint", (fingerprint, error_name, error_id))
+# ("stats", stats event, see services/stats_rollup.py)
+Row = Tuple[str, tuple]
+
+
+class WriteBehindBuffer:
+    """
+    Collects rows from concurrent writers and writes them with bulk
+    inserts/upserts in one transaction per flush. Callers wait for the commit
+    of their flush, so a returned write is durable, it just shares the round-trips.
+    """
+
+    def __init__(self, max_rows: int, max_wait: float):
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self._pending: List[Tuple[List[Row], asyncio.Future]] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+        self.flushes = 0
+        self.rows = 0
+        self.failed_flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rows > 1
+
+    async def write(self, *rows: Row) -> List[Any]:
+        """
+        Rows written together land in the same transaction. Returns one result
+        per row: the new id for "error" rows, None for the others.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(rows), future))
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_rows = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _write(self, batch):
+        by_kind: Dict[str, list] = {"error": [], "analysis": [], "solution": [], "fingerprint": [], "stats": []}
+        for rows, _ in batch:
+            for kind, args in rows:
+                by_kind[kind].append(args)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            async with AsyncSessionLocal() as db:
+                error_ids = (
+                    await asave_errors_bulk(db, by_kind["error"], with_jobs=ANALYSIS_JOBS) if by_kind["error"] else []
+                )
+                if by_kind["analysis"]:
+                    await aupsert_error_analyses(db, by_kind["analysis"])
+                if by_kind["solution"]:
+                    await aupsert_error_solutions(db, by_kind["solution"])
+                if by_kind["fingerprint"]:
+                    await arecord_fingerprints_bulk(db, by_kind["fingerprint"])
+                if by_kind["stats"]:
+                    # summed per bucket, a flush bumps each bucket once
+                    await arecord_error_stats(db, by_kind["stats"])
+                await db.commit()
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"❌ Write-behind flush of {sum(len(rows) for rows, _ in batch)} rows failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        histogram("db_write_flush").observe(loop.time() - start)
+
+        ids = iter(error_ids)
+        for rows, future in batch:
+            self.rows += len(rows)
+            if not future.done():
+                future.set_result([next(ids) if kind == "error" else None for kind, _ in rows])
+        self.flushes += 1
+
+    async def drain(self):
+        """Flush what is pending and wait for running flushes, on shutdown."""
+        self._flush()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_rows": self.max_rows,
+            "max_wait_ms": self.max_wait * 1000,
+            "flushes": self.flushes,
+            "rows": self.rows,
+            "avg_rows_per_flush": round(self.rows / self.flushes, 2) if self.flushes else 0.0,
+            "failed_flushes": self.failed_flushes,
+            "pending_rows": self._pending_rows,
+        }
+
+
+write_buffer = WriteBehindBuffer(DB_WRITE_BATCH_ROWS, DB_WRITE_BATCH_MS / 1000)
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+from db.models import AnalysisJob, Base
+from db.repositories.error_repo import save_error
+from db.repositories.job_repo import acomplete_jobs, aretry_job, claim_jobs
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.sqlite'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def _ack(db, job_id, worker, *, retry_after=None, fail=False):
+    """acomplete_jobs (or aretry_job) from `worker`, on its own async connection to the same file."""
+    async def run():
+        engine = create_async_engine(db.get_bind().url.set(drivername="sqlite+aiosqlite"))
+        async with AsyncSession(engine) as session:
+            if fail:
+                await aretry_job(session, job_id, "boom", retry_after, worker)
+            else:
+                await acomplete_jobs(session, [job_id], worker)
+            await session.commit()
+        await engine.dispose()
+
+    asyncio.run(run())
+    db.expire_all()
+
+
+def _claim(db, worker, max_attempts):
+    # negative lease: ran out right away, as if the worker died holding the job
+    jobs = claim_jobs(db, 10, -1, worker, max_attempts)
+    db.commit()
+    return [(error_id, attempts) for _, error_id, attempts, _ in jobs]
+
+
+def test_expired_lease_is_claimed_again_until_max_attempts(db):
+    error = save_error(db, {"severity": "error", "error_name": "LeakError"}, with_job=True)
+    db.commit()
+
+    for attempt in (1, 2, 3):
+        assert _claim(db, f"worker-{attempt}", max_attempts=3) == [(error.id, attempt)]
+    assert _claim(db, "worker-4", max_attempts=3) == []
+
+    job = db.scalars(select(AnalysisJob)).one()
+    assert (job.status, job.attempts, job.leased_until) == ("failed", 3, None)
+    assert "lease ran out" in job.last_error
+
+
+def test_live_lease_is_not_failed(db):
+    error = save_error(db, {"severity": "error", "error_name": "SlowError"}, with_job=True)
+    db.commit()
+
+    jobs = claim_jobs(db, 10, 300, "worker-1", 1)
+    db.commit()
+    assert [(error_id, attempts) for _, error_id, attempts, _ in jobs] == [(error.id, 1)]
+    assert _claim(db, "worker-2", max_attempts=1) == []
+
+    job = db.scalars(select(AnalysisJob)).one()
+    assert (job.status, job.worker) == ("running", "worker-1")
+
+
+def test_stale_worker_cannot_ack_a_reclaimed_job(db):
+    error = save_error(db, {"severity": "error", "error_name": "StaleError"}, with_job=True)
+    db.commit()
+
+    # worker-1's lease runs out, worker-2 claims the job again
+    assert _claim(db, "worker-1", max_attempts=3) == [(error.id, 1)]
+    jobs = claim_jobs(db, 10, 300, "worker-2", 3)
+    db.commit()
+    job_id = jobs[0][0]
+
+    _ack(db, job_id, "worker-1")
+    _ack(db, job_id, "worker-1", fail=True)
+    job = db.scalars(select(AnalysisJob)).one()
+    assert (job.status, job.worker, job.attempts, job.last_error) == ("running", "worker-2", 2, None)
+
+    _ack(db, job_id, "worker-2")
+    job = db.scalars(select(AnalysisJob)).one()
+    assert (job.status, job.leased_until) == ("done", None)